@@ -1,52 +1,55 @@
+import logging
 import tkinter as tk
 import ttkbootstrap as ttk
 from tkinter import messagebox
-from tkinter import Toplevel, Listbox
-import uuid 
-import subprocess
-import sys 
+from tkinter import Toplevel, filedialog
+import queue
+import screen_router
+from inventory_store import open_default_store, validate_item
+from virtual_list import VirtualListView
+from inventory_import import CsvImport
+from inventory_export import FORMATS, InventoryExport
+from sku_allocator import SkuAllocator
+from barcode_scanner import ScannerInput
+from search_engine import find_barcode
 
-class App(ttk.Window):
+log = logging.getLogger(__name__)
 
-    def __init__(self):
+class App(ttk.Frame):
 
-        super().__init__(themename="litera")
+    window_title = "JBSON Hardware - Inventory Item Control (CRUD)"
+    window_geometry = "650x700"
 
+    def __init__(self, master=None, router=None):
 
-        self.title("JBSON Hardware - Inventory Item Control (CRUD)")
-        self.geometry("650x700")
-        self.resizable(False, False)
+        super().__init__(master)
+        self.router = router
         
-        self.inventory_data = {
-            "SKU001": {"name": "Hammer (Claw)", "qty": 150, "price": 12.99, "desc": "Standard 16oz claw hammer."},
-            "SKU002": {"name": "Screwdriver Set", "qty": 80, "price": 24.50, "desc": "6-piece mixed precision set."},
-            "SKU003": {"name": "Wood Screws (Box)", "qty": 300, "price": 5.99, "desc": "Box of 100 2-inch wood screws."}
-        }
+        # The store journals every change it commits, with the user passed to it
+        self.store = open_default_store()
         self.selected_sku = None
+        self.listed_version = None
+        self.sku_allocator = None
+        self.background_job = None
+        self.job_messages = queue.Queue()
 
-        self.center_window()
         self.create_widgets()
         self.update_listbox()
+        self.scanner = ScannerInput(self, self.load_scanned_item)
 
-    def center_window(self):
-
-        self.update_idletasks()
-        width = self.winfo_width()
-        height = self.winfo_height()
-        x = (self.winfo_screenwidth() // 2) - (width // 2)
-        y = (self.winfo_screenheight() // 2) - (height // 2)
-        self.geometry(f'{width}x{height}+{x}+{y}')
+    def on_show(self):
+        # New SKUs are numbered per branch, so follow the logged-in location
+        location = self.router.session.location
+        if self.sku_allocator is None or self.sku_allocator.location != location:
+            self.sku_allocator = SkuAllocator(self.store, location)
 
+        # Another screen or process may have committed to the store
+        if self.store.version != self.listed_version:
+            self.update_listbox()
 
     def return_to_main_menu(self):
 
-        self.destroy()
-        
-  
-        try:
-            subprocess.Popen([sys.executable, "main_menu.py"])
-        except Exception as e:
-            print(f"ERROR: Could not launch main_menu.py. Error: {e}")
+        self.router.show("main_menu")
 
             
     def create_widgets(self):
@@ -59,6 +62,34 @@ class App(ttk.Window):
             command=self.return_to_main_menu,
             bootstyle="secondary"
         ).pack(side="left", padx=5, pady=5)
+
+        # Scans load the matching item for editing instead of being typed
+        self.scan_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            header_frame,
+            text="Scanner Mode",
+            variable=self.scan_var,
+            command=lambda: self.scanner.enable(self.scan_var.get()),
+            bootstyle="info-round-toggle"
+        ).pack(side="left", padx=10, pady=5)
+
+        ttk.Button(
+            header_frame,
+            text="Export...",
+            command=self.export_inventory,
+            bootstyle="info-outline"
+        ).pack(side="right", padx=5, pady=5)
+
+        ttk.Button(
+            header_frame,
+            text="Import CSV...",
+            command=self.import_csv,
+            bootstyle="info-outline"
+        ).pack(side="right", padx=5, pady=5)
+
+        # Shown only while an import or export is running
+        self.job_progress = ttk.Progressbar(header_frame, length=120, mode="determinate", maximum=1.0, bootstyle="info-striped")
+        self.job_status = ttk.Label(header_frame, text="", font=("Helvetica", 9))
         
         main_frame = ttk.Labelframe(self, text="Item Details", padding="20 15 20 20", bootstyle="primary")
         main_frame.pack(fill="x", padx=30, pady=20)
@@ -131,10 +162,10 @@ class App(ttk.Window):
         list_frame = ttk.Labelframe(self, text="Current Inventory List (Select to Edit/Remove)", padding="10 10 10 10")
         list_frame.pack(fill="both", expand=True, padx=30, pady=(0, 20))
         
-        self.item_listbox = Listbox(list_frame, height=10, font=("Helvetica", 10))
-        self.item_listbox.pack(fill="both", expand=True, padx=5, pady=5)
+        self.item_list = VirtualListView(list_frame, count_rows=lambda: len(self.store), fetch_rows=self.fetch_rows, height=10, font=("Helvetica", 10))
+        self.item_list.pack(fill="both", expand=True, padx=5, pady=5)
         
-        self.item_listbox.bind('<<ListboxSelect>>', self.load_selected_item)
+        self.item_list.bind('<<ListboxSelect>>', self.load_selected_item)
         
     def _create_label_entry(self, parent, label_text, textvariable, row_num):
         label = ttk.Label(parent, text=label_text)
@@ -143,24 +174,49 @@ class App(ttk.Window):
         entry.grid(row=row_num, column=1, sticky="we", padx=5, pady=7)
         return entry
 
+    def format_row(self, sku, item):
+        return f"[{sku}] {item['name']} | Qty: {item['qty']} | Price: ₱{item['price']:.2f}"
+
+    def fetch_rows(self, offset, limit):
+        return [(sku, self.format_row(sku, item)) for sku, item in self.store.page(offset, limit)]
+
     def update_listbox(self):
-        self.item_listbox.delete(0, tk.END)
-        for sku, item in self.inventory_data.items():
-            display_text = f"[{sku}] {item['name']} | Qty: {item['qty']} | Price: ₱{item['price']:.2f}"
-            self.item_listbox.insert(tk.END, display_text)
+        self.listed_version = self.store.version
+        self.item_list.refresh()
+
+    def apply_list_diff(self, action, sku, item=None):
+        if action == "add":
+            # The listing is in SKU order
+            self.item_list.insert_row(self.store.position(sku), sku, self.format_row(sku, item))
+        elif action == "edit":
+            self.item_list.update_row(sku, self.format_row(sku, item))
+        else:
+            self.item_list.delete_row(sku)
+
+        # Only our own commit moved the version if no other connection wrote meanwhile
+        version = self.store.version
+        if self.listed_version is not None and self.listed_version[0] == version[0]:
+            self.listed_version = version
 
     def load_selected_item(self, event):
         self.clear_error()
+        sku = self.item_list.selected_key
+        if sku is not None:
+            self.load_item(sku)
+
+    def load_scanned_item(self, barcode):
+        self.clear_error()
+        found = find_barcode(barcode)
+        if found is None:
+            self.show_error(f"Error: No item has barcode {barcode}.")
+            return
+        self.item_list.clear_selection()
+        self.load_item(found[0])
+
+    def load_item(self, sku):
         try:
-            selected_indices = self.item_listbox.curselection()
-            if not selected_indices:
-                return
-            
-            list_item_text = self.item_listbox.get(selected_indices[0])
-            sku = list_item_text.split("]")[0].strip("[")
-            
-            if sku in self.inventory_data:
-                item = self.inventory_data[sku]
+            item = self.store.get(sku)
+            if item is not None:
                 self.selected_sku = sku
                 
                 self.sku_entry.config(state='normal')
@@ -176,8 +232,8 @@ class App(ttk.Window):
                 
                 self.error_label.config(text=f"Item {sku} loaded for editing.")
             
-        except Exception as e:
-            print(f"Error loading item: {e}")
+        except Exception:
+            log.exception("Error loading item %s", sku)
             self.error_label.config(text="Error loading item details.")
             
     def validate_inputs(self):
@@ -186,40 +242,12 @@ class App(ttk.Window):
         price_str = self.price_var.get().strip()
         desc = self.desc_text.get('1.0', tk.END).strip()
         
-        if not name:
-            self.show_error("Error: Item Name is required.")
-            return None
-            
-        if not qty_str:
-            self.show_error("Error: Quantity is required.")
-            return None
-
-        if not price_str:
-            self.show_error("Error: Unit Price is required.")
-            return None
-        
-        try:
-            qty = int(qty_str)
-            if qty < 0: raise ValueError
-        except ValueError:
-            self.show_error("Error: Quantity must be a non-negative whole number.")
-            return None
-            
         try:
-            price = float(price_str)
-            if price <= 0: raise ValueError
-        except ValueError:
-            self.show_error("Error: Unit Price must be a positive number.")
+            return validate_item(name, qty_str, price_str, desc)
+        except ValueError as e:
+            self.show_error(f"Error: {e}")
             return None
 
-        # Return sanitized data
-        return {
-            "name": name,
-            "qty": qty,
-            "price": price,
-            "desc": desc
-        }
-
     def clear_error(self):
         self.error_label.config(text="")
 
@@ -229,6 +257,7 @@ class App(ttk.Window):
     def clear_form(self):
         self.clear_error()
         self.selected_sku = None
+        self.item_list.clear_selection()
         self.sku_var.set("[Auto-Generated for New Item]")
         self.sku_entry.config(state='readonly')
         self.name_var.set("")
@@ -237,29 +266,27 @@ class App(ttk.Window):
         self.desc_text.delete('1.0', tk.END)
         self.name_var.get() 
 
+    def generate_sku(self):
+        return self.sku_allocator.next_sku()
+
     def add_item(self):
         validated_data = self.validate_inputs()
         if not validated_data:
             return
             
-        new_sku = "SKU" + str(uuid.uuid4())[:8].upper().replace('-', '')
-        
-        while new_sku in self.inventory_data:
-            new_sku = "SKU" + str(uuid.uuid4())[:8].upper().replace('-', '')
-
-        self.inventory_data[new_sku] = validated_data
+        new_sku = self.generate_sku()
+        self.store.add_item(new_sku, validated_data, user=self.router.session.username)
         
         messagebox.showinfo(
             "Success", 
             f"Item successfully ADDED:\nSKU: {new_sku}\nName: {validated_data['name']}\nQty: {validated_data['qty']}"
         )
-        print(f"[Activity Log]: Added new item {new_sku}.")
+        self.apply_list_diff("add", new_sku, validated_data)
         self.clear_form()
-        self.update_listbox()
         
     def edit_item(self):
         """Mocks editing the selected item in the inventory."""
-        if not self.selected_sku or self.selected_sku not in self.inventory_data:
+        if not self.selected_sku or self.selected_sku not in self.store:
             self.show_error("Error: Select an item from the list or clear the form to add a new one.")
             return
             
@@ -267,28 +294,27 @@ class App(ttk.Window):
         if not validated_data:
             return
             
-        old_data = self.inventory_data[self.selected_sku]
-        self.inventory_data[self.selected_sku] = validated_data
+        old_data = self.store[self.selected_sku]
+        self.store.update_item(self.selected_sku, validated_data, user=self.router.session.username)
         
         messagebox.showwarning(
             "Update Successful", 
             f"Item '{validated_data['name']}' ({self.selected_sku}) updated.\nOld Qty: {old_data['qty']} -> New Qty: {validated_data['qty']}"
         )
-        print(f"[Activity Log]: Updated item {self.selected_sku}. Old data: {old_data}, New data: {validated_data}.")
+        self.apply_list_diff("edit", self.selected_sku, validated_data)
         self.clear_form()
-        self.update_listbox()
 
     def remove_item(self):
-        if not self.selected_sku or self.selected_sku not in self.inventory_data:
+        if not self.selected_sku or self.selected_sku not in self.store:
             self.show_error("Error: Select an item from the list to remove it.")
             return
             
-        item_name = self.inventory_data[self.selected_sku]['name']
+        item_name = self.store[self.selected_sku]['name']
         
         confirm_window = Toplevel(self)
         confirm_window.title("Confirm Removal")
         confirm_window.geometry("300x150")
-        confirm_window.transient(self)
+        confirm_window.transient(self.winfo_toplevel())
         confirm_window.grab_set()
         
         self.update_idletasks()
@@ -310,17 +336,15 @@ class App(ttk.Window):
         button_frame.pack(pady=10)
         
         def do_remove():
-            del self.inventory_data[self.selected_sku]
+            self.store.remove_item(self.selected_sku, user=self.router.session.username)
             
             messagebox.showerror(
                 "Removed", 
                 f"Item '{item_name}' ({self.selected_sku}) has been REMOVED from inventory."
             )
-            print(f"[Activity Log]: Removed item {self.selected_sku} ({item_name}).")
-            
             confirm_window.destroy()
+            self.apply_list_diff("remove", self.selected_sku)
             self.clear_form()
-            self.update_listbox()
 
         def cancel():
             confirm_window.destroy()
@@ -329,6 +353,137 @@ class App(ttk.Window):
         ttk.Button(button_frame, text="Cancel", command=cancel, bootstyle="secondary-outline").pack(side="left", padx=10)
 
 
+    def import_csv(self):
+        if self.background_job is not None:
+            self.show_error("Error: An import or export is already running.")
+            return
+
+        path = filedialog.askopenfilename(
+            title="Import Supplier Price List",
+            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+
+        self.start_background_job(CsvImport(
+            path, self.store, self.job_messages, make_sku=self.generate_sku,
+            user=self.router.session.username,
+        ), "Importing...")
+
+    def export_inventory(self):
+        if self.background_job is not None:
+            self.show_error("Error: An import or export is already running.")
+            return
+
+        export_window = Toplevel(self)
+        export_window.title("Export Inventory")
+        export_window.transient(self.winfo_toplevel())
+        export_window.grab_set()
+        export_window.resizable(False, False)
+
+        options_frame = ttk.Frame(export_window, padding="20 15 20 10")
+        options_frame.pack(fill="both", expand=True)
+        options_frame.columnconfigure(1, weight=1)
+
+        ttk.Label(options_frame, text="Format:").grid(row=0, column=0, sticky="e", padx=(0, 10), pady=5)
+        format_var = tk.StringVar(value="csv")
+        format_frame = ttk.Frame(options_frame)
+        format_frame.grid(row=0, column=1, sticky="w")
+        for fmt, (label, _) in FORMATS.items():
+            ttk.Radiobutton(format_frame, text=label, variable=format_var, value=fmt, bootstyle="primary").pack(side="left", padx=5)
+
+        ttk.Label(options_frame, text="Category:").grid(row=1, column=0, sticky="e", padx=(0, 10), pady=5)
+        category_var = tk.StringVar()
+        category_combo = ttk.Combobox(
+            options_frame,
+            textvariable=category_var,
+            values=["All Categories"] + self.store.categories(),
+            state="readonly"
+        )
+        category_combo.current(0)
+        category_combo.grid(row=1, column=1, sticky="we", padx=5, pady=5)
+
+        in_stock_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="In Stock Only", variable=in_stock_var, bootstyle="primary").grid(row=2, column=1, sticky="w", padx=5, pady=5)
+
+        def do_export():
+            fmt = format_var.get()
+            label, extension = FORMATS[fmt]
+            path = filedialog.asksaveasfilename(
+                parent=export_window,
+                title="Export Inventory",
+                defaultextension=extension,
+                filetypes=[(label, "*" + extension), ("All files", "*.*")]
+            )
+            if not path:
+                return
+            category = category_var.get()
+            job = InventoryExport(
+                path, self.store, self.job_messages, fmt,
+                category=None if category == "All Categories" else category,
+                in_stock_only=in_stock_var.get()
+            )
+            export_window.destroy()
+            self.start_background_job(job, "Exporting...")
+
+        button_frame = ttk.Frame(export_window)
+        button_frame.pack(pady=(0, 15))
+        ttk.Button(button_frame, text="Export", command=do_export, bootstyle="primary").pack(side="left", padx=10)
+        ttk.Button(button_frame, text="Cancel", command=export_window.destroy, bootstyle="secondary-outline").pack(side="left", padx=10)
+
+    def start_background_job(self, job, status_text):
+        self.clear_error()
+        self.job_progress.config(value=0)
+        self.job_status.config(text=status_text)
+        self.job_progress.pack(side="right", padx=5)
+        self.job_status.pack(side="right", padx=5)
+
+        self.background_job = job
+        job.start()
+        self.after(100, self.poll_background_job)
+
+    def poll_background_job(self):
+        # Drain everything the worker posted since the last tick; Tk is only touched here
+        job = self.background_job
+        finished = None
+        while True:
+            try:
+                message = self.job_messages.get_nowait()
+            except queue.Empty:
+                break
+            if message[0] == "progress":
+                self.job_progress.config(value=message[1])
+                if isinstance(job, CsvImport):
+                    self.job_status.config(text=f"{message[2]:,} added, {message[3]:,} rejected")
+                else:
+                    self.job_status.config(text=f"{message[2]:,} rows written")
+            else:
+                finished = message
+
+        if finished is None:
+            self.after(100, self.poll_background_job)
+            return
+
+        self.background_job = None
+        self.job_progress.pack_forget()
+        self.job_status.pack_forget()
+
+        if finished[0] == "error":
+            action = "import" if isinstance(job, CsvImport) else "export"
+            messagebox.showerror(f"{action.title()} Failed", f"Could not {action} {job.path}.\nError: {finished[1]}")
+            self.update_listbox()
+            return
+
+        if isinstance(job, CsvImport):
+            self.update_listbox()
+            _, accepted, rejected, report_path = finished
+            summary = f"Imported {accepted:,} items.\nRejected {rejected:,} rows."
+            if report_path:
+                summary += f"\n\nRejected rows were written to:\n{report_path}"
+            messagebox.showinfo("Import Complete", summary)
+        else:
+            log.info("User %r exported %d items to %s", self.router.session.username, finished[1], job.path)
+            messagebox.showinfo("Export Complete", f"Exported {finished[1]:,} items to:\n{job.path}")
+
 if __name__ == "__main__":
-    app = App()
-    app.mainloop()
\ No newline at end of file
+    screen_router.run("inventory")
\ No newline at end of file
@@ -0,0 +1,184 @@
+import time
+import tkinter as tk
+from collections import deque
+
+# Keyboard-wedge scanners type a whole code a few milliseconds per key;
+# nobody types two keys this close together for long
+MAX_GAP_MS = 35
+# Shorter bursts are treated as typing (a quick double tap, a key roll)
+MIN_LENGTH = 6
+
+TERMINATORS = ("Return", "KP_Enter", "Tab")
+
+# event.state bits that make a key a shortcut rather than typing. Tk puts
+# Alt in a different bit per windowing system, and on Windows 0x8 is
+# NumLock, which a scanner may well leave on
+CONTROL_MASK = 0x4
+ALT_MASKS = {"win32": 0x20000, "x11": 0x8, "aqua": 0x8}   # aqua: Command; Option types characters
+
+
+def shortcut_mask(windowing_system):
+    """The event.state bits held for a shortcut under a Tk windowing system."""
+    return CONTROL_MASK | ALT_MASKS.get(windowing_system, 0x8)
+
+
+class ScanDetector:
+    """
+    Tells scanner bursts apart from typing by the time between keys.
+
+    Characters are buffered while each arrives within MAX_GAP_MS of the
+    one before. A buffer of at least MIN_LENGTH characters is a scan,
+    whether the scanner ends it with Enter/Tab or just stops; anything
+    shorter was typed by hand. Times are the key events' own timestamps,
+    so a busy UI thread that handles keys late does not change the verdict.
+
+    Every method returns (scanned code or None, typed text to release).
+    """
+    def __init__(self, max_gap_ms=MAX_GAP_MS, min_length=MIN_LENGTH):
+        self.max_gap_ms = max_gap_ms
+        self.min_length = min_length
+        self.buffer = []
+        self.last_ms = None
+
+    def _finish(self):
+        text = "".join(self.buffer)
+        self.buffer = []
+        self.last_ms = None
+        if len(text) >= self.min_length:
+            return text, ""
+        return None, text
+
+    def key(self, char, time_ms):
+        """A printable character arrived."""
+        done = (None, "")
+        if self.buffer and time_ms - self.last_ms > self.max_gap_ms:
+            done = self._finish()
+        self.buffer.append(char)
+        self.last_ms = time_ms
+        return done
+
+    def idle(self, time_ms):
+        """No key for a while: settle whatever is buffered once the gap has passed."""
+        if self.buffer and time_ms - self.last_ms > self.max_gap_ms:
+            return self._finish()
+        return None, ""
+
+    def flush(self):
+        """Settles the buffer now: Enter/Tab arrived, or scan mode was switched off."""
+        return self._finish() if self.buffer else (None, "")
+
+
+class ScannerInput:
+    """
+    Scan mode for one screen.
+
+    While enabled, key presses anywhere on the screen pass through a
+    ScanDetector before any widget sees them (a bind tag placed first on
+    every widget), so scanned digits never land in whichever field has
+    focus. Typed characters are released to the focused text field once
+    the burst window has passed, so typing still works, a few ms late.
+
+    Completed scans queue up in order and are handed to on_scan(code)
+    one per turn of the Tk loop, so back-to-back scans are neither lost
+    nor interleaved, however long each one takes to handle.
+    """
+    def __init__(self, screen, on_scan, detector=None):
+        self.screen = screen
+        self.on_scan = on_scan
+        self.detector = detector or ScanDetector()
+        self.enabled = False
+        self.pending = deque()
+        self.scanned = 0
+        self._draining = False
+        self._idle_job = None
+        # Key event time and our own clock at the last key, to tell how
+        # much event time has passed when the settle timer fires
+        self._last_event_ms = 0
+        self._last_seen_ms = 0
+        # One bind tag per screen; the window itself carries the tag of
+        # every screen, and only the one showing acts on it
+        self.tag = f"BarcodeScan{id(self)}"
+        self.shortcut_mask = shortcut_mask(screen.tk.call("tk", "windowingsystem"))
+        screen.bind_class(self.tag, "<KeyPress>", self._on_key)
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+        if enabled:
+            # Widgets may have been added since the last time
+            self._install(self.screen)
+            self._install(self.screen.winfo_toplevel())
+        else:
+            self._deliver(*self.detector.flush())
+
+    def _install(self, widget):
+        tags = widget.bindtags()
+        if self.tag not in tags:
+            widget.bindtags((self.tag,) + tags)
+        if widget is not self.screen.winfo_toplevel():
+            for child in widget.winfo_children():
+                self._install(child)
+
+    def _active(self):
+        return self.enabled and self.screen.winfo_ismapped()
+
+    def _on_key(self, event):
+        if not self._active():
+            return None
+        self._last_event_ms = event.time
+        self._last_seen_ms = time.monotonic() * 1000
+        if event.keysym in TERMINATORS:
+            code, typed = self.detector.flush()
+            self._deliver(code, typed)
+            # Swallow the scanner's Enter; a typed one goes on to the widget
+            return "break" if code is not None else None
+        if len(event.char) == 1 and event.char.isprintable() and not event.state & self.shortcut_mask:
+            self._deliver(*self.detector.key(event.char, event.time))
+            self._schedule_settle()
+            return "break"
+        return None
+
+    def _schedule_settle(self):
+        if self._idle_job is not None:
+            self.screen.after_cancel(self._idle_job)
+        self._idle_job = self.screen.after(self.detector.max_gap_ms + 5, self._settle)
+
+    def _settle(self):
+        self._idle_job = None
+        now_ms = self._last_event_ms + (time.monotonic() * 1000 - self._last_seen_ms)
+        self._deliver(*self.detector.idle(now_ms))
+
+    def _deliver(self, code, typed):
+        if typed:
+            self._release(typed)
+        if code is not None:
+            self.pending.append(code)
+            self.scanned += 1
+            if not self._draining:
+                self._draining = True
+                self.screen.after_idle(self._drain)
+
+    def _release(self, text):
+        """Puts hand-typed characters into the focused text field, as the key presses would have."""
+        widget = self.screen.focus_get()
+        if widget is None or not hasattr(widget, "insert") or not hasattr(widget, "index"):
+            return
+        try:
+            if str(widget.cget("state")) in ("disabled", "readonly"):
+                return
+        except tk.TclError:
+            pass    # no state option (Text); insert anyway
+        widget.insert("insert", text)
+
+    def _drain(self):
+        if not self.pending:
+            self._draining = False
+            return
+        code = self.pending.popleft()
+        try:
+            self.on_scan(code)
+        finally:
+            # One scan per turn, so key events of the next scan are read in between
+            if self.pending:
+                self.screen.after(1, self._drain)
+            else:
+                self._draining = False
@@ -0,0 +1,409 @@
+import sys
+import zlib
+from array import array
+from collections.abc import MutableMapping
+
+
+# Free-text fields packed into one length-prefixed blob per row
+STRING_FIELDS = ("sku", "name", "desc", "barcode")
+# Low-cardinality fields stored as codes into an intern table
+INTERNED_FIELDS = ("category", "supplier")
+
+EMPTY = -1
+DELETED = -2
+
+# Columns saved to and mapped back from an index snapshot, with their types
+COLUMNS = {"_pool": "B", "_offsets": "I", "_qty": "i", "_price": "d", "_active": "B", "_live": "B", "_index": "i"}
+CODE_TYPES = {"category": "H", "supplier": "I"}
+
+
+def _pack_strings(values):
+    """Encodes strings as varint length + UTF-8 bytes, back to back."""
+    out = bytearray()
+    for value in values:
+        data = value.encode("utf-8")
+        length = len(data)
+        while length >= 0x80:
+            out.append((length & 0x7F) | 0x80)
+            length >>= 7
+        out.append(length)
+        out += data
+    return out
+
+
+def _sku_hash(sku):
+    # Stable across processes, unlike hash(), so a saved slot table still works when mapped back in
+    return zlib.crc32(sku.encode("utf-8"))
+
+
+class Catalog(MutableMapping):
+    """
+    Columnar in-memory catalog for very large item counts.
+
+    Instead of one dict per item, every field lives in a typed column:
+    qty and price in arrays, active flags in a bytearray, category and
+    supplier as codes into an intern table, and the free-text fields
+    packed into one shared byte pool (a single offset per row). SKUs are
+    found through an open-addressing hash table of row numbers, so the
+    index costs a few bytes per item rather than a dict entry plus a str
+    object.
+
+    It behaves like a mapping of SKU -> item dict, so code written against
+    the old inventory_data dict keeps working. Rows are stable ids:
+    deleting an item tombstones its row and updates append a fresh blob,
+    until compact() reclaims the space.
+
+    A catalog loaded by from_sections() reads its columns straight from
+    a mapped snapshot file; the first write copies them into memory.
+    """
+    def __init__(self, items=()):
+        self._pool = bytearray()
+        self._offsets = array("I")     # pool offsets; the pool is capped at 4 GB
+        self._qty = array("i")
+        self._price = array("d")
+        self._active = bytearray()
+        self._live = bytearray()
+        self._codes = {field: array(typecode) for field, typecode in CODE_TYPES.items()}
+        self._interned = {field: [] for field in INTERNED_FIELDS}
+        self._intern_ids = {field: {} for field in INTERNED_FIELDS}
+
+        self._index = array("i", [EMPTY]) * 8
+        self._index_used = 0
+        self._count = 0
+        self.garbage_bytes = 0      # stale blobs left behind by updates
+        self._mapped = False
+
+        for sku, item in items:
+            self[sku] = item
+        if self._count:
+            self.trim()
+
+    # --- Row access ---
+
+    @property
+    def row_count(self):
+        """Number of rows ever allocated, live or tombstoned."""
+        return len(self._offsets)
+
+    def is_live(self, row):
+        return bool(self._live[row])
+
+    def _strings(self, row):
+        return self._decode_blob(row)[0]
+
+    def _decode_blob(self, row, fields=len(STRING_FIELDS)):
+        """Returns the row's first `fields` string fields and the pool offset just past them."""
+        view = memoryview(self._pool)
+        pos = self._offsets[row]
+        values = []
+        for _ in range(fields):
+            length = shift = 0
+            while True:
+                byte = view[pos]
+                pos += 1
+                length |= (byte & 0x7F) << shift
+                if byte < 0x80:
+                    break
+                shift += 7
+            values.append(str(view[pos:pos + length], "utf-8"))
+            pos += length
+        return values, pos
+
+    def sku_at(self, row):
+        # The SKU is the first field of the blob, so only it gets decoded
+        return self._decode_blob(row, 1)[0][0]
+
+    def name_at(self, row):
+        return self._decode_blob(row, 2)[0][1]
+
+    def barcode_at(self, row):
+        return self._decode_blob(row)[0][3]
+
+    def item_at(self, row):
+        """Decodes one row into the same dict shape the store returns."""
+        sku, name, desc, barcode = self._strings(row)
+        return {
+            "name": name,
+            "qty": self._qty[row],
+            "price": self._price[row],
+            "desc": desc,
+            "category": self._interned["category"][self._codes["category"][row]],
+            "barcode": barcode,
+            "supplier": self._interned["supplier"][self._codes["supplier"][row]],
+            "active": self._active[row],
+        }
+
+    def qty_at(self, row):
+        return self._qty[row]
+
+    def price_at(self, row):
+        return self._price[row]
+
+    def active_at(self, row):
+        return self._active[row]
+
+    def category_at(self, row):
+        return self._interned["category"][self._codes["category"][row]]
+
+    # --- SKU hash index ---
+
+    def _probe(self, sku):
+        """Returns (slot, row) for sku, or (insert slot, None) if it is absent."""
+        mask = len(self._index) - 1
+        slot = _sku_hash(sku) & mask
+        free = None
+        while True:
+            row = self._index[slot]
+            if row == EMPTY:
+                return (free if free is not None else slot), None
+            if row == DELETED:
+                if free is None:
+                    free = slot
+            elif self.sku_at(row) == sku:
+                return slot, row
+            slot = (slot + 1) & mask
+
+    def _grow_index(self):
+        rows = [row for row in self._index if row >= 0]
+        size = len(self._index)
+        while len(rows) * 2 >= size:
+            size *= 2
+        self._index = array("i", [EMPTY]) * size
+        mask = size - 1
+        for row in rows:
+            slot = _sku_hash(self.sku_at(row)) & mask
+            while self._index[slot] != EMPTY:
+                slot = (slot + 1) & mask
+            self._index[slot] = row
+        self._index_used = len(rows)
+
+    def row_of(self, sku):
+        """O(1) SKU -> row lookup; returns None if the SKU is not live."""
+        return self._probe(sku)[1]
+
+    # --- Mapping API ---
+
+    def _intern(self, field, value):
+        ids = self._intern_ids[field]
+        code = ids.get(value)
+        if code is None:
+            code = ids[value] = len(self._interned[field])
+            self._interned[field].append(value)
+        return code
+
+    def __setitem__(self, sku, item):
+        if self._mapped:
+            self._unmap()
+        slot, row = self._probe(sku)
+        full = {"desc": "", "category": "", "barcode": "", "supplier": "", "active": 1}
+        if row is not None:
+            full.update(self.item_at(row))
+        full.update(item)
+
+        # Everything is packed into its column type first, so a value that
+        # does not fit (a qty past int32, say) raises before any column has
+        # grown and the columns stay aligned row for row
+        blob = _pack_strings((sku, full["name"], full["desc"], full["barcode"]))
+        offset = array("I", [len(self._pool)])
+        qty = array("i", [full["qty"]])
+        price = array("d", [full["price"]])
+        codes = {field: array(typecode, [self._intern(field, full[field])]) for field, typecode in CODE_TYPES.items()}
+        active = 1 if full["active"] else 0
+        self._pool += blob
+
+        if row is None:
+            row = len(self._offsets)
+            self._offsets += offset
+            self._qty += qty
+            self._price += price
+            self._active.append(active)
+            self._live.append(1)
+            for field in INTERNED_FIELDS:
+                self._codes[field] += codes[field]
+            self._index[slot] = row
+            self._index_used += 1
+            self._count += 1
+            if self._index_used * 3 >= len(self._index) * 2:
+                self._grow_index()
+        else:
+            self.garbage_bytes += self._decode_blob(row)[1] - self._offsets[row]
+            self._offsets[row] = offset[0]
+            self._qty[row] = qty[0]
+            self._price[row] = price[0]
+            self._active[row] = active
+            for field in INTERNED_FIELDS:
+                self._codes[field][row] = codes[field][0]
+
+    def __getitem__(self, sku):
+        row = self._probe(sku)[1]
+        if row is None:
+            raise KeyError(sku)
+        return self.item_at(row)
+
+    def __delitem__(self, sku):
+        if self._mapped:
+            self._unmap()
+        slot, row = self._probe(sku)
+        if row is None:
+            raise KeyError(sku)
+        self._index[slot] = DELETED
+        self._live[row] = 0
+        self._count -= 1
+
+    def __contains__(self, sku):
+        return self._probe(sku)[1] is not None
+
+    def __iter__(self):
+        for row in range(len(self._offsets)):
+            if self._live[row]:
+                yield self.sku_at(row)
+
+    def __len__(self):
+        return self._count
+
+    def live_rows(self):
+        return (row for row in range(len(self._offsets)) if self._live[row])
+
+    # --- Maintenance ---
+
+    def compact(self):
+        """
+        Rewrites the columns without tombstoned rows or stale string blobs.
+        Row numbers change, so indexes built over this catalog must be rebuilt.
+        """
+        rows = [(self.sku_at(row), self.item_at(row)) for row in self.live_rows()]
+        self.__init__(rows)
+
+    def trim(self):
+        """Releases the growth slack left in the pool and columns after a bulk load."""
+        self._pool = bytearray(self._pool)
+        self._active = bytearray(self._active)
+        self._live = bytearray(self._live)
+        for name in ("_offsets", "_qty", "_price"):
+            setattr(self, name, array(getattr(self, name).typecode, getattr(self, name)))
+        self._codes = {field: array(column.typecode, column) for field, column in self._codes.items()}
+
+    def shard(self, start, stop):
+        """
+        Rows start..stop-1 as a catalog of their own, numbered from 0, to
+        hand to another process: only those rows' columns and string blobs
+        are copied. It has no SKU index, so only the row accessors work.
+        """
+        shard = Catalog.__new__(Catalog)
+        offsets = self._offsets[start:stop]
+        begin = end = 0
+        if len(offsets):
+            begin = min(offsets)
+            end = self._decode_blob(start + max(range(len(offsets)), key=offsets.__getitem__))[1]
+        shard._pool = bytearray(self._pool[begin:end])
+        shard._offsets = array("I", (offset - begin for offset in offsets))
+        shard._qty = array("i", self._qty[start:stop])
+        shard._price = array("d", self._price[start:stop])
+        shard._active = bytearray(self._active[start:stop])
+        shard._live = bytearray(self._live[start:stop])
+        shard._codes = {field: array(CODE_TYPES[field], column[start:stop]) for field, column in self._codes.items()}
+        shard._interned = self._interned
+        shard._intern_ids = {}
+        shard._index = array("i", [EMPTY]) * 8
+        shard._index_used = 0
+        shard._count = shard._live.count(1)
+        shard.garbage_bytes = 0
+        shard._mapped = False
+        return shard
+
+    # --- Snapshots ---
+
+    def sections(self):
+        """The columns to save, by name, and the small tables that go in the snapshot header."""
+        columns = {name: getattr(self, name) for name in COLUMNS}
+        for field, column in self._codes.items():
+            columns[f"_codes.{field}"] = column
+        meta = {
+            "interned": {field: list(values) for field, values in self._interned.items()},
+            "count": self._count,
+            "index_used": self._index_used,
+            "garbage_bytes": self.garbage_bytes,
+        }
+        return columns, meta
+
+    @classmethod
+    def from_sections(cls, columns, meta):
+        """
+        A catalog over read-only memoryviews of saved columns, as returned
+        by sections(). Nothing is decoded up front; pages of the file are
+        read as rows are looked at.
+        """
+        catalog = cls.__new__(cls)
+        for name in COLUMNS:
+            setattr(catalog, name, columns[name])
+        catalog._codes = {field: columns[f"_codes.{field}"] for field in INTERNED_FIELDS}
+        catalog._interned = {field: list(meta["interned"][field]) for field in INTERNED_FIELDS}
+        catalog._intern_ids = {field: {value: code for code, value in enumerate(values)}
+                               for field, values in catalog._interned.items()}
+        catalog._index_used = meta["index_used"]
+        catalog._count = meta["count"]
+        catalog.garbage_bytes = meta["garbage_bytes"]
+        catalog._mapped = True
+        return catalog
+
+    def _unmap(self):
+        """Copies mapped columns into writable memory, once, before the first write."""
+        self._pool = bytearray(self._pool)
+        self._active = bytearray(self._active)
+        self._live = bytearray(self._live)
+        for name in ("_offsets", "_qty", "_price", "_index"):
+            column = array(COLUMNS[name])
+            column.frombytes(getattr(self, name).cast("B"))
+            setattr(self, name, column)
+        codes = {}
+        for field, view in self._codes.items():
+            codes[field] = array(view.format)
+            codes[field].frombytes(view.cast("B"))
+        self._codes = codes
+        self._mapped = False
+
+    def nbytes(self):
+        """Approximate bytes held by the columns, intern tables and index."""
+        size = len(self._pool) + len(self._active) + len(self._live)
+        for column in (self._offsets, self._qty, self._price, self._index, *self._codes.values()):
+            size += column.itemsize * len(column)
+        for values in self._interned.values():
+            size += sum(sys.getsizeof(value) for value in values)
+        return size
+
+
+def benchmark(count=200_000):
+    """Compares resident memory of a dict-of-dicts catalog and a Catalog."""
+    import gc
+    import tracemalloc
+
+    def synthetic():
+        categories = ("Hardware", "Electrical", "Plumbing", "Paint", "Tools")
+        for i in range(count):
+            yield f"SKU{i:08d}", {
+                "name": f"Item {i} {categories[i % 5]} part",
+                "qty": i % 500,
+                "price": 1.0 + (i % 1000) / 4,
+                "desc": f"Synthetic description for item number {i}.",
+                "category": categories[i % 5],
+                "barcode": f"480{i:010d}",
+                "supplier": f"Supplier {i % 40}",
+                "active": 1,
+            }
+
+    results = {}
+    for label, build in (("dict of dicts", dict), ("Catalog", Catalog)):
+        gc.collect()
+        tracemalloc.start()
+        data = build(synthetic())
+        used = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        results[label] = used
+        print(f"{label:>14}: {used / 2**20:8.1f} MB  ({used / count:6.1f} bytes/item)")
+        del data
+
+    print(f"{'reduction':>14}: {results['dict of dicts'] / results['Catalog']:.1f}x for {count:,} items")
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
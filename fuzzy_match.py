@@ -0,0 +1,181 @@
+import sys
+import time
+from collections import Counter
+
+
+def levenshtein(a, b, limit):
+    """
+    Edit distance between a and b, or limit + 1 as soon as it is certain
+    to exceed limit. Only the band of cells within `limit` of the diagonal
+    is filled in, so the cost is len * (2 * limit + 1) rather than len ** 2.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if len(a) > len(b):
+        a, b = b, a
+    too_far = limit + 1
+    width = len(b)
+    previous = list(range(width + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [too_far] * (width + 1)
+        current[0] = i if i <= limit else too_far
+        best = current[0]
+        for j in range(max(1, i - limit), min(width, i + limit) + 1):
+            value = previous[j - 1] + (char_a != b[j - 1])
+            if previous[j] + 1 < value:
+                value = previous[j] + 1
+            if current[j - 1] + 1 < value:
+                value = current[j - 1] + 1
+            current[j] = value
+            if value < best:
+                best = value
+        if best > limit:
+            return too_far
+        previous = current
+    return min(previous[width], too_far)
+
+
+def max_typos(token):
+    """Edits tolerated for a token of this length; short words get fewer."""
+    if len(token) < 3:
+        return 0
+    return 1 if len(token) <= 5 else 2
+
+
+class TokenVocabulary:
+    """
+    Trigram index over the distinct words of product names, for typo lookup.
+
+    Each word is padded with two spaces on both sides, so a word of length
+    n has n + 2 trigrams and one edit can break at most three of them.
+    A word within k edits of the query must therefore share at least
+    (query trigrams - 3k) trigrams with it; only words passing that count
+    filter are checked with a bounded edit distance, best overlap first,
+    until the deadline.
+    """
+    def __init__(self, words=()):
+        self.grams = {}
+        for word in words:
+            self.add(word)
+
+    @staticmethod
+    def _grams(word):
+        padded = f"  {word}  "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def add(self, word):
+        for gram in self._grams(word):
+            self.grams.setdefault(gram, set()).add(word)
+
+    def remove(self, word):
+        for gram in self._grams(word):
+            words = self.grams.get(gram)
+            if words is not None:
+                words.discard(word)
+                if not words:
+                    del self.grams[gram]
+
+    def similar(self, token, deadline=None):
+        """
+        Returns [(word, distance)] for vocabulary words within max_typos(token)
+        edits, closest first. Stops once time.perf_counter() passes
+        `deadline`, whether still counting shared trigrams (a common trigram
+        can list much of the vocabulary) or checking candidates, returning
+        what it has found so far.
+        """
+        limit = max_typos(token)
+        if not limit:
+            return []
+        query_grams = self._grams(token)
+        counts = Counter()
+        for gram in query_grams:
+            if deadline is not None and time.perf_counter() > deadline:
+                return []
+            words = self.grams.get(gram)
+            if words:
+                counts.update(words)
+
+        needed = max(1, len(query_grams) - 3 * limit)
+        candidates = [(shared, word) for word, shared in counts.items()
+                      if shared >= needed and abs(len(word) - len(token)) <= limit]
+        candidates = [word for _, word in sorted(candidates, reverse=True)]
+        found = []
+        for checked, word in enumerate(candidates):
+            if deadline is not None and checked % 32 == 0 and time.perf_counter() > deadline:
+                break
+            if word == token:
+                continue
+            distance = levenshtein(token, word, limit)
+            if distance <= limit:
+                found.append((word, distance))
+        found.sort(key=lambda pair: pair[1])
+        return found
+
+
+# --- Benchmark ---
+
+def _typo(word, rng):
+    """One random substitution, insertion or deletion."""
+    pos = rng.randrange(len(word))
+    letter = rng.choice("abcdefghijklmnopqrstuvwxyz")
+    kind = rng.randrange(3)
+    if kind == 0:
+        return word[:pos] + letter + word[pos + 1:]
+    if kind == 1:
+        return word[:pos] + letter + word[pos:]
+    return word[:pos] + word[pos + 1:]
+
+
+def benchmark(count=500_000, queries=500):
+    """
+    Recall and latency of single-word name searches with one typo, over
+    `count` synthetic names drawn from a 40k-word vocabulary.
+    """
+    import random
+    from catalog import Catalog
+    from search_engine import SearchIndex, make_query
+
+    rng = random.Random(11)
+    consonants, vowels = "bcdfghjklmnprstvwz", "aeiou"
+    vocabulary = set()
+    while len(vocabulary) < 40_000:
+        syllables = rng.randint(2, 4)
+        vocabulary.add("".join(rng.choice(consonants) + rng.choice(vowels) for _ in range(syllables)))
+    vocabulary = sorted(vocabulary)
+
+    def items():
+        for i in range(count):
+            yield f"SKU{i:08d}", {
+                "name": " ".join(rng.choice(vocabulary) for _ in range(3)),
+                "qty": 1, "price": 1.0, "category": "Hardware",
+            }
+
+    start = time.perf_counter()
+    index = SearchIndex(Catalog(items()))
+    print(f"built index over {count:,} names in {time.perf_counter() - start:.1f} s")
+
+    timings, found, first_page, real_words = [], 0, 0, 0
+    for _ in range(queries):
+        word = rng.choice(vocabulary)
+        typo = _typo(word, rng)
+        start = time.perf_counter()
+        result = index.search(make_query(typo, "Product Name"))
+        timings.append((time.perf_counter() - start) * 1000)
+
+        if typo in index.postings["name"]:
+            real_words += 1     # the typo is itself a catalog word; exact hits win
+        rows = set(index.postings["name"].get(word, ()))
+        positions = [position for position, row in enumerate(result.rows) if row in rows]
+        found += bool(positions)
+        first_page += bool(positions) and positions[0] < 50
+
+    timings.sort()
+    print(f"recall: {found / queries:.1%} found the intended word, "
+          f"{first_page / queries:.1%} on the first page of 50 "
+          f"({real_words} typos were real words themselves)")
+    print(f"latency: p50 {timings[len(timings) // 2]:.2f} ms  p99 {timings[int(len(timings) * 0.99)]:.2f} ms  "
+          f"(fuzzy budget {index.FUZZY_BUDGET * 1000:.0f} ms)")
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 500_000)
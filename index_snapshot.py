@@ -0,0 +1,307 @@
+import json
+import mmap
+import os
+import struct
+import zlib
+from array import array
+from collections.abc import MutableMapping
+
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "search_index")
+
+MAGIC = b"JBSIDX\r\n"
+# Bumped whenever the layout of any section changes; older files are rebuilt
+FORMAT_VERSION = 2
+# magic, format version, header length; followed by the JSON header and the sections
+PREAMBLE = struct.Struct("<8sII")
+# Sections start on 8-byte boundaries so every typed view is aligned
+ALIGN = 8
+
+EMPTY_SLOT = 0xFFFFFFFF
+
+
+def _padding(size):
+    return b"\0" * (-size % ALIGN)
+
+
+def snapshot_name(seq):
+    return f"index-{seq:012d}.snap"
+
+
+def snapshot_paths(directory=DEFAULT_DIR):
+    """Saved snapshots, newest first."""
+    try:
+        names = sorted((name for name in os.listdir(directory) if name.endswith(".snap")), reverse=True)
+    except FileNotFoundError:
+        return []
+    return [os.path.join(directory, name) for name in names]
+
+
+class SnapshotWriter:
+    """
+    Collects named, typed sections and writes them to one file behind a
+    JSON header: the header lists every section's offset, length and
+    array typecode, plus whatever metadata the caller passes to write().
+
+    The file is written under a temporary name, fsynced and renamed into
+    place, so a reader only ever sees a complete snapshot.
+    """
+    def __init__(self):
+        self.sections = []
+
+    def add(self, name, column):
+        """Adds an array, memoryview, bytes or bytearray column."""
+        typecode = getattr(column, "typecode", None) or getattr(column, "format", "B")
+        self.sections.append((name, typecode, bytes(column) if typecode == "B" else column.tobytes()))
+
+    def write(self, path, meta):
+        layout, offset = {}, 0
+        for name, typecode, data in self.sections:
+            layout[name] = [offset, len(data), typecode]
+            offset += len(data) + len(_padding(len(data)))
+        header = json.dumps({"meta": meta, "sections": layout}, separators=(",", ":")).encode("utf-8")
+
+        temporary = path + ".tmp"
+        with open(temporary, "wb") as out:
+            out.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)))
+            out.write(header)
+            out.write(_padding(PREAMBLE.size + len(header)))
+            for _, _, data in self.sections:
+                out.write(data)
+                out.write(_padding(len(data)))
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(temporary, path)
+
+
+class Snapshot:
+    """
+    A snapshot file mapped read-only. snapshot[name] is a memoryview of
+    one section cast to its typecode; nothing is read until the view is
+    touched, and then only the pages touched. Raises ValueError for a
+    file that is not a snapshot of this format version.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.map) < PREAMBLE.size:
+            raise ValueError(f"{path} is truncated")
+        magic, version, header_length = PREAMBLE.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a search index snapshot")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"{path} is format {version}, expected {FORMAT_VERSION}")
+        header = json.loads(self.map[PREAMBLE.size:PREAMBLE.size + header_length])
+        self.meta = header["meta"]
+        self.layout = header["sections"]
+        self.start = PREAMBLE.size + header_length
+        self.start += -self.start % ALIGN
+        end = max((offset + length for offset, length, _ in self.layout.values()), default=0)
+        if self.start + end > len(self.map):
+            raise ValueError(f"{path} is truncated")
+        self.view = memoryview(self.map)
+
+    def __contains__(self, name):
+        return name in self.layout
+
+    def __getitem__(self, name):
+        offset, length, typecode = self.layout[name]
+        view = self.view[self.start + offset:self.start + offset + length]
+        return view if typecode == "B" else view.cast(typecode)
+
+
+# --- Posting tables ---
+
+class MappedPostings(MutableMapping):
+    """
+    A key -> posting list table read from a snapshot, with changes since
+    kept in memory.
+
+    Keys are stored sorted, as one UTF-8 blob plus an offset per key, and
+    found by binary search; a posting list comes back as a memoryview of
+    the file. `changed` overlays the file: a key written since loading
+    maps to its in-memory array, a deleted key to None. add_posting() and
+    remove_posting() copy a mapped list into `changed` before changing it.
+    """
+    def __init__(self, keys, key_offsets, offsets, rows):
+        self.keys = keys
+        self.key_offsets = key_offsets
+        self.offsets = offsets
+        self.rows = rows
+        self.changed = {}
+
+    @staticmethod
+    def save(writer, name, postings):
+        """Adds the sections for a posting table (a dict or a MappedPostings) to writer."""
+        blob = bytearray()
+        key_offsets = array("I", [0])
+        offsets = array("Q", [0])
+        rows = array("I")
+        for key in sorted(postings):
+            blob += key.encode("utf-8")
+            key_offsets.append(len(blob))
+            rows.frombytes(memoryview(postings[key]).cast("B"))
+            offsets.append(len(rows))
+        for suffix, column in (("keys", blob), ("key_offsets", key_offsets), ("offsets", offsets), ("rows", rows)):
+            writer.add(f"{name}.{suffix}", column)
+
+    @classmethod
+    def load(cls, snapshot, name):
+        return cls(*(snapshot[f"{name}.{suffix}"] for suffix in ("keys", "key_offsets", "offsets", "rows")))
+
+    def copy(self):
+        """A copy that later changes to this table do not reach. The mapped sections are shared."""
+        copy = MappedPostings(self.keys, self.key_offsets, self.offsets, self.rows)
+        copy.changed = {key: None if posting is None else posting[:] for key, posting in self.changed.items()}
+        return copy
+
+    def _key(self, index):
+        return bytes(self.keys[self.key_offsets[index]:self.key_offsets[index + 1]])
+
+    def _mapped(self, key):
+        """The list saved for key, or None."""
+        wanted = key.encode("utf-8")
+        low, high = 0, len(self.key_offsets) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < wanted:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self.key_offsets) - 1 and self._key(low) == wanted:
+            return self.rows[self.offsets[low]:self.offsets[low + 1]]
+        return None
+
+    def get(self, key, default=None):
+        posting = self.changed.get(key, self)
+        if posting is self:
+            posting = self._mapped(key)
+        return default if posting is None else posting
+
+    def __getitem__(self, key):
+        posting = self.get(key)
+        if posting is None:
+            raise KeyError(key)
+        return posting
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __setitem__(self, key, posting):
+        self.changed[key] = posting
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self.changed[key] = None
+
+    def __iter__(self):
+        changed = self.changed
+        for index in range(len(self.key_offsets) - 1):
+            key = str(self._key(index), "utf-8")
+            if key not in changed:
+                yield key
+        yield from (key for key, posting in changed.items() if posting is not None)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+# --- Barcode table ---
+
+def barcode_hash(barcode):
+    return zlib.crc32(barcode.encode("utf-8"))
+
+
+def save_barcodes(writer, barcodes):
+    """
+    Adds an open-addressing table of (hash, row) slots for a barcode ->
+    row dict or MappedBarcodes. Barcodes themselves are not saved; a probe
+    checks the catalog's barcode for the row it lands on.
+    """
+    entries = barcodes.entries() if isinstance(barcodes, MappedBarcodes) else \
+        [(barcode_hash(barcode), row) for barcode, row in barcodes.items()]
+    size = 8
+    while size < 2 * len(entries):
+        size *= 2
+    mask = size - 1
+    hashes = array("I", bytes(4 * size))
+    rows = array("I", [EMPTY_SLOT]) * size
+    for code, row in entries:
+        slot = code & mask
+        while rows[slot] != EMPTY_SLOT:
+            slot = (slot + 1) & mask
+        hashes[slot] = code
+        rows[slot] = row
+    writer.add("barcodes.hashes", hashes)
+    writer.add("barcodes.rows", rows)
+
+
+class MappedBarcodes:
+    """
+    Exact barcode -> row lookups against a saved table, with changes since
+    loading kept in memory: `changed` maps barcodes added since (or None
+    once removed again), and `removed` holds the saved (hash, row) slots
+    that no longer count. Offers the dict methods SearchIndex uses.
+    """
+    def __init__(self, hashes, rows, barcode_at):
+        self.hashes = hashes
+        self.rows = rows
+        self.barcode_at = barcode_at
+        self.changed = {}
+        self.removed = set()
+
+    @classmethod
+    def load(cls, snapshot, barcode_at):
+        return cls(snapshot["barcodes.hashes"], snapshot["barcodes.rows"], barcode_at)
+
+    def copy(self):
+        """A copy that later changes to this table do not reach. The mapped sections are shared."""
+        copy = MappedBarcodes(self.hashes, self.rows, self.barcode_at)
+        copy.changed = dict(self.changed)
+        copy.removed = set(self.removed)
+        return copy
+
+    def _mapped(self, barcode):
+        """(hash, row) of the saved slot for barcode, or None."""
+        code = barcode_hash(barcode)
+        hashes, rows = self.hashes, self.rows
+        mask = len(rows) - 1
+        slot = code & mask
+        while rows[slot] != EMPTY_SLOT:
+            row = rows[slot]
+            if hashes[slot] == code and (code, row) not in self.removed and self.barcode_at(row) == barcode:
+                return code, row
+            slot = (slot + 1) & mask
+        return None
+
+    def get(self, barcode, default=None):
+        if barcode in self.changed:
+            row = self.changed[barcode]
+            return default if row is None else row
+        found = self._mapped(barcode)
+        return default if found is None else found[1]
+
+    def setdefault(self, barcode, row):
+        current = self.get(barcode)
+        if current is not None:
+            return current
+        self.changed[barcode] = row
+        return row
+
+    def __delitem__(self, barcode):
+        if self.get(barcode) is None:
+            raise KeyError(barcode)
+        found = self._mapped(barcode)
+        if found is not None:
+            self.removed.add(found)
+        self.changed[barcode] = None
+
+    def entries(self):
+        """Every current (hash, row) pair, for saving."""
+        hashes, removed = self.hashes, self.removed
+        entries = [(hashes[slot], row) for slot, row in enumerate(self.rows)
+                   if row != EMPTY_SLOT and (hashes[slot], row) not in removed]
+        entries.extend((barcode_hash(barcode), row) for barcode, row in self.changed.items() if row is not None)
+        return entries
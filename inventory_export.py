@@ -0,0 +1,179 @@
+import csv
+import json
+import struct
+import threading
+from array import array
+
+from inventory_store import ITEM_FIELDS
+
+
+COLUMNS = ("sku",) + ITEM_FIELDS
+
+# Columnar format: magic, then a JSON header describing the columns, then
+# row groups. Each group is a row count followed by one block per column.
+# Fixed-width numbers are raw little-endian arrays. String columns are
+# either dictionary-encoded (a small value table plus one-byte codes, which
+# suits category and supplier) or plain (a narrow lengths array plus the
+# concatenated UTF-8 bytes).
+COLUMNAR_MAGIC = b"JBSNCOL2"
+COLUMN_TYPES = {"qty": "i", "price": "d", "active": "B"}
+U32 = struct.Struct("<I")
+
+FORMATS = {
+    "csv": ("CSV (spreadsheet)", ".csv"),
+    "columnar": ("Columnar binary", ".jbcol"),
+}
+
+
+def write_csv(path, batches, on_batch=None):
+    rows_written = 0
+    with open(path, "w", newline="", encoding="utf-8") as out:
+        writer = csv.writer(out)
+        writer.writerow(COLUMNS)
+        for rows in batches:
+            writer.writerows(rows)
+            rows_written += len(rows)
+            if on_batch is not None and on_batch(rows_written) is False:
+                break
+    return rows_written
+
+
+def _write_plain_strings(out, values):
+    encoded = [value.encode("utf-8") for value in values]
+    lengths = [len(value) for value in encoded]
+    longest = max(lengths, default=0)
+    typecode = "B" if longest < 0x100 else "H" if longest < 0x10000 else "I"
+    out.write(typecode.encode("ascii"))
+    out.write(array(typecode, lengths).tobytes())
+    out.write(b"".join(encoded))
+
+
+def _read_plain_strings(source, count):
+    lengths = array(source.read(1).decode("ascii"))
+    lengths.frombytes(source.read(lengths.itemsize * count))
+    data = source.read(sum(lengths))
+    values, pos = [], 0
+    for length in lengths:
+        values.append(data[pos:pos + length].decode("utf-8"))
+        pos += length
+    return values
+
+
+def _write_strings(out, values):
+    distinct = set(values)
+    if len(distinct) < 0x100 and len(distinct) * 8 < len(values):
+        table = sorted(distinct)
+        codes = {value: code for code, value in enumerate(table)}
+        out.write(b"D")
+        out.write(U32.pack(len(table)))
+        _write_plain_strings(out, table)
+        out.write(bytes(codes[value] for value in values))
+    else:
+        out.write(b"P")
+        _write_plain_strings(out, values)
+
+
+def _read_strings(source, count):
+    if source.read(1) == b"D":
+        table = _read_plain_strings(source, U32.unpack(source.read(U32.size))[0])
+        return [table[code] for code in source.read(count)]
+    return _read_plain_strings(source, count)
+
+
+def write_columnar(path, batches, on_batch=None):
+    rows_written = 0
+    with open(path, "wb") as out:
+        header = json.dumps({"columns": [[name, COLUMN_TYPES.get(name, "str")] for name in COLUMNS]}).encode("utf-8")
+        out.write(COLUMNAR_MAGIC)
+        out.write(U32.pack(len(header)))
+        out.write(header)
+
+        for rows in batches:
+            out.write(U32.pack(len(rows)))
+            for name, column in zip(COLUMNS, zip(*rows)):
+                typecode = COLUMN_TYPES.get(name)
+                if typecode is not None:
+                    out.write(array(typecode, column).tobytes())
+                else:
+                    _write_strings(out, column)
+            rows_written += len(rows)
+            if on_batch is not None and on_batch(rows_written) is False:
+                break
+    return rows_written
+
+
+def read_columnar(path):
+    """Yields (sku, item) pairs back out of a columnar export, one row group at a time."""
+    with open(path, "rb") as source:
+        if source.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+            raise ValueError(f"{path} is not a columnar inventory export.")
+        header = json.loads(source.read(U32.unpack(source.read(U32.size))[0]))
+        names = [name for name, _ in header["columns"]]
+
+        while True:
+            prefix = source.read(U32.size)
+            if not prefix:
+                return
+            count = U32.unpack(prefix)[0]
+            values = []
+            for name, kind in header["columns"]:
+                if kind == "str":
+                    values.append(_read_strings(source, count))
+                else:
+                    column = array(kind)
+                    column.frombytes(source.read(column.itemsize * count))
+                    values.append(column)
+            for i in range(count):
+                row = {name: column[i] for name, column in zip(names, values)}
+                yield row.pop("sku"), row
+
+
+WRITERS = {"csv": write_csv, "columnar": write_columnar}
+
+
+class InventoryExport:
+    """
+    Streams the catalog out of the store on a background thread.
+
+    Rows arrive from InventoryStore.stream_rows() in batches with the
+    category / in-stock filters already applied by SQLite, and each batch
+    is written before the next is fetched, so no copy of the catalog is
+    ever held. Like CsvImport, the worker only posts to `messages`:
+
+        ("progress", fraction, rows written)
+        ("done", rows written)
+        ("error", message)
+    """
+    def __init__(self, path, store, messages, fmt="csv", category=None, in_stock_only=False, batch_size=5000):
+        self.path = path
+        self.store = store
+        self.messages = messages
+        self.fmt = fmt
+        self.category = category
+        self.in_stock_only = in_stock_only
+        self.batch_size = batch_size
+        self.cancelled = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="inventory-export", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def _run(self):
+        try:
+            self.messages.put(("done", self.run()))
+        except Exception as e:
+            self.messages.put(("error", str(e)))
+
+    def run(self):
+        """Performs the export on the calling thread and returns the number of rows written."""
+        total = self.store.count_rows(self.category, self.in_stock_only) or 1
+
+        def on_batch(rows_written):
+            self.messages.put(("progress", rows_written / total, rows_written))
+            return not self.cancelled.is_set()
+
+        batches = self.store.stream_rows(self.category, self.in_stock_only, self.batch_size)
+        return WRITERS[self.fmt](self.path, batches, on_batch)
@@ -0,0 +1,128 @@
+import csv
+import io
+import os
+import threading
+
+from inventory_store import validate_item
+
+
+# Optional columns copied through to the store when present
+EXTRA_COLUMNS = ("category", "barcode", "supplier")
+
+
+def validate_rows(rows, make_sku):
+    """
+    Applies the CRUD form's validation rules to one chunk of CSV rows.
+    Returns (accepted [(sku, item)], rejected [(line number, reason, row)]).
+    """
+    accepted, rejected = [], []
+    for line_no, row in rows:
+        try:
+            item = validate_item(
+                (row.get("name") or "").strip(),
+                (row.get("qty") or "").strip(),
+                (row.get("price") or "").strip(),
+                (row.get("desc") or "").strip(),
+            )
+        except ValueError as e:
+            rejected.append((line_no, str(e), row))
+            continue
+        for column in EXTRA_COLUMNS:
+            value = (row.get(column) or "").strip()
+            if value:
+                item[column] = value
+        sku = (row.get("sku") or "").strip() or make_sku()
+        accepted.append((sku, item))
+    return accepted, rejected
+
+
+class CsvImport:
+    """
+    Streams a supplier CSV into the inventory store on a background thread.
+
+    The file is read and validated chunk_size rows at a time and each chunk
+    is committed as one upsert transaction, so memory stays bounded by the
+    chunk rather than the file. Rejected rows go straight to a
+    '<file>.rejected.csv' report next to the source. The worker never
+    touches Tk: progress and the final result are posted to `messages`
+    (a queue.Queue) for the UI thread to pick up. Chunks are written as
+    `user`, which the store records in its journal.
+
+    Message shapes:
+        ("progress", fraction, accepted, rejected)
+        ("done", accepted, rejected, report_path or None)
+        ("error", message)
+    """
+    def __init__(self, path, store, messages, make_sku, chunk_size=2000, user=""):
+        self.path = path
+        self.store = store
+        self.user = user
+        self.messages = messages
+        self.make_sku = make_sku
+        self.chunk_size = chunk_size
+        self.report_path = os.path.splitext(path)[0] + ".rejected.csv"
+        self.cancelled = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="csv-import", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def _run(self):
+        try:
+            self.messages.put(("done",) + self.run())
+        except Exception as e:
+            self.messages.put(("error", str(e)))
+
+    def run(self):
+        """Performs the import on the calling thread; returns (accepted, rejected, report path)."""
+        total_bytes = os.path.getsize(self.path) or 1
+        self.accepted = self.rejected = 0
+        self._report = self._report_writer = None
+
+        with open(self.path, "rb") as raw:
+            text = io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+            reader = csv.DictReader(text)
+            if reader.fieldnames:
+                reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+
+            try:
+                chunk = []
+                for row in reader:
+                    chunk.append((reader.line_num, row))
+                    if len(chunk) == self.chunk_size:
+                        self._commit_chunk(chunk, reader.fieldnames)
+                        chunk = []
+                        # raw.tell() is the byte position of the buffered reader
+                        self.messages.put(("progress", raw.tell() / total_bytes, self.accepted, self.rejected))
+                        if self.cancelled.is_set():
+                            break
+                else:
+                    if chunk:
+                        self._commit_chunk(chunk, reader.fieldnames)
+                    self.messages.put(("progress", 1.0, self.accepted, self.rejected))
+            finally:
+                if self._report is not None:
+                    self._report.close()
+
+        return self.accepted, self.rejected, self.report_path if self._report is not None else None
+
+    def _commit_chunk(self, chunk, fieldnames):
+        accepted, rejected = validate_rows(chunk, self.make_sku)
+        if accepted:
+            # Only overwrite the optional columns this file actually carries
+            fields = ("name", "qty", "price") + tuple(f for f in ("desc",) + EXTRA_COLUMNS if f in fieldnames)
+            self.store.upsert_many(accepted, fields, user=self.user)
+        if rejected:
+            if self._report is None:
+                self._report = open(self.report_path, "w", newline="", encoding="utf-8")
+                self._report_writer = csv.writer(self._report)
+                self._report_writer.writerow(["line", "reason"] + fieldnames)
+            self._report_writer.writerows(
+                [line_no, reason] + [row.get(field, "") for field in fieldnames]
+                for line_no, reason, row in rejected
+            )
+        self.accepted += len(accepted)
+        self.rejected += len(rejected)
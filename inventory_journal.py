@@ -0,0 +1,378 @@
+import json
+import logging
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+
+from catalog import Catalog
+
+log = logging.getLogger(__name__)
+
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "journal")
+DEFAULT_SEGMENT_BYTES = 16 * 1024 * 1024
+
+OP_ADD = 1
+OP_EDIT = 2
+OP_REMOVE = 3
+OP_UPSERT = 4    # bulk import / seed rows; "new" only carries the fields that were written
+
+OP_NAMES = {OP_ADD: "add", OP_EDIT: "edit", OP_REMOVE: "remove", OP_UPSERT: "upsert"}
+
+# Every record is framed as payload length + CRC32 of the payload, so a
+# torn write at the tail of a segment is detected and ignored on replay.
+FRAME = struct.Struct("<II")
+# seq, unix time, op, user length, sku length; followed by user, sku and
+# a JSON {"old": ..., "new": ...} body
+HEAD = struct.Struct("<QdBHH")
+
+# Straight to the C scanner; json.loads() spends as long sniffing the
+# encoding of each short body as it does parsing it
+_decode_body = json.JSONDecoder().raw_decode
+
+
+def _encode(seq, timestamp, op, user, sku, old, new):
+    user_bytes = user.encode("utf-8")
+    sku_bytes = sku.encode("utf-8")
+    body = json.dumps({"old": old, "new": new}, separators=(",", ":")).encode("utf-8")
+    payload = HEAD.pack(seq, timestamp, op, len(user_bytes), len(sku_bytes)) + user_bytes + sku_bytes + body
+    return FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+class _Mark(threading.Event):
+    """A flush request; reports where the writer got to, or the error that kept it from getting there."""
+    position = None
+    error = None
+
+
+def _segment_name(first_seq):
+    return f"segment-{first_seq:012d}.jlog"
+
+
+class JournalRecord:
+    __slots__ = ("seq", "timestamp", "op", "user", "sku", "old", "new")
+
+    def __init__(self, seq, timestamp, op, user, sku, old, new):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.op = op
+        self.user = user
+        self.sku = sku
+        self.old = old
+        self.new = new
+
+    def __repr__(self):
+        return f"JournalRecord(seq={self.seq}, op={OP_NAMES[self.op]!r}, user={self.user!r}, sku={self.sku!r})"
+
+
+def _frames(data):
+    """Yields (end offset, payload) for each frame in data, stopping at the first torn or corrupt one."""
+    pos, end = 0, len(data)
+    while pos + FRAME.size <= end:
+        length, crc = FRAME.unpack_from(data, pos)
+        start = pos + FRAME.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            return
+        pos = start + length
+        yield pos, payload
+
+
+def _read_segment(path, begin=0):
+    """Yields (end offset, record) for the records of one segment from byte offset `begin`."""
+    with open(path, "rb") as segment:
+        segment.seek(begin)
+        data = segment.read()
+    for end, payload in _frames(data):
+        seq, timestamp, op, user_len, sku_len = HEAD.unpack_from(payload, 0)
+        offset = HEAD.size
+        user = payload[offset:offset + user_len].decode("utf-8")
+        offset += user_len
+        sku = payload[offset:offset + sku_len].decode("utf-8")
+        body = _decode_body(payload[offset + sku_len:].decode("utf-8"))[0]
+        yield begin + end, JournalRecord(seq, timestamp, op, user, sku, body["old"], body["new"])
+
+
+def segment_paths(directory=DEFAULT_DIR):
+    """The journal's segment files, oldest first."""
+    try:
+        names = sorted(name for name in os.listdir(directory) if name.endswith(".jlog"))
+    except FileNotFoundError:
+        return []
+    return [os.path.join(directory, name) for name in names]
+
+
+def read_records(directory=DEFAULT_DIR, after_seq=0, mark=None):
+    """
+    Yields every durable record with seq > after_seq, oldest first. Given
+    a mark() taken at after_seq, reading starts at that point. Reads the
+    segment files directly, so a reader need not open the journal (and
+    start its writer) to catch up on it.
+    """
+    segments = segment_paths(directory)
+    if mark is not None and mark[0] == after_seq:
+        records = _records_after(segments, mark)
+        if records is not None:
+            yield from records
+            return
+    for path in segments:
+        for _, record in _read_segment(path):
+            if record.seq > after_seq:
+                yield record
+
+
+def _records_after(segments, mark):
+    """The records after a mark, or None when the segments no longer line up with it."""
+    seq, name, offset = mark
+    names = [os.path.basename(path) for path in segments]
+    if name is None:
+        first = 0
+    elif name in names and offset <= os.path.getsize(segments[names.index(name)]):
+        first = names.index(name)
+    else:
+        return None
+    records = [record for index, path in enumerate(segments[first:], first)
+               for _, record in _read_segment(path, offset if index == first and name else 0)]
+    if records and records[0].seq != seq + 1:
+        return None
+    return records
+
+
+class InventoryJournal:
+    """
+    Append-only binary journal of inventory mutations.
+
+    append() only puts the mutation on a queue, so the UI thread never
+    waits on the disk. A background writer takes everything queued since
+    its last pass, writes it as one batch and fsyncs once for the whole
+    group. Segments roll over when they pass segment_bytes. replay()
+    reads the segments back in order and rebuild_catalog() folds them
+    into a Catalog. mark() returns the position reached so far, from
+    which a later replay() can pick up without reading older segments.
+
+    A record that cannot be encoded is reported and dropped. A batch the
+    disk refuses is cut back off the segment and kept, to be written
+    again with the next batch; flush() and mark() report it as not done.
+    Should the writer thread still die, append() raises from then on
+    instead of queueing records nothing will write.
+    """
+    def __init__(self, directory=DEFAULT_DIR, segment_bytes=DEFAULT_SEGMENT_BYTES, max_batch=4096):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_batch = max_batch
+        os.makedirs(directory, exist_ok=True)
+
+        self._queue = queue.Queue()
+        self._segment = None
+        self._next_seq = 1
+        self._batch = []        # what the writer took off the queue last
+        self._unwritten = []    # encoded frames a failed write left behind
+        self._dead = None       # why the writer thread stopped, once it has
+        self._alive = threading.Lock()
+        self._recover()
+
+        self._thread = threading.Thread(target=self._write_loop, name="inventory-journal", daemon=True)
+        self._thread.start()
+
+    # --- Segments ---
+
+    def segments(self):
+        return segment_paths(self.directory)
+
+    def _recover(self):
+        """Finds the last sequence number and cuts off a torn tail left by a crash."""
+        segments = self.segments()
+        if not segments:
+            return
+        last = segments[-1]
+        with open(last, "rb") as segment:
+            data = segment.read()
+        # Only the frames are checked; no record needs decoding to find the last seq
+        valid_end = payload = 0
+        for valid_end, payload in _frames(data):
+            pass
+        if valid_end:
+            self._next_seq = HEAD.unpack_from(payload, 0)[0] + 1
+        if valid_end < os.path.getsize(last):
+            with open(last, "r+b") as segment:
+                segment.truncate(valid_end)
+        self._segment = open(last, "ab")
+
+    def _rotate(self, first_seq):
+        """Starts a new segment, named after the first record that goes into it."""
+        if self._segment is not None:
+            self._segment.close()
+        self._segment = open(os.path.join(self.directory, _segment_name(first_seq)), "ab")
+
+    # --- Writing ---
+
+    def append(self, op, user, sku, old=None, new=None):
+        """Queues one mutation and returns immediately."""
+        with self._alive:
+            self._check_writer()
+            self._queue.put((time.time(), op, user, sku, old, new))
+
+    def append_many(self, op, user, rows):
+        """Queues a batch of (sku, old, new) mutations sharing one op and user."""
+        timestamp = time.time()
+        with self._alive:
+            self._check_writer()
+            for sku, old, new in rows:
+                self._queue.put((timestamp, op, user, sku, old, new))
+
+    def has_records(self):
+        """Whether any record was ever appended, whatever has happened to its item since."""
+        return self._next_seq > 1
+
+    def _check_writer(self):
+        if self._dead is not None:
+            raise RuntimeError(f"inventory journal writer stopped: {self._dead!r}")
+
+    def flush(self, timeout=None):
+        """
+        Blocks until everything appended so far is on disk. Returns False
+        if it is not by the timeout, or the write failed.
+        """
+        return self.mark(timeout) is not None
+
+    def mark(self, timeout=None):
+        """
+        Flushes, then returns (last seq, segment name, end offset) of what
+        is on disk, or None if the writer did not get there in time or
+        could not write it.
+        """
+        waiter = _Mark()
+        with self._alive:
+            if self._dead is not None:
+                return None
+            self._queue.put(waiter)
+        return waiter.position if waiter.wait(timeout) and waiter.error is None else None
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _write_loop(self):
+        try:
+            self._write_batches()
+        except BaseException as e:
+            log.exception("Inventory journal writer stopped")
+            # Nothing taken or queued from here on would be written; fail it all now
+            with self._alive:
+                self._dead = e
+            pending = self._batch
+            while True:
+                for entry in pending:
+                    if isinstance(entry, _Mark):
+                        entry.error = e
+                        entry.set()
+                try:
+                    pending = [self._queue.get_nowait()]
+                except queue.Empty:
+                    return
+
+    def _write_batches(self):
+        while True:
+            self._batch = batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            # Frames a failed write left behind go first, under their own seqs
+            frames, waiters, stopping = self._unwritten, [], False
+            first_seq = self._next_seq - len(frames)
+            for entry in batch:
+                if entry is None:
+                    stopping = True
+                elif isinstance(entry, _Mark):
+                    waiters.append(entry)
+                else:
+                    timestamp, op, user, sku, old, new = entry
+                    try:
+                        frames.append(_encode(self._next_seq, timestamp, op, user, sku, old, new))
+                    except (TypeError, ValueError) as e:
+                        log.warning("Inventory journal record for %r dropped: %s", sku, e)
+                        continue
+                    self._next_seq += 1
+
+            error = None
+            if frames:
+                try:
+                    self._write(frames, first_seq)
+                    self._unwritten = []
+                except OSError as e:
+                    log.warning("Inventory journal write failed, %d records kept to retry: %s", len(frames), e)
+                    error = e
+                    self._unwritten = frames
+
+            for waiter in waiters:
+                segment = self._segment
+                waiter.error = error
+                waiter.position = (self._next_seq - 1,
+                                   None if segment is None else os.path.basename(segment.name),
+                                   0 if segment is None else segment.tell())
+                waiter.set()
+            if stopping:
+                if self._segment is not None:
+                    self._segment.close()
+                return
+
+    def _write(self, frames, first_seq):
+        if self._segment is None or self._segment.tell() >= self.segment_bytes:
+            self._rotate(first_seq)
+        segment = self._segment
+        start = segment.tell()
+        try:
+            segment.write(b"".join(frames))
+            segment.flush()
+            # One fsync for the whole group of records
+            os.fsync(segment.fileno())
+        except OSError:
+            # Cut off whatever part of the batch got out, so the retry does
+            # not leave it in the segment twice; the next write reopens
+            self._segment = None
+            try:
+                segment.close()
+            except OSError:
+                pass
+            try:
+                os.truncate(segment.name, start)
+            except OSError:
+                pass
+            raise
+
+    # --- Reading ---
+
+    def replay(self, after_seq=0, mark=None):
+        """Yields every durable record with seq > after_seq, oldest first (see read_records)."""
+        return read_records(self.directory, after_seq, mark)
+
+    def rebuild_catalog(self):
+        """Folds the whole journal into a Catalog holding the latest state of every SKU."""
+        # Fold into plain dicts first so each surviving SKU is packed into
+        # the catalog once, however many times it was edited
+        state = {}
+        for record in self.replay():
+            if record.op == OP_REMOVE:
+                state.pop(record.sku, None)
+            elif record.sku in state:
+                state[record.sku].update(record.new)
+            else:
+                state[record.sku] = dict(record.new)
+        return Catalog(state.items())
+
+
+_default_journal = None
+
+
+def open_default_journal():
+    """Returns the journal shared by every screen."""
+    global _default_journal
+    if _default_journal is None:
+        _default_journal = InventoryJournal()
+    return _default_journal
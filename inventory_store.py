@@ -0,0 +1,491 @@
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from catalog import Catalog
+from inventory_journal import OP_ADD, OP_EDIT, OP_REMOVE, OP_UPSERT, open_default_journal
+
+log = logging.getLogger(__name__)
+
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "jbson_inventory.db")
+
+# Columns every item dict may carry; the CRUD form only edits the first four
+ITEM_FIELDS = ("name", "qty", "price", "desc", "category", "barcode", "supplier", "active")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id       INTEGER PRIMARY KEY,
+    sku      TEXT    NOT NULL UNIQUE,
+    name     TEXT    NOT NULL,
+    qty      INTEGER NOT NULL,
+    price    REAL    NOT NULL,
+    desc     TEXT    NOT NULL DEFAULT '',
+    category TEXT    NOT NULL DEFAULT '',
+    barcode  TEXT    NOT NULL DEFAULT '',
+    supplier TEXT    NOT NULL DEFAULT '',
+    active   INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS items_name ON items(name);
+CREATE INDEX IF NOT EXISTS items_category ON items(category);
+CREATE INDEX IF NOT EXISTS items_barcode ON items(barcode);
+CREATE TABLE IF NOT EXISTS sku_blocks (
+    prefix     TEXT    PRIMARY KEY,
+    next_block INTEGER NOT NULL
+);
+"""
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16384",     # 16 MB page cache
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=67108864",    # 64 MB of the file mapped for reads
+)
+
+# Statements are kept as constants so sqlite3's per-connection statement
+# cache compiles each one once and reuses the prepared statement.
+SELECT_ITEM = f"SELECT {', '.join(ITEM_FIELDS)} FROM items WHERE sku = ?"
+SELECT_EXISTS = "SELECT 1 FROM items WHERE sku = ?"
+SELECT_BARCODE = f"SELECT sku, {', '.join(ITEM_FIELDS)} FROM items WHERE barcode = ? ORDER BY id LIMIT 1"
+SELECT_COUNT = "SELECT COUNT(*) FROM items"
+# The listing runs in SKU order, so a window is read by key from the
+# unique SKU index: WHERE sku >= ? finds the first row in O(log n) instead
+# of walking past every row above it
+SELECT_PAGE = f"SELECT sku, {', '.join(ITEM_FIELDS)} FROM items ORDER BY sku LIMIT ? OFFSET ?"
+SELECT_PAGE_FROM = f"SELECT sku, {', '.join(ITEM_FIELDS)} FROM items WHERE sku >= ? ORDER BY sku LIMIT ? OFFSET ?"
+SELECT_PAGE_FROM_END = f"SELECT sku, {', '.join(ITEM_FIELDS)} FROM items ORDER BY sku DESC LIMIT ? OFFSET ?"
+SELECT_SKU_BEFORE = "SELECT sku FROM items WHERE sku < ? ORDER BY sku DESC LIMIT 1 OFFSET ?"
+SELECT_POSITION = "SELECT COUNT(*) FROM items WHERE sku < ?"
+INSERT_ITEM = f"INSERT INTO items (sku, {', '.join(ITEM_FIELDS)}) VALUES (?, {', '.join('?' for _ in ITEM_FIELDS)})"
+DELETE_ITEM = "DELETE FROM items WHERE sku = ?"
+# SKUs per "sku IN (...)" lookup, under SQLite's default limit of 999 parameters
+LOOKUP_BATCH = 500
+
+# The catalog and the search index keep qty in an int32 column
+MAX_QTY = 2**31 - 1
+
+DEFAULTS = {"desc": "", "category": "", "barcode": "", "supplier": "", "active": 1}
+
+SEED_ITEMS = {
+    "SKU001": {"name": "Hammer (Claw)", "qty": 150, "price": 12.99, "desc": "Standard 16oz claw hammer.", "category": "Tools"},
+    "SKU002": {"name": "Screwdriver Set", "qty": 80, "price": 24.50, "desc": "6-piece mixed precision set.", "category": "Tools"},
+    "SKU003": {"name": "Wood Screws (Box)", "qty": 300, "price": 5.99, "desc": "Box of 100 2-inch wood screws.", "category": "Hardware"},
+}
+
+
+def validate_item(name, qty_str, price_str, desc=""):
+    """
+    Validation rules shared by the CRUD form and bulk import.
+    Returns the sanitized item dict or raises ValueError with the reason.
+    """
+    if not name:
+        raise ValueError("Item Name is required.")
+
+    if not qty_str:
+        raise ValueError("Quantity is required.")
+
+    if not price_str:
+        raise ValueError("Unit Price is required.")
+
+    try:
+        qty = int(qty_str)
+        if qty < 0: raise ValueError
+    except ValueError:
+        raise ValueError("Quantity must be a non-negative whole number.") from None
+    if qty > MAX_QTY:
+        raise ValueError(f"Quantity cannot be more than {MAX_QTY:,}.")
+
+    try:
+        price = float(price_str)
+        if price <= 0: raise ValueError
+    except ValueError:
+        raise ValueError("Unit Price must be a positive number.") from None
+
+    return {
+        "name": name,
+        "qty": qty,
+        "price": price,
+        "desc": desc
+    }
+
+
+def _filter_clause(category=None, in_stock_only=False):
+    where, params = [], []
+    if category:
+        where.append("category = ?")
+        params.append(category)
+    if in_stock_only:
+        where.append("qty > 0")
+    return (" WHERE " + " AND ".join(where) if where else ""), params
+
+
+def _row_values(sku, item):
+    full = dict(DEFAULTS, **item)
+    return (sku,) + tuple(full[field] for field in ITEM_FIELDS)
+
+
+class InventoryStore:
+    """
+    Persistent inventory backed by an on-disk SQLite database in WAL mode.
+
+    Items are read on demand by SKU or streamed in batches; nothing keeps
+    the whole catalog in memory. Every mutation runs inside a transaction,
+    and several mutations can share one commit through transaction().
+    One connection is shared by all threads under a lock, so background
+    workers can write while the Tk thread reads.
+
+    Listeners registered with subscribe() are told about every item change
+    once its transaction commits, as listener(op, rows) with op one of
+    "add", "edit", "remove" or "upsert" and rows a list of (sku, item).
+    Edits and upserts carry only the fields written; removals carry None.
+    A listener that raises is reported and skipped: the write is already
+    committed, so the caller is not told it failed, and the remaining
+    listeners still hear about it.
+
+    With a journal, every committed item change is also appended to it,
+    with the `user` passed to the write and the old values read inside
+    the same transaction, so no caller can commit a change and forget to
+    journal it.
+    """
+    def __init__(self, path=DEFAULT_PATH, journal=None):
+        self.path = path
+        self.journal = journal
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._local_writes = 0
+        self._items_written = False     # whether the open transaction has touched the items table
+        self._listeners = []
+        self._changes = []
+        self._journaled = []    # (op, user, [(sku, old, new)]) waiting for the commit
+        # (version, position, sku) of the first row of the last page read
+        self._page_anchor = None
+        self._page_count = None
+
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, cached_statements=128)
+        for pragma in PRAGMAS:
+            self.conn.execute(pragma)
+        self.conn.executescript(SCHEMA)
+
+    # --- Transactions ---
+
+    @contextmanager
+    def transaction(self):
+        """
+        Groups mutations into one commit. Nested calls join the outer
+        transaction, so a caller can batch several add/edit/remove calls.
+        """
+        with self._lock:
+            if self._depth == 0:
+                self.conn.execute("BEGIN IMMEDIATE")
+            self._depth += 1
+            try:
+                yield self.conn
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.conn.execute("ROLLBACK")
+                    self._items_written = False
+                    self._changes = []
+                    self._journaled = []
+                raise
+            else:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.conn.execute("COMMIT")
+                    if self._items_written:
+                        # A SKU block lease alone leaves every view of the items as it was
+                        self._local_writes += 1
+                        self._items_written = False
+                    changes, self._changes = self._changes, []
+                    journaled, self._journaled = self._journaled, []
+                    for op, rows in changes:
+                        for listener in list(self._listeners):
+                            try:
+                                listener(op, rows)
+                            except Exception:
+                                log.exception("Inventory listener %s failed after commit",
+                                              getattr(listener, "__name__", listener))
+                    # After the listeners, so a snapshot's journal position
+                    # never runs ahead of the search index it was taken from
+                    for op, user, rows in journaled:
+                        try:
+                            self.journal.append_many(op, user, rows)
+                        except RuntimeError as e:
+                            log.warning("Inventory change not journaled: %s", e)
+
+    # --- Change notification ---
+
+    def subscribe(self, listener):
+        with self._lock:
+            self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        with self._lock:
+            self._listeners.remove(listener)
+
+    @property
+    def version(self):
+        """
+        Changes whenever this process commits a change to the items, or
+        any other connection commits. Screens compare it against the value
+        seen at their last render.
+        """
+        with self._lock:
+            data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            return (data_version, self._local_writes)
+
+    # --- Reads ---
+
+    def get(self, sku, default=None):
+        with self._lock:
+            row = self.conn.execute(SELECT_ITEM, (sku,)).fetchone()
+        if row is None:
+            return default
+        return dict(zip(ITEM_FIELDS, row))
+
+    def find_barcode(self, barcode):
+        """Returns (sku, item) for the first item carrying this exact barcode, or None."""
+        with self._lock:
+            row = self.conn.execute(SELECT_BARCODE, (barcode,)).fetchone()
+        if row is None:
+            return None
+        return row[0], dict(zip(ITEM_FIELDS, row[1:]))
+
+    def __getitem__(self, sku):
+        item = self.get(sku)
+        if item is None:
+            raise KeyError(sku)
+        return item
+
+    def __contains__(self, sku):
+        with self._lock:
+            return self.conn.execute(SELECT_EXISTS, (sku,)).fetchone() is not None
+
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute(SELECT_COUNT).fetchone()[0]
+
+    def iter_items(self, batch_size=1000):
+        """Streams (sku, item) pairs in insertion order, batch_size rows at a time."""
+        last_id = 0
+        query = f"SELECT id, sku, {', '.join(ITEM_FIELDS)} FROM items WHERE id > ? ORDER BY id LIMIT ?"
+        while True:
+            with self._lock:
+                rows = self.conn.execute(query, (last_id, batch_size)).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield row[1], dict(zip(ITEM_FIELDS, row[2:]))
+            last_id = rows[-1][0]
+
+    def items(self):
+        return self.iter_items()
+
+    def load_catalog(self, batch_size=5000):
+        """Streams the whole table into a compact columnar Catalog."""
+        return Catalog(self.iter_items(batch_size))
+
+    def categories(self):
+        """Distinct non-empty categories, for filter dropdowns."""
+        with self._lock:
+            rows = self.conn.execute("SELECT DISTINCT category FROM items WHERE category != '' ORDER BY category").fetchall()
+        return [row[0] for row in rows]
+
+    def stream_rows(self, category=None, in_stock_only=False, batch_size=5000):
+        """
+        Yields batches of (sku, *ITEM_FIELDS) tuples matching the filters.
+
+        Runs on its own read-only connection, so a long export reads one
+        WAL snapshot without holding the shared connection's lock. The
+        filters become the WHERE clause, so SQLite uses the category
+        index and never returns rows that would be thrown away.
+        """
+        where, params = _filter_clause(category, in_stock_only)
+        query = f"SELECT sku, {', '.join(ITEM_FIELDS)} FROM items{where} ORDER BY id"
+
+        reader = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        try:
+            cursor = reader.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield rows
+        finally:
+            reader.close()
+
+    def count_rows(self, category=None, in_stock_only=False):
+        """Row count for the same filters stream_rows() accepts."""
+        where, params = _filter_clause(category, in_stock_only)
+        with self._lock:
+            return self.conn.execute(f"SELECT COUNT(*) FROM items{where}", params).fetchone()[0]
+
+    def page(self, offset, limit):
+        """
+        Returns one window of (sku, item) pairs in SKU order, for virtual
+        lists. The window is found by key from the last one read while the
+        table has not changed since, so scrolling costs the rows moved
+        rather than the distance from the top. Otherwise it is counted from
+        whichever end of the table is nearer, so jumping to the bottom of a
+        long list does not walk every row above it.
+        """
+        with self._lock:
+            version = self.version
+            rows = None
+            # Rows SQLite steps over to reach the window, counting from the top
+            skipped = offset
+            if self._page_anchor is not None and self._page_anchor[0] == version:
+                _, position, key = self._page_anchor
+                if position <= offset and offset - position < skipped:
+                    rows = self.conn.execute(SELECT_PAGE_FROM, (key, limit, offset - position)).fetchall()
+                elif offset < position and position - offset < skipped:
+                    key = self.conn.execute(SELECT_SKU_BEFORE, (key, position - offset - 1)).fetchone()[0]
+                    rows = self.conn.execute(SELECT_PAGE_FROM, (key, limit, 0)).fetchall()
+            if rows is None and offset > 0:
+                if self._page_count is None or self._page_count[0] != version:
+                    self._page_count = (version, self.conn.execute(SELECT_COUNT).fetchone()[0])
+                below = self._page_count[1] - offset
+                if below <= 0:
+                    rows = []
+                elif below - min(limit, below) < skipped:
+                    taken = min(limit, below)
+                    rows = self.conn.execute(SELECT_PAGE_FROM_END, (taken, below - taken)).fetchall()[::-1]
+            if rows is None:
+                rows = self.conn.execute(SELECT_PAGE, (limit, offset)).fetchall()
+            if rows:
+                self._page_anchor = (version, offset, rows[0][0])
+        return [(row[0], dict(zip(ITEM_FIELDS, row[1:]))) for row in rows]
+
+    def position(self, sku):
+        """Where sku falls in the page() listing."""
+        with self._lock:
+            return self.conn.execute(SELECT_POSITION, (sku,)).fetchone()[0]
+
+    # --- Writes ---
+
+    def _journal(self, op, user, rows):
+        if self.journal is not None:
+            self._journaled.append((op, user, rows))
+
+    def _old_item(self, conn, sku):
+        """The stored item, read inside the writing transaction for the journal."""
+        if self.journal is None:
+            return None
+        row = conn.execute(SELECT_ITEM, (sku,)).fetchone()
+        return None if row is None else dict(zip(ITEM_FIELDS, row))
+
+    def _old_items(self, conn, skus):
+        """sku -> stored item for those of skus already stored, read inside the writing transaction for the journal."""
+        found = {}
+        if self.journal is None:
+            return found
+        for start in range(0, len(skus), LOOKUP_BATCH):
+            batch = skus[start:start + LOOKUP_BATCH]
+            query = f"SELECT sku, {', '.join(ITEM_FIELDS)} FROM items WHERE sku IN ({', '.join('?' * len(batch))})"
+            found.update((row[0], dict(zip(ITEM_FIELDS, row[1:]))) for row in conn.execute(query, batch))
+        return found
+
+    def add_item(self, sku, item, user=""):
+        with self.transaction() as conn:
+            conn.execute(INSERT_ITEM, _row_values(sku, item))
+            self._items_written = True
+            self._changes.append(("add", [(sku, dict(item))]))
+            self._journal(OP_ADD, user, [(sku, None, dict(item))])
+
+    def update_item(self, sku, item, user=""):
+        """Updates only the fields present in item; the rest keep their stored values."""
+        fields = [field for field in ITEM_FIELDS if field in item]
+        query = f"UPDATE items SET {', '.join(f'{f} = ?' for f in fields)} WHERE sku = ?"
+        with self.transaction() as conn:
+            old = self._old_item(conn, sku)
+            cursor = conn.execute(query, tuple(item[f] for f in fields) + (sku,))
+            if cursor.rowcount == 0:
+                raise KeyError(sku)
+            self._items_written = True
+            written = {f: item[f] for f in fields}
+            self._changes.append(("edit", [(sku, written)]))
+            self._journal(OP_EDIT, user, [(sku, old, dict(written))])
+
+    def remove_item(self, sku, user=""):
+        with self.transaction() as conn:
+            old = self._old_item(conn, sku)
+            cursor = conn.execute(DELETE_ITEM, (sku,))
+            if cursor.rowcount == 0:
+                raise KeyError(sku)
+            self._items_written = True
+            self._changes.append(("remove", [(sku, None)]))
+            self._journal(OP_REMOVE, user, [(sku, old, None)])
+
+    def upsert_many(self, rows, fields=ITEM_FIELDS, user=""):
+        """
+        Inserts (sku, item) pairs in a single transaction. Existing SKUs only
+        have the given fields overwritten, so a partial price list does not
+        blank out descriptions or categories it does not carry.
+        """
+        query = INSERT_ITEM + " ON CONFLICT(sku) DO UPDATE SET " + ", ".join(f"{f} = excluded.{f}" for f in fields)
+        with self.transaction() as conn:
+            # Under the lock, so a listener subscribing meanwhile still hears of these rows
+            noticed = bool(self._listeners) or self.journal is not None
+            if noticed:
+                rows = list(rows)
+            old = self._old_items(conn, [sku for sku, _ in rows]) if self.journal is not None else {}
+            conn.executemany(query, (_row_values(sku, item) for sku, item in rows))
+            self._items_written = True
+            if noticed:
+                written = [(sku, {f: value for f, value in dict(DEFAULTS, **item).items() if f in fields})
+                           for sku, item in rows]
+                if self._listeners:
+                    self._changes.append(("upsert", written))
+                self._journal(OP_UPSERT, user, [(sku, old.get(sku), new) for sku, new in written])
+
+    def lease_block(self, prefix):
+        """
+        Atomically hands out the next unused block number for a SKU prefix.
+        BEGIN IMMEDIATE serialises concurrent leases across processes.
+        """
+        with self.transaction() as conn:
+            conn.execute("INSERT OR IGNORE INTO sku_blocks (prefix, next_block) VALUES (?, 0)", (prefix,))
+            block = conn.execute("SELECT next_block FROM sku_blocks WHERE prefix = ?", (prefix,)).fetchone()[0]
+            conn.execute("UPDATE sku_blocks SET next_block = ? WHERE prefix = ?", (block + 1, prefix))
+        return block
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+_default_store = None
+
+
+def open_default_store():
+    """
+    Returns the store shared by every screen, journaling its changes to
+    the shared journal. An empty database is filled by _restore_or_seed().
+    """
+    global _default_store
+    if _default_store is None:
+        journal = open_default_journal()
+        store = InventoryStore()
+        if len(store) == 0:
+            _restore_or_seed(store, journal)
+        store.journal = journal
+        _default_store = store
+    return _default_store
+
+
+def _restore_or_seed(store, journal):
+    """
+    Fills an empty store from the journal when anything was ever journaled,
+    even if every item has since been removed, and with SEED_ITEMS only
+    for a journal that has never had a record.
+    """
+    if journal.has_records():
+        catalog = journal.rebuild_catalog()
+        # Already in the journal, so restored before it is attached
+        store.upsert_many((catalog.sku_at(row), catalog.item_at(row)) for row in catalog.live_rows())
+    else:
+        store.journal = journal
+        store.upsert_many(SEED_ITEMS.items(), user="system")
@@ -1,19 +1,20 @@
+import logging
 import tkinter as tk
 import ttkbootstrap as ttk
 from tkinter import messagebox
-import subprocess # NEW: For launching a new script
-import sys        # NEW: For getting the current Python executable
+import screen_router
+from screen_router import Session
 
-class App(ttk.Window): # Inherit from ttk.Window
+log = logging.getLogger(__name__)
 
-    def __init__(self):
-        super().__init__(themename="litera")
+class App(ttk.Frame): # A screen frame hosted by the ScreenRouter window
 
-        self.title("JBSON Hardware - POS & Inventory System")
-        self.geometry("500x550")
-        self.resizable(False, False)
-        
-        self.center_window()
+    window_title = "JBSON Hardware - POS & Inventory System"
+    window_geometry = "500x550"
+
+    def __init__(self, master=None, router=None):
+        super().__init__(master)
+        self.router = router
 
         # --- Main Frame ---
         main_frame = ttk.Frame(self, padding="20 20 20 20")
@@ -155,22 +156,12 @@ class App(ttk.Window): # Inherit from ttk.Window
         )
         clear_button.pack(side="left", padx=10, ipady=5)
 
-    
-    def center_window(self):
-        """Centers the window on the screen."""
-        self.update_idletasks()
-        width = self.winfo_width()
-        height = self.winfo_height()
-        x = (self.winfo_screenwidth() // 2) - (width // 2)
-        y = (self.winfo_screenheight() // 2) - (height // 2)
-        self.geometry(f'{width}x{height}+{x}+{y}')
-
 
     # --- (B) Form Validation and Functionality ---
 
     def validate_and_submit(self):
         """
-        Performs validation and then "handles" the data by launching the Main Menu.
+        Performs validation and then "handles" the data by showing the Main Menu.
         """
         self.error_label.config(text="") 
         
@@ -203,31 +194,25 @@ class App(ttk.Window): # Inherit from ttk.Window
         if (username == "admin@jbson.com" and password == "AdminPass123" and role == "Administrator") or \
            (username == "employee@jbson.com" and password == "EmployeePass123" and role == "Employee"):
             
-            print("--- LOGIN ATTEMPT (SUCCESS) ---")
-            print(f" [Activity Log]: User '{username}' ({role}) logged in at {location}.")
+            log.info("User %r (%s) logged in at %s", username, role, location)
             
             messagebox.showinfo(
                 "Login Successful", 
                 f"Welcome, {username}!\n\nYou have logged in as an '{role}' at the '{location}'."
             )
             
-            # CRITICAL STEP: Destroy the login window and launch main_menu.py
-            self.destroy() 
-            
-            # Use subprocess to launch main_menu.py, passing role and location as arguments
-            try:
-                # [sys.executable] ensures it uses the same python interpreter
-                # ["main_menu.py"] is the script to run
-                # [role, location] are arguments passed to the new script
-                subprocess.Popen([sys.executable, "main_menu.py", role, location])
-            except Exception as e:
-                # If launching fails, show an error and exit gracefully
-                messagebox.showerror("Launch Error", f"Could not launch main_menu.py.\nError: {e}\n\nPlease ensure the file is in the same directory.")
-                self.quit() # Exit the application if the main menu can't launch
+            # Hand the session to the router and swap to the main menu in place
+            self.router.session = Session(username, role, location)
+            # Precompute this user's saved and recent searches while they find their way to the search screen.
+            # Imported here: the search stack is only loaded once someone has logged in
+            from search_history import warm_history
+            warm_history(username)
+            self.clear_form()
+            self.router.show("main_menu")
             
         else:
             # Failed login
-            print(f"[Activity Log]: FAILED login attempt for user '{username}'.")
+            log.warning("Failed login attempt for user %r", username)
             self.error_label.config(text="Error: Invalid username, password, or role.")
             return
 
@@ -257,5 +242,4 @@ class App(ttk.Window): # Inherit from ttk.Window
 
 # --- Main execution ---
 if __name__ == "__main__":
-    app = App()
-    app.mainloop()
\ No newline at end of file
+    screen_router.run("login")
\ No newline at end of file
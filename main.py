@@ -1 +1,5 @@
+import screen_router
 
+# --- Main execution ---
+if __name__ == "__main__":
+    screen_router.run()
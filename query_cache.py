@@ -0,0 +1,148 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class QueryCache:
+    """
+    Bounded LRU cache of search results, keyed on the normalised SearchQuery.
+
+    Entries also expire after `ttl` seconds. The cache observes the
+    SearchIndex it serves: when an item changes, only the entries whose
+    query matched the item before or after the change are dropped
+    (SearchIndex.affects), so an edit to a hammer leaves cached "pvc pipe"
+    results alone. Switching to a rebuilt index clears everything.
+
+    Pinned queries (pin(), for the searches a SearchWarmer keeps ready)
+    neither expire nor get evicted, but are invalidated like any other;
+    each observer is then called with the pinned queries that were dropped.
+
+    Counters (hits, misses, evictions, expirations, invalidations) are
+    cumulative and reported by stats() for sizing the cache.
+    """
+    def __init__(self, capacity=256, ttl=300.0, clock=time.monotonic):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.index = None
+        self.pinned = frozenset()
+        self.observers = []
+        self.lock = threading.Lock()
+        # Bumped on every change, so a search that raced with one is not stored
+        self._changes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _attach(self, index):
+        with self.lock:
+            if self.index is index:
+                return
+            if self.index is not None:
+                self.index.observers.remove(self._on_item_changed)
+            dropped = self.pinned.intersection(self.entries)
+            self.entries.clear()
+            self.index = index
+            index.observers.append(self._on_item_changed)
+        self._notify(dropped)
+
+    def _notify(self, dropped):
+        if dropped:
+            for observer in list(self.observers):
+                observer(dropped)
+
+    def pin(self, queries):
+        """Replaces the pinned queries."""
+        with self.lock:
+            self.pinned = frozenset(queries)
+
+    def __contains__(self, query):
+        """Whether a fresh result for query is cached, without counting a lookup."""
+        with self.lock:
+            entry = self.entries.get(query)
+            return entry is not None and (query in self.pinned or entry[0] > self.clock())
+
+    def search(self, index, query, cancelled=None, trace=None):
+        """Returns index.search(query), from the cache when a fresh entry exists."""
+        self._attach(index)
+        now = self.clock()
+        with self.lock:
+            entry = self.entries.get(query)
+            if entry is not None:
+                expires, result = entry
+                if expires > now or query in self.pinned:
+                    self.entries.move_to_end(query)
+                    self.hits += 1
+                    if trace is not None:
+                        trace.cache = "hit"
+                        trace.lap("cache")
+                    return result
+                del self.entries[query]
+                self.expirations += 1
+            self.misses += 1
+            changes = self._changes
+        if trace is not None:
+            trace.cache = "miss"
+            trace.lap("cache")
+
+        result = index.search(query, cancelled, trace)
+        self._store(index, query, result, now, changes)
+        return result
+
+    def warm(self, index, query):
+        """Searches and caches query unless a fresh result is already cached. Not counted as a lookup."""
+        self._attach(index)
+        if query in self:
+            return
+        now = self.clock()
+        with self.lock:
+            changes = self._changes
+        self._store(index, query, index.search(query), now, changes)
+
+    def _store(self, index, query, result, now, changes):
+        with self.lock:
+            if changes == self._changes and self.index is index:
+                self.entries[query] = (now + self.ttl, result)
+                self.entries.move_to_end(query)
+                while len(self.entries) > self.capacity:
+                    oldest = next((cached for cached in self.entries if cached not in self.pinned), None)
+                    if oldest is None:
+                        break
+                    del self.entries[oldest]
+                    self.evictions += 1
+
+    def _on_item_changed(self, sku, old, new):
+        with self.lock:
+            self._changes += 1
+            affected = [query for query, (_, result) in self.entries.items()
+                        if self.index.affects(query, result, sku, old, new)]
+            for query in affected:
+                del self.entries[query]
+            self.invalidations += len(affected)
+            dropped = self.pinned.intersection(affected)
+        self._notify(dropped)
+
+    def clear(self):
+        with self.lock:
+            dropped = self.pinned.intersection(self.entries)
+            self.entries.clear()
+        self._notify(dropped)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "pinned": len(self.pinned),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,108 @@
+from array import array
+from itertools import compress
+
+CHUNK_BITS = 16
+CHUNK_SIZE = 1 << CHUNK_BITS
+CHUNK_MASK = CHUNK_SIZE - 1
+CHUNK_BYTES = CHUNK_SIZE // 8
+
+# Each byte value spread out to eight bytes, one per bit, lowest bit first
+_SPREAD = [bytes((value >> bit) & 1 for bit in range(8)) for value in range(256)]
+
+
+class RowBitmap:
+    """
+    A set of catalog row ids, stored as a bitmap cut into chunks of
+    CHUNK_SIZE rows.
+
+    Each chunk is a Python int used as a bitset, so &, | and - (and-not)
+    combine whole chunks a machine word at a time in C. Chunks holding no
+    rows are not stored at all, which keeps sparse sets such as the
+    out-of-stock rows small.
+
+    mask() spreads the bits out to one byte per row; a list of rows is then
+    filtered against it with filter(mask.__getitem__, rows), still in C.
+    """
+    __slots__ = ("chunks",)
+
+    def __init__(self, rows=(), chunks=None):
+        if chunks is not None:
+            self.chunks = chunks
+            return
+        buffers = {}
+        for row in rows:
+            buffer = buffers.get(row >> CHUNK_BITS)
+            if buffer is None:
+                buffer = buffers[row >> CHUNK_BITS] = bytearray(CHUNK_BYTES)
+            low = row & CHUNK_MASK
+            buffer[low >> 3] |= 1 << (low & 7)
+        self.chunks = {key: int.from_bytes(buffer, "little") for key, buffer in buffers.items()}
+
+    def add(self, row):
+        key = row >> CHUNK_BITS
+        self.chunks[key] = self.chunks.get(key, 0) | (1 << (row & CHUNK_MASK))
+
+    def discard(self, row):
+        key = row >> CHUNK_BITS
+        chunk = self.chunks.get(key)
+        if chunk:
+            chunk &= ~(1 << (row & CHUNK_MASK))
+            if chunk:
+                self.chunks[key] = chunk
+            else:
+                del self.chunks[key]
+
+    def __contains__(self, row):
+        return bool(self.chunks.get(row >> CHUNK_BITS, 0) >> (row & CHUNK_MASK) & 1)
+
+    def __len__(self):
+        return sum(chunk.bit_count() for chunk in self.chunks.values())
+
+    def __bool__(self):
+        return bool(self.chunks)
+
+    def __and__(self, other):
+        theirs = other.chunks
+        chunks = {key: chunk & theirs[key] for key, chunk in self.chunks.items() if key in theirs}
+        return RowBitmap(chunks={key: chunk for key, chunk in chunks.items() if chunk})
+
+    def __or__(self, other):
+        chunks = dict(self.chunks)
+        for key, chunk in other.chunks.items():
+            chunks[key] = chunks.get(key, 0) | chunk
+        return RowBitmap(chunks=chunks)
+
+    def __sub__(self, other):
+        theirs = other.chunks
+        chunks = {key: chunk & ~theirs.get(key, 0) for key, chunk in self.chunks.items()}
+        return RowBitmap(chunks={key: chunk for key, chunk in chunks.items() if chunk})
+
+    def _spread(self, key):
+        return b"".join(map(_SPREAD.__getitem__, self.chunks[key].to_bytes(CHUNK_BYTES, "little")))
+
+    def __iter__(self):
+        """Rows in ascending order."""
+        for key in sorted(self.chunks):
+            yield from compress(range(key << CHUNK_BITS, (key + 1) << CHUNK_BITS), self._spread(key))
+
+    def mask(self, size):
+        """A bytearray of `size` bytes, 1 at the index of every row in the set below size."""
+        mask = bytearray(size)
+        for key in self.chunks:
+            start = key << CHUNK_BITS
+            if start >= size:
+                continue
+            end = min(start + CHUNK_SIZE, size)
+            mask[start:end] = self._spread(key)[:end - start]
+        return mask
+
+    def to_buffers(self):
+        """(array of chunk keys, CHUNK_BYTES of bits per key) for saving."""
+        keys = array("I", sorted(self.chunks))
+        return keys, b"".join(self.chunks[key].to_bytes(CHUNK_BYTES, "little") for key in keys)
+
+    @classmethod
+    def from_buffers(cls, keys, data):
+        """The inverse of to_buffers(); data may be a memoryview of a mapped file."""
+        return cls(chunks={key: int.from_bytes(data[i * CHUNK_BYTES:(i + 1) * CHUNK_BYTES], "little")
+                           for i, key in enumerate(keys)})
@@ -0,0 +1,111 @@
+import logging
+
+import ttkbootstrap as ttk
+
+
+class Session:
+    """
+    Who is logged in and where. Passed between screens as an object
+    instead of being squeezed through argv.
+    """
+    def __init__(self, username="", role="Employee", location="Manila Branch"):
+        self.username = username
+        self.role = role
+        self.location = location
+
+    def __repr__(self):
+        return f"Session(username={self.username!r}, role={self.role!r}, location={self.location!r})"
+
+
+class ScreenRouter:
+    """
+    Swaps screen frames in place inside one long-lived ttk.Window.
+
+    Screens are built lazily the first time they are shown and then kept
+    in a cache, so going back and forth between them costs only a
+    pack_forget()/pack() pair instead of a fresh interpreter and theme build.
+    """
+    def __init__(self, window, session=None):
+        self.window = window
+        self.session = session or Session()
+        self.current = None
+        self._factories = {}
+        self._screens = {}
+
+    def register(self, name, factory):
+        """Registers a callable factory(master, router) that builds the screen frame."""
+        self._factories[name] = factory
+
+    def get(self, name):
+        """Returns the cached screen, building it on first use."""
+        screen = self._screens.get(name)
+        if screen is None:
+            screen = self._factories[name](self.window, self)
+            self._screens[name] = screen
+        return screen
+
+    def show(self, name):
+        """Hides the current screen and shows the named one."""
+        screen = self.get(name)
+        if self.current is not None and self.current is not screen:
+            self.current.pack_forget()
+
+        self.window.title(screen.window_title)
+        self.center_window(screen.window_geometry)
+        screen.pack(fill="both", expand=True)
+        self.current = screen
+
+        # Let the screen refresh anything that depends on the session
+        on_show = getattr(screen, "on_show", None)
+        if on_show is not None:
+            on_show()
+        return screen
+
+    def center_window(self, geometry):
+        """Resizes the window to 'WIDTHxHEIGHT' and centers it on the screen."""
+        width, height = (int(part) for part in geometry.split("x"))
+        x = (self.window.winfo_screenwidth() // 2) - (width // 2)
+        y = (self.window.winfo_screenheight() // 2) - (height // 2)
+        self.window.geometry(f'{width}x{height}+{x}+{y}')
+
+
+def register_default_screens(router):
+    """
+    Registers every screen of the application. Imports are deferred so
+    each screen module is only loaded when it is first shown.
+    """
+    def login(master, router):
+        from login_view import App
+        return App(master, router)
+
+    def main_menu(master, router):
+        from main_menu import MainMenu
+        return MainMenu(master, router)
+
+    def inventory(master, router):
+        from add_item_view import App
+        return App(master, router)
+
+    def search(master, router):
+        from search_form import ProductSearchApp
+        return ProductSearchApp(master, router)
+
+    router.register("login", login)
+    router.register("main_menu", main_menu)
+    router.register("inventory", inventory)
+    router.register("search", search)
+
+
+def run(start="login", session=None):
+    """Creates the single application window and shows the start screen."""
+    # Activity (logins, exports) goes to the log; item changes go to the journal
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s: %(message)s")
+    window = ttk.Window(themename="litera")
+    window.resizable(False, False)
+
+    router = ScreenRouter(window, session)
+    register_default_screens(router)
+    router.show(start)
+
+    window.mainloop()
+    return router
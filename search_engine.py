@@ -0,0 +1,2164 @@
+import logging
+import math
+import multiprocessing
+import os
+import re
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+from heapq import nsmallest
+from itertools import filterfalse, islice, takewhile
+
+from catalog import Catalog
+from fuzzy_match import TokenVocabulary, levenshtein, max_typos
+from index_snapshot import (DEFAULT_DIR as SNAPSHOT_DIR, MappedBarcodes, MappedPostings, Snapshot,
+                            SnapshotWriter, save_barcodes, snapshot_name, snapshot_paths)
+from inventory_journal import DEFAULT_DIR as JOURNAL_DIR, OP_NAMES, open_default_journal, read_records
+from inventory_store import open_default_store
+from query_cache import QueryCache
+from row_bitmap import RowBitmap
+
+log = logging.getLogger(__name__)
+
+
+# Fields indexed for each "Search By" option on the search form
+SEARCH_FIELDS = ("name", "sku", "barcode", "supplier")
+# Matched word by word; Product ID and barcode are matched as fragments instead
+TOKEN_FIELDS = ("name", "supplier")
+SEARCH_BY = {
+    "Any (All Fields)": SEARCH_FIELDS,
+    "Product Name": ("name",),
+    "Product ID": ("sku",),
+    "Barcode": ("barcode",),
+    "Supplier": ("supplier",),
+}
+ALL_CATEGORIES = "All Categories"
+
+TOKEN = re.compile(r"[0-9a-z]+")
+
+
+def tokenize(text):
+    return TOKEN.findall(text.lower())
+
+
+# The last word of a term is matched as the start of a word once it is this
+# long, since it is usually still being typed
+PREFIX_MIN = 2
+# Most words one such prefix expands to, in alphabetical order
+PREFIX_WORDS = 256
+
+
+def typed_words(tokens):
+    """(token, prefix) for each token of a term; prefix is True for a last word matched by its start."""
+    last = len(tokens) - 1
+    return [(token, number == last and len(token) >= PREFIX_MIN) for number, token in enumerate(tokens)]
+
+
+# Normalised search form state
+SearchQuery = namedtuple("SearchQuery", "term search_by category in_stock_only show_inactive sort_by")
+
+
+def make_query(term, search_by="Any (All Fields)", category=ALL_CATEGORIES, in_stock_only=True,
+               show_inactive=False, sort_by="Relevance"):
+    tokens = dict.fromkeys(tokenize(term))    # drop repeated words, keep their order
+    return SearchQuery(" ".join(tokens), search_by, category or ALL_CATEGORIES,
+                       bool(in_stock_only), bool(show_inactive), sort_by)
+
+
+# --- Posting lists ---
+# A posting list is an array('I') of catalog row ids in ascending order,
+# or a read-only memoryview of one in a mapped snapshot. Every operation
+# below keeps that order, and the bulk of each one runs inside
+# filter()/set lookups in C rather than a Python loop.
+
+def intersect(postings):
+    """Rows present in every list. Starts from the shortest list and probes the longer ones."""
+    if not postings:
+        return []
+    postings = sorted(postings, key=len)
+    result = postings[0]
+    for other in postings[1:]:
+        if not result:
+            break
+        if len(other) > 8 * len(result):
+            # Much longer list: binary-search each surviving row
+            end = len(other)
+            kept = []
+            pos = 0
+            for row in result:
+                pos = bisect_left(other, row, pos)
+                if pos == end:
+                    break
+                if other[pos] == row:
+                    kept.append(row)
+            result = kept
+        else:
+            result = list(filter(set(result).__contains__, other))
+    return result
+
+
+def contains(posting, row):
+    pos = bisect_left(posting, row)
+    return pos < len(posting) and posting[pos] == row
+
+
+def union(postings):
+    if len(postings) == 1:
+        return postings[0]
+    return sorted(set().union(*postings))
+
+
+def _copy_postings(postings):
+    """A copy of a posting table (a dict or a MappedPostings) that later changes to it do not reach."""
+    if isinstance(postings, MappedPostings):
+        return postings.copy()
+    return {key: posting[:] for key, posting in postings.items()}
+
+
+def writable(column):
+    """The column itself if it is an array, else an array copy of a mapped memoryview."""
+    if isinstance(column, array):
+        return column
+    copy = array(column.format)
+    copy.frombytes(column.cast("B"))
+    return copy
+
+
+def add_posting(postings, key, row):
+    """Inserts row into postings[key], keeping the list in ascending order. True if key is new."""
+    posting = postings.get(key)
+    if posting is None:
+        postings[key] = array("I", (row,))
+        return True
+    if not isinstance(posting, array):
+        posting = postings[key] = writable(posting)
+    if not posting or posting[-1] < row:
+        posting.append(row)
+    else:
+        pos = bisect_left(posting, row)
+        if pos == len(posting) or posting[pos] != row:
+            posting.insert(pos, row)
+    return False
+
+
+def remove_posting(postings, key, row):
+    """Removes row from postings[key]. True if that emptied and dropped the key."""
+    posting = postings.get(key)
+    if posting is None:
+        return False
+    if not isinstance(posting, array):
+        posting = postings[key] = writable(posting)
+    pos = bisect_left(posting, row)
+    if pos < len(posting) and posting[pos] == row:
+        del posting[pos]
+        if not posting:
+            del postings[key]
+            return True
+    return False
+
+
+class SearchCancelled(Exception):
+    """Raised inside search() when a newer query has superseded this one."""
+
+
+def _no_lap(stage, rows=None):
+    pass
+
+
+# --- Ranking ---
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# A word in the name says more about an item than the same word in its supplier
+FIELD_WEIGHTS = {"name": 2.0, "supplier": 1.0}
+# Relevance of Product ID / barcode fragment hits; an exact code beats any word match
+CODE_EXACT = 1000.0
+CODE_PREFIX = 100.0
+CODE_FRAGMENT = 10.0
+
+
+def grow(column, size):
+    """Pads a row-indexed array with zeros so row size - 1 fits."""
+    if len(column) < size:
+        column.frombytes(bytes((size - len(column)) * column.itemsize))
+
+
+class SortedOrder:
+    """
+    Every live row, pre-sorted by one key (price, lower-cased name).
+
+    rank[row] is the row's position in that order, so any subset of rows
+    is put in order by rank.__getitem__ without touching the catalog.
+    A row added later takes the midpoint of its neighbours' ranks, which
+    is why ranks are floats; when two neighbours end up too close to
+    split, the ranks of the rows around them are spread out again. Equal
+    keys fall back to row order.
+    """
+    def __init__(self, catalog, key_of):
+        self.key_of = key_of
+        self.rows = array("I", sorted(catalog.live_rows(), key=key_of))
+        self.rank = array("d")
+        grow(self.rank, catalog.row_count)
+        self._renumber()
+
+    @classmethod
+    def presorted(cls, key_of, rows, size):
+        """An order over rows already sorted by key_of, in a catalog of `size` rows."""
+        order = cls.__new__(cls)
+        order.key_of = key_of
+        order.rows = rows
+        order.rank = array("d")
+        grow(order.rank, size)
+        order._renumber()
+        return order
+
+    @classmethod
+    def mapped(cls, key_of, rows, rank):
+        """An order over saved rows and ranks; SearchIndex copies them into memory before changing them."""
+        order = cls.__new__(cls)
+        order.key_of = key_of
+        order.rows = rows
+        order.rank = rank
+        return order
+
+    def _renumber(self):
+        # The assignments run in C, one per row of the order
+        deque(map(self.rank.__setitem__, self.rows, range(len(self.rows))), maxlen=0)
+
+    def _position(self, row, key):
+        """Where row sits, or belongs, under `key`; the row itself is compared by that key too."""
+        key_of = self.key_of
+        return bisect_left(self.rows, (key, row),
+                           key=lambda other: (key if other == row else key_of(other), other))
+
+    def add(self, row):
+        """Inserts row at its place for its current key."""
+        grow(self.rank, row + 1)
+        pos = self._position(row, self.key_of(row))
+        rows, rank = self.rows, self.rank
+        rows.insert(pos, row)
+        low = rank[rows[pos - 1]] if pos > 0 else None
+        high = rank[rows[pos + 1]] if pos + 1 < len(rows) else None
+        if low is None and high is None:
+            rank[row] = 0.0
+        elif low is None:
+            rank[row] = high - 1.0
+        elif high is None:
+            rank[row] = low + 1.0
+        else:
+            middle = (low + high) / 2
+            if low < middle < high:
+                rank[row] = middle
+            else:
+                self._respace(pos)
+
+    def _respace(self, pos):
+        """
+        Spreads out the ranks around position pos evenly, in a window that
+        doubles until its end ranks leave room; renumbers everything only
+        when the window has grown to the whole order.
+        """
+        rows, rank = self.rows, self.rank
+        width = 16
+        while True:
+            low, high = max(pos - width, 0), min(pos + width, len(rows) - 1)
+            if low == 0 and high == len(rows) - 1:
+                self._renumber()
+                return
+            start, end = rank[rows[low]], rank[rows[high]]
+            step = (end - start) / (high - low)
+            # Room for a few dozen more halvings before the next respace
+            if step > max(abs(start), abs(end), 1.0) * 2**-30:
+                for offset in range(1, high - low):
+                    rank[rows[low + offset]] = start + offset * step
+                return
+            width *= 2
+
+    def remove(self, row, key):
+        """Drops row, found by the key it was placed under (its key before any change)."""
+        pos = self._position(row, key)
+        if pos < len(self.rows) and self.rows[pos] == row:
+            del self.rows[pos]
+
+
+class RankedGroup:
+    """
+    One block of result rows and the order to show them in: key_of(row)
+    is a sort key, lowest first, made unique by pairing it with the row.
+
+    Nothing is sorted up front. Each page is the k smallest (key, row)
+    pairs past the previous page's last pair, taken with a heap, so the
+    first page of 100k matches costs one pass rather than a full sort.
+    When a SortedOrder already ranks the rows and they are not too
+    sparse in it (1 in DENSE or more), pages are read straight off that
+    order instead, stopping as soon as the page is full. Rows are in
+    ascending order, like posting lists, so while only a page or two is
+    read the order's rows are checked against them by binary search
+    rather than by first hashing every match.
+    """
+    # Read the pre-sorted order directly when it holds at most this many
+    # rows per match; below that, a heap over the matches does less work
+    DENSE = 256
+
+    def __init__(self, rows, key_of, order=None):
+        self.rows = rows
+        self.key_of = key_of
+        self.order = order if order is not None and len(rows) * self.DENSE >= len(order.rows) else None
+        self._keyed = None
+        self._members = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def top(self, k=None, after=None):
+        """The next k (key, row) pairs after the pair `after`, in order; all of them when k is None."""
+        if self.order is not None:
+            return self._walk(k, after)
+        if self._keyed is None:
+            self._keyed = list(zip(map(self.key_of, self.rows), self.rows))
+        pairs = self._keyed if after is None else filter(after.__lt__, self._keyed)
+        return sorted(pairs) if k is None else nsmallest(k, pairs)
+
+    def _walk(self, k, after):
+        order = self.order
+        rank = order.rank
+        if self._members is not None:
+            member = self._members.__contains__
+        elif k is not None and k * len(order.rows) * 12 < len(self.rows) ** 2:
+            # The page is full after about k * len(order.rows) / len(rows)
+            # probes, each costing about what hashing a dozen rows into a set does
+            rows = self.rows
+            member = partial(contains, rows)
+        else:
+            self._members = set(self.rows)
+            member = self._members.__contains__
+        start = 0
+        if after is not None:
+            # Found again by the row's rank now, in case ranks were renumbered since
+            start = bisect_right(order.rows, rank[after[1]], key=rank.__getitem__)
+        rows = filter(member, islice(order.rows, start, None))
+        if k is not None:
+            rows = islice(rows, k)
+        return [(rank[row], row) for row in rows]
+
+
+class SearchResult:
+    """
+    The rows matching one query, as RankedGroups shown one after the
+    other: first the exact_count rows that matched the term as typed,
+    then typo-tolerant name matches. Rows are only put in order as pages
+    are asked for, and items are decoded only when shown.
+    """
+    def __init__(self, query, index, groups):
+        self.query = query
+        self.index = index
+        self.groups = groups
+        self.exact_count = len(groups[0]) if groups else 0
+        self._count = sum(map(len, groups))
+
+    def __len__(self):
+        return self._count
+
+    def _next_rows(self, size, cursor):
+        group_no, after, shown = cursor or (0, None, 0)
+        rows = []
+        if size == 0:
+            return rows, ((group_no, after, shown) if shown < self._count else None)
+        with self.index.lock:
+            while group_no < len(self.groups):
+                wanted = None if size is None else size - len(rows)
+                pairs = self.groups[group_no].top(wanted, after)
+                rows.extend(row for _, row in pairs)
+                if wanted is not None and len(pairs) == wanted:
+                    after = pairs[-1]
+                    break
+                group_no, after = group_no + 1, None
+        shown += len(rows)
+        return rows, ((group_no, after, shown) if shown < self._count else None)
+
+    def _decode(self, rows):
+        with self.index.lock:
+            catalog = self.index.catalog
+            return [(catalog.sku_at(row), catalog.item_at(row)) for row in rows if catalog.is_live(row)]
+
+    def page(self, size=50, cursor=None):
+        """
+        Returns ([(sku, item)], next cursor) for up to `size` results after
+        `cursor`, which is None for the first page. Each page carries on
+        from where the cursor's page stopped; the next cursor is None once
+        every result has been shown.
+        """
+        rows, cursor = self._next_rows(size, cursor)
+        return self._decode(rows), cursor
+
+    @property
+    def rows(self):
+        """Every matching row in display order (a full sort)."""
+        return self._next_rows(None, None)[0]
+
+    def items(self, start=0, stop=None):
+        """Returns (sku, item) pairs for a slice of the results."""
+        return self._decode(self._next_rows(stop, None)[0][start:])
+
+
+def normalize(value):
+    """Lower-cases a code and collapses its punctuation, so "HW-00" and "hw 00" match alike."""
+    return " ".join(tokenize(value))
+
+
+class NgramIndex:
+    """
+    Trigram index for fragments of codes such as Product IDs and barcodes.
+
+    Every normalised value is padded with start/end markers ("^^value$$")
+    and each of its trigrams maps to a posting list of rows. A fragment is
+    found by intersecting the posting lists of its own trigrams and then
+    checking the few candidates, so the cost follows the rarest trigram
+    in the fragment rather than the catalog size. Anchoring the fragment
+    with the markers turns the same lookup into a prefix or suffix match.
+    value_of(row) returns the current raw value of a row.
+    """
+    N = 3
+
+    def __init__(self, value_of, values=()):
+        self.value_of = value_of
+        self.grams = {}
+        lists = {}
+        for row, value in values:
+            for gram in self._grams(value):
+                lists.setdefault(gram, []).append(row)
+        self.grams = {gram: array("I", rows) for gram, rows in lists.items()}
+
+    @classmethod
+    def mapped(cls, value_of, grams):
+        """An index over an existing gram table: a saved one (a MappedPostings) or one joined from shards."""
+        index = cls.__new__(cls)
+        index.value_of = value_of
+        index.grams = grams
+        return index
+
+    @staticmethod
+    def _padded(value):
+        return f"^^{normalize(value)}$$"
+
+    def _grams(self, value):
+        text = self._padded(value)
+        return {text[i:i + self.N] for i in range(len(text) - self.N + 1)}
+
+    def add(self, row, value):
+        for gram in self._grams(value):
+            add_posting(self.grams, gram, row)
+
+    def remove(self, row, value):
+        for gram in self._grams(value):
+            remove_posting(self.grams, gram, row)
+
+    def update(self, row, old, new):
+        """Moves row from value old to new, touching only the trigrams that differ."""
+        before, after = self._grams(old), self._grams(new)
+        for gram in before - after:
+            remove_posting(self.grams, gram, row)
+        for gram in after - before:
+            add_posting(self.grams, gram, row)
+
+    def pattern(self, fragment, mode="substring"):
+        """The padded text to look for and its trigrams, or None for an empty fragment."""
+        fragment = normalize(fragment)
+        if not fragment:
+            return None
+        if mode == "substring" and len(fragment) < self.N:
+            mode = "prefix"
+        text = {"prefix": "^^" + fragment, "suffix": fragment + "$$"}.get(mode, fragment)
+        return text, {text[i:i + self.N] for i in range(len(text) - self.N + 1)}
+
+    def verify(self, rows, text):
+        """The rows whose value really contains text, out of candidates holding all its trigrams."""
+        return [row for row in rows if text in self._padded(self.value_of(row))]
+
+    def find(self, fragment, mode="substring"):
+        """
+        Rows whose value contains the fragment ("substring"), starts with
+        it ("prefix") or ends with it ("suffix"). Unanchored fragments
+        shorter than a trigram are looked up as prefixes.
+        """
+        pattern = self.pattern(fragment, mode)
+        if pattern is None:
+            return []
+        text, grams = pattern
+        postings = []
+        for gram in grams:
+            posting = self.grams.get(gram)
+            if posting is None:
+                return []
+            postings.append(posting)
+        rows = intersect(postings)
+        if len(grams) == 1:
+            # A single trigram is the whole pattern; nothing left to check
+            return rows
+        return self.verify(rows, text)
+
+
+# --- Index builds ---
+
+# Catalogs smaller than this are indexed in-process; starting a pool costs more
+PARALLEL_BUILD_ABOVE = 100_000
+# Shards per worker, so a slow shard does not hold the others up and
+# progress moves in small steps
+SHARDS_PER_WORKER = 4
+
+
+def _usable_cpus():
+    """CPUs this process may run on; in a container or under taskset that can be fewer than os.cpu_count()."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:      # not on every platform
+        return os.cpu_count() or 1
+
+
+def facet_bucket(item):
+    """Which of a category's four facet counts an item falls in: (in stock) * 2 + (active)."""
+    return (item["qty"] > 0) * 2 + bool(item["active"])
+
+
+def _index_shard(catalog, base=0):
+    """
+    Everything an index build reads from each row, for the live rows of
+    catalog numbered from `base`: a whole catalog, or a Catalog.shard()
+    indexed in a worker process. Posting lists come out in row order,
+    and each order as a run of rows sorted by key; SearchIndex._assemble()
+    joins the results of consecutive shards.
+    """
+    postings = {field: {} for field in TOKEN_FIELDS}
+    lengths = {field: array("H") for field in TOKEN_FIELDS}
+    for column in lengths.values():
+        grow(column, catalog.row_count)
+    grams = {"sku": {}, "barcode": {}}
+    fragments = NgramIndex(None)
+    categories, out_of_stock, inactive, live = {}, [], [], []
+    facets, barcodes = {}, {}
+    prices, names = [], []
+    for local in catalog.live_rows():
+        row = base + local
+        item = catalog.item_at(local)
+        barcode = item["barcode"]
+        for field in TOKEN_FIELDS:
+            field_lists = postings[field]
+            tokens = set(tokenize(item[field]))
+            lengths[field][local] = min(len(tokens), 0xFFFF)
+            for token in tokens:
+                field_lists.setdefault(token, []).append(row)
+        for field, value in (("sku", catalog.sku_at(local)), ("barcode", barcode)):
+            field_grams = grams[field]
+            for gram in fragments._grams(value):
+                field_grams.setdefault(gram, []).append(row)
+        live.append(row)
+        categories.setdefault(item["category"], []).append(row)
+        if item["qty"] <= 0:
+            out_of_stock.append(row)
+        if not item["active"]:
+            inactive.append(row)
+        facets.setdefault(item["category"], [0, 0, 0, 0])[facet_bucket(item)] += 1
+        if barcode:
+            barcodes.setdefault(barcode, row)
+        prices.append(item["price"])
+        names.append(item["name"].lower())
+
+    def run(keys):
+        # Stable, so equal keys stay in row order
+        order = sorted(range(len(live)), key=keys.__getitem__)
+        return array("I", map(live.__getitem__, order)), [keys[i] for i in order]
+
+    return {
+        "postings": {field: {token: array("I", rows) for token, rows in field_lists.items()}
+                     for field, field_lists in postings.items()},
+        "lengths": lengths,
+        "grams": {field: {gram: array("I", rows) for gram, rows in field_grams.items()}
+                  for field, field_grams in grams.items()},
+        "categories": {category: RowBitmap(rows) for category, rows in categories.items()},
+        "live": RowBitmap(live),
+        "out_of_stock": RowBitmap(out_of_stock),
+        "inactive": RowBitmap(inactive),
+        "facets": facets,
+        "barcodes": barcodes,
+        "orders": {"Price": run(prices), "Name": run(names)},
+        "norm_orders": {field: run([lengths[field][row - base] for row in live]) for field in TOKEN_FIELDS},
+    }
+
+
+def _join_postings(tables):
+    """Joins key -> posting list tables of consecutive shards, each key's lists end to end."""
+    joined = {}
+    for table in tables:
+        for key, rows in table.items():
+            posting = joined.get(key)
+            if posting is None:
+                joined[key] = rows
+            else:
+                posting.extend(rows)
+    return joined
+
+
+def _merge_runs(runs):
+    """Merges (rows, keys) runs of consecutive shards into one array of rows in key order, ties in row order."""
+    if len(runs) == 1:
+        return runs[0][0]
+    rows, keys = array("I"), []
+    for run_rows, run_keys in runs:
+        rows.extend(run_rows)
+        keys.extend(run_keys)
+    # The sort finds the sorted runs and merges them in C; being stable, it keeps ties in row order
+    return array("I", map(rows.__getitem__, sorted(range(len(rows)), key=keys.__getitem__)))
+
+
+# --- Query planning ---
+
+# Start from the rows passing the filters when they are this many times
+# fewer than the estimated matches: probing a posting list for one row
+# from Python costs about as much as scanning that many rows in C
+DRIVE_FROM_FILTER = 8
+# Checking one fragment candidate (decoding and normalising its value)
+# costs about as much as intersecting this many posting list rows in C
+VERIFY_COST = 50
+
+# One Product ID / barcode lookup: the padded fragment, the (trigram,
+# posting) pairs to intersect, shortest first, the common trigrams left
+# out, and whether candidates still need their value checked
+CodeLookup = namedtuple("CodeLookup", "text postings skipped verify")
+
+
+class QueryPlan:
+    """
+    How SearchIndex.search() evaluates one query, chosen by plan() from
+    the index's cardinality statistics: posting list lengths for words
+    and trigrams, and the facet counts per category and stock/active
+    flags for the filters. Nothing here is looked at row by row.
+
+    The word lookups run rarest word first and the fragment lookups
+    rarest trigram first. When the filters let through DRIVE_FROM_FILTER
+    times fewer rows than are estimated to match (`drive`), the filter's
+    rows are listed and every posting list is only probed for those;
+    otherwise matches are found first and filtered through the byte mask,
+    still before any Product ID or barcode is decoded to be checked.
+    """
+    def __init__(self, query, tokens, fields, words, codes, allowed, count, mask, drive):
+        self.query = query
+        self.tokens = tokens
+        self.fields = fields
+        self.token_fields = [field for field in fields if field in TOKEN_FIELDS]
+        self.words = words          # (estimated rows, token), rarest first
+        self.codes = codes          # field -> CodeLookup
+        self.allowed = allowed      # RowBitmap of the rows passing the filters, or None
+        self.count = count          # its size, from the facet counts
+        self.mask = mask
+        self.drive = drive
+        self.estimate = (min(rows for rows, _ in words) if words else 0) + \
+            sum(len(code.postings[0][1]) for code in codes.values())
+
+    def describe(self):
+        """A few lines for explain mode."""
+        if self.allowed is None:
+            start = "matches (no filter)"
+        elif self.drive:
+            start = f"filter ({self.count:,} rows pass)"
+        else:
+            start = f"matches, then filter ({self.count:,} rows pass)"
+        lines = [f"plan: ~{self.estimate:,} matches, from {start}"]
+        if self.words:
+            lines.append("  words " + ", ".join(f"{token} ~{rows:,}" for rows, token in self.words))
+        for field, code in self.codes.items():
+            grams = ", ".join(f"{gram} ~{len(posting):,}" for gram, posting in code.postings)
+            skipped = f"; skip {', '.join(sorted(code.skipped))}" if code.skipped else ""
+            check = "; check values" if code.verify else ""
+            lines.append(f"  {field} {grams}{skipped}{check}")
+        return "\n".join(lines)
+
+
+class SearchIndex:
+    """
+    Inverted indexes over a Catalog, one per searchable field.
+
+    Name and supplier map each token to the posting list of rows
+    containing it. Product ID and barcode are NgramIndexes, so a typed
+    fragment of either matches as a substring. The form's filters are
+    RowBitmaps: one per category plus the live, out-of-stock and inactive
+    rows. A filter combination is worked out once as bitmap algebra,
+    (category or live) - (out_of_stock | inactive), and kept as a byte
+    mask until the next change, so filtering the matches is one pass in C.
+
+    `facets` counts the live items of each category by stock and active
+    flags. The counts move by one as items are indexed and unindexed, so
+    an item whose quantity drops to zero leaves the in-stock count at once.
+
+    When a query finds fewer than FUZZY_BELOW exact matches, misspelt
+    name words are also looked up in a TokenVocabulary of name words and
+    the resulting rows are listed after the exact ones. That step stops
+    after FUZZY_BUDGET seconds with whatever it has found.
+
+    plan() orders each query's steps by how many rows they are expected
+    to leave (see QueryPlan), from the posting list lengths and facet
+    counts that are kept up to date anyway.
+
+    Results are ranked rather than sorted. Price and Name A-Z read row
+    ranks from SortedOrders kept over the whole catalog; Relevance is a
+    BM25 score whose per-row length norm for each field is computed when
+    the row is indexed, so a query only adds up idf * norm over its words.
+
+    apply() folds store change events into every structure row by row,
+    under `lock`, so the index follows inventory edits without a rebuild.
+    An edit only touches what it changed: the words added or dropped,
+    the bitmaps whose flag flipped, the orders whose key moved. A removed
+    row is tombstoned: it leaves the bitmaps at once, which keeps it out
+    of every result, and compact() later purges it from the posting lists
+    and orders in one pass per list. check() compares the result with a
+    full rebuild. Each changed item is then passed to `observers` as
+    observer(sku, old item or None, new item or None).
+
+    save() writes the whole index to a snapshot file and load() maps one
+    back in (see index_snapshot). A loaded index answers queries straight
+    from the file: posting lists, orders, norms and catalog columns are
+    memoryviews that the OS pages in as they are touched. Changes made
+    after loading go to memory: per-key overlays on the posting tables,
+    and the flat columns are copied out of the file on the first change.
+    """
+    # Above this many rows in one change event, rebuilding is cheaper
+    BULK_CHANGE = 2000
+    FUZZY_BELOW = 20
+    FUZZY_BUDGET = 0.008
+
+    def __init__(self, catalog):
+        self._assemble(catalog, [_index_shard(catalog)])
+
+    def _assemble(self, catalog, parts):
+        """
+        Sets every structure up from the _index_shard() results of
+        consecutive row ranges of catalog, in row order. Rows of one range
+        all come before those of the next, so posting lists and columns
+        are joined end to end and sorted runs merged.
+        """
+        self.catalog = catalog
+        self.lock = threading.RLock()
+        self.stale = False
+        self.observers = []
+        self.postings = {field: _join_postings(part["postings"][field] for part in parts) for field in TOKEN_FIELDS}
+        self._terms = {}
+        self.facets = {}
+        self._masks = {}
+        # Exact barcode -> row, for scanner lookups
+        self.barcodes = {}
+        self.snapshot = None
+        self._vocabulary_changes = 0
+        self.categories = {}
+        self.live, self.out_of_stock, self.inactive = RowBitmap(), RowBitmap(), RowBitmap()
+        for part in parts:
+            for category, counts in part["facets"].items():
+                total = self.facets.setdefault(category, [0, 0, 0, 0])
+                for bucket, count in enumerate(counts):
+                    total[bucket] += count
+            for barcode, row in part["barcodes"].items():
+                self.barcodes.setdefault(barcode, row)
+            for category, rows in part["categories"].items():
+                self.categories[category] = self.categories.get(category, RowBitmap()) | rows
+            self.live = self.live | part["live"]
+            self.out_of_stock = self.out_of_stock | part["out_of_stock"]
+            self.inactive = self.inactive | part["inactive"]
+        self._publish_facets()
+        # Removed rows still in posting lists and orders, until compact()
+        self.tombstones = RowBitmap()
+        self._vocabulary = TokenVocabulary(self.postings["name"])
+        self.fragments = {
+            field: NgramIndex.mapped(value_of, _join_postings(part["grams"][field] for part in parts))
+            for field, value_of in (("sku", catalog.sku_at), ("barcode", catalog.barcode_at))
+        }
+
+        # Average field lengths are fixed at build time; rows added later are
+        # normed against them, which is close enough until the next rebuild
+        live = max(len(catalog), 1)
+        self.average_length = {}
+        self.field_norms = {}
+        for field in TOKEN_FIELDS:
+            lengths = array("H")
+            for part in parts:
+                lengths.extend(part["lengths"][field])
+            self.average_length[field] = max(sum(lengths) / live, 1.0)
+            # A row's norm only depends on its length, so each length is worked out once
+            table = {length: self._norm(field, length) for length in set(lengths)}
+            norms = self.field_norms[field] = array("f", map(table.__getitem__, lengths))
+            if len(catalog) < catalog.row_count:
+                for row in range(len(norms)):
+                    if not catalog.is_live(row):
+                        norms[row] = 0.0
+        order_keys, norm_keys = self._order_keys()
+        self.orders = {sort_by: SortedOrder.presorted(key_of, _merge_runs([part["orders"][sort_by] for part in parts]),
+                                                      catalog.row_count)
+                       for sort_by, key_of in order_keys.items()}
+        # Best BM25 weight first, for queries whose words all hit one field.
+        # The weight falls as the field gets longer, so that is length order
+        self.norm_orders = {field: SortedOrder.presorted(key_of, _merge_runs([part["norm_orders"][field]
+                                                                               for part in parts]),
+                                                         catalog.row_count)
+                            for field, key_of in norm_keys.items()}
+
+    @classmethod
+    def build(cls, catalog, workers=None, progress=None):
+        """
+        Builds an index over catalog, sharded across a pool of `workers`
+        processes (one per CPU by default, and never more than there are
+        CPUs) once it holds PARALLEL_BUILD_ABOVE rows or more. Each worker
+        indexes a Catalog.shard() and sends the partial structures back to
+        be joined by _assemble(). progress(rows done, rows in all), if
+        given, is called as shards finish.
+        """
+        cpus = _usable_cpus()
+        # Workers beyond the CPUs only add spawning and pickling to a build
+        # that runs no faster, and a single CPU gains nothing from a pool
+        workers = min(workers or cpus, cpus)
+        total = catalog.row_count
+        if workers < 2 or total < PARALLEL_BUILD_ABOVE:
+            index = cls(catalog)
+            if progress is not None:
+                progress(total, total)
+            return index
+
+        size = -(-total // (workers * SHARDS_PER_WORKER))
+        parts, done = {}, 0
+        # Spawned rather than forked: the build runs next to the UI and search threads
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = {pool.submit(_index_shard, catalog.shard(start, min(start + size, total)), start): start
+                       for start in range(0, total, size)}
+            for future in as_completed(futures):
+                start = futures[future]
+                parts[start] = future.result()
+                done += min(start + size, total) - start
+                if progress is not None:
+                    progress(done, total)
+        index = cls.__new__(cls)
+        index._assemble(catalog, [parts[start] for start in sorted(parts)])
+        return index
+
+    @classmethod
+    def from_store(cls, store, workers=None, progress=None):
+        return cls.build(store.load_catalog(), workers, progress)
+
+    def _order_keys(self):
+        """Sort keys of the SortedOrders; they look columns up on each call, as a loaded index swaps them."""
+        catalog = self.catalog
+        orders = {"Price": catalog.price_at, "Name": lambda row: catalog.name_at(row).lower()}
+        norms = {field: (lambda row, field=field: self.field_norms[field][row]) for field in TOKEN_FIELDS}
+        return orders, norms
+
+    @property
+    def vocabulary(self):
+        """Name words for typo lookup. A loaded index builds it on first use or in warm_vocabulary()."""
+        if self._vocabulary is None:
+            self._vocabulary = TokenVocabulary(self.postings["name"])
+        return self._vocabulary
+
+    def warm_vocabulary(self):
+        """Builds the vocabulary of a loaded index without holding the lock for the whole build."""
+        with self.lock:
+            if self._vocabulary is not None:
+                return
+            words = list(self.postings["name"])
+            changes = self._vocabulary_changes
+        vocabulary = TokenVocabulary(words)
+        with self.lock:
+            # A name word that came or went meanwhile means the list is out of date
+            if self._vocabulary is None and changes == self._vocabulary_changes:
+                self._vocabulary = vocabulary
+
+    # --- Snapshots ---
+
+    def save(self, path, mark):
+        """
+        Writes the index to a snapshot file. `mark` is the journal position
+        (InventoryJournal.mark()) every change up to which the index holds;
+        load() replays from there. Under the lock every table is only
+        copied, one C-level copy per column or list (mapped sections are
+        read-only and shared); sorting and encoding them into sections and
+        writing the file happen after releasing it.
+        """
+        with self.lock:
+            if self.stale:
+                raise ValueError("cannot save a stale index")
+            columns, catalog_meta = self.catalog.sections()
+            columns = {f"catalog.{name}": column[:] for name, column in columns.items()}
+            for field, norms in self.field_norms.items():
+                columns[f"norms.{field}"] = norms[:]
+            orders = {**self.orders, **{f"norm.{field}": order for field, order in self.norm_orders.items()}}
+            for name, order in orders.items():
+                columns[f"order.{name}.rows"] = order.rows[:]
+                columns[f"order.{name}.rank"] = order.rank[:]
+            tables = {f"postings.{field}": _copy_postings(postings) for field, postings in self.postings.items()}
+            for field, fragments in self.fragments.items():
+                tables[f"grams.{field}"] = _copy_postings(fragments.grams)
+            categories = list(self.categories)
+            bitmaps = {**{f"category.{number}": self.categories[category]
+                          for number, category in enumerate(categories)},
+                       "live": self.live, "out_of_stock": self.out_of_stock, "inactive": self.inactive,
+                       "tombstones": self.tombstones}
+            bitmaps = {name: RowBitmap(chunks=dict(bitmap.chunks)) for name, bitmap in bitmaps.items()}
+            barcodes = self.barcodes.copy()
+            meta = {
+                "journal": list(mark),
+                "catalog": catalog_meta,
+                "categories": categories,
+                "facets": {category: list(counts) for category, counts in self.facet_view.items()},
+                "average_length": self.average_length,
+            }
+
+        writer = SnapshotWriter()
+        for name, column in columns.items():
+            writer.add(name, column)
+        for name, postings in tables.items():
+            MappedPostings.save(writer, name, postings)
+        for name, bitmap in bitmaps.items():
+            keys, data = bitmap.to_buffers()
+            writer.add(f"bitmap.{name}.keys", keys)
+            writer.add(f"bitmap.{name}.data", data)
+        save_barcodes(writer, barcodes)
+        writer.write(path, meta)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Maps a snapshot written by save(). Only the header is parsed here;
+        the journal position it was saved at is in index.snapshot.meta.
+        Raises OSError or ValueError if the file cannot be used.
+        """
+        snapshot = Snapshot(path)
+        meta = snapshot.meta
+        catalog = Catalog.from_sections({name[len("catalog."):]: snapshot[name]
+                                         for name in snapshot.layout if name.startswith("catalog.")},
+                                        meta["catalog"])
+        index = cls.__new__(cls)
+        index.catalog = catalog
+        index.lock = threading.RLock()
+        index.stale = False
+        index.observers = []
+        index.snapshot = snapshot
+        index.postings = {field: MappedPostings.load(snapshot, f"postings.{field}") for field in TOKEN_FIELDS}
+        index._terms = {}
+        index.fragments = {field: NgramIndex.mapped(value_of, MappedPostings.load(snapshot, f"grams.{field}"))
+                           for field, value_of in (("sku", catalog.sku_at), ("barcode", catalog.barcode_at))}
+        index.facets = meta["facets"]
+        index._publish_facets()
+        index._masks = {}
+        index.barcodes = MappedBarcodes.load(snapshot, catalog.barcode_at)
+
+        def bitmap(name):
+            return RowBitmap.from_buffers(snapshot[f"bitmap.{name}.keys"], snapshot[f"bitmap.{name}.data"])
+
+        index.categories = {category: bitmap(f"category.{number}")
+                            for number, category in enumerate(meta["categories"])}
+        index.live = bitmap("live")
+        index.out_of_stock = bitmap("out_of_stock")
+        index.inactive = bitmap("inactive")
+        index.tombstones = bitmap("tombstones")
+        index._vocabulary = None
+        index._vocabulary_changes = 0
+        index.average_length = meta["average_length"]
+        index.field_norms = {field: snapshot[f"norms.{field}"] for field in TOKEN_FIELDS}
+        order_keys, norm_keys = index._order_keys()
+        index.orders = {sort_by: SortedOrder.mapped(key_of, snapshot[f"order.{sort_by}.rows"],
+                                                    snapshot[f"order.{sort_by}.rank"])
+                        for sort_by, key_of in order_keys.items()}
+        index.norm_orders = {field: SortedOrder.mapped(key_of, snapshot[f"order.norm.{field}.rows"],
+                                                       snapshot[f"order.norm.{field}.rank"])
+                             for field, key_of in norm_keys.items()}
+        return index
+
+    def _unmap(self):
+        """Copies the flat columns of a loaded index into memory, before the first change to them."""
+        self.field_norms = {field: writable(norms) for field, norms in self.field_norms.items()}
+        for order in (*self.orders.values(), *self.norm_orders.values()):
+            order.rows = writable(order.rows)
+            order.rank = writable(order.rank)
+
+    def _norm(self, field, length):
+        """
+        BM25 weight of one matching word in a field of `length` words.
+        Stored negated, so that lower sorts first like every other key.
+        """
+        norm = 1 - BM25_B + BM25_B * length / self.average_length[field]
+        return -(BM25_K1 + 1) / (1 + BM25_K1 * norm)
+
+    # --- Incremental maintenance ---
+
+    def _count_facet(self, item, delta):
+        self.facets.setdefault(item["category"], [0, 0, 0, 0])[facet_bucket(item)] += delta
+
+    def _publish_facets(self):
+        """Replaces facet_view, the copy of the facet counts that facet_counts() reads without the lock."""
+        self.facet_view = {category: tuple(counts) for category, counts in self.facets.items()}
+
+    def _orders(self):
+        return (*self.orders.values(), *self.norm_orders.values())
+
+    def _word_changed(self, word, added):
+        """A name word appeared in or vanished from the catalog."""
+        self._vocabulary_changes += 1
+        # A loaded index that has not built its vocabulary yet will build it from the current words
+        if self._vocabulary is not None:
+            if added:
+                self._vocabulary.add(word)
+            else:
+                self._vocabulary.remove(word)
+
+    def _add_token(self, field, token, row):
+        if add_posting(self.postings[field], token, row):
+            if field in self._terms:
+                insort(self._terms[field], token)
+            if field == "name":
+                self._word_changed(token, added=True)
+
+    def _remove_token(self, field, token, row):
+        if remove_posting(self.postings[field], token, row):
+            if field in self._terms:
+                terms = self._terms[field]
+                del terms[bisect_left(terms, token)]
+            if field == "name":
+                self._word_changed(token, added=False)
+
+    def _set_flags(self, row, item, add):
+        """Files the row under its category, stock and active bitmaps and facet counts, or takes it out."""
+        category = self.categories.get(item["category"])
+        if category is None:
+            category = self.categories[item["category"]] = RowBitmap()
+        flags = RowBitmap.add if add else RowBitmap.discard
+        flags(category, row)
+        flags(self.live, row)
+        if item["qty"] <= 0:
+            flags(self.out_of_stock, row)
+        if not item["active"]:
+            flags(self.inactive, row)
+        self._count_facet(item, 1 if add else -1)
+        self._masks.clear()
+
+    def _set_barcode(self, row, barcode, add):
+        if not barcode:
+            return
+        if add:
+            self.barcodes.setdefault(barcode, row)
+        elif self.barcodes.get(barcode) == row:
+            del self.barcodes[barcode]
+
+    def _index_row(self, row, sku, item):
+        """Adds a new row to every structure."""
+        for field in TOKEN_FIELDS:
+            tokens = set(tokenize(item[field]))
+            norms = self.field_norms[field]
+            grow(norms, row + 1)
+            norms[row] = self._norm(field, len(tokens))
+            for token in tokens:
+                self._add_token(field, token, row)
+        self._set_flags(row, item, add=True)
+        self._set_barcode(row, item["barcode"], add=True)
+        self.fragments["sku"].add(row, sku)
+        self.fragments["barcode"].add(row, item["barcode"])
+        for order in self._orders():
+            order.add(row)
+
+    def _update_row(self, row, old, new, old_keys):
+        """
+        Moves an edited row from its old values to its new ones, touching
+        only what changed: the words that came or went, the bitmaps whose
+        flag flipped, and the orders whose key moved. The catalog already
+        holds the new values; old_keys are the orders' keys from before.
+        """
+        for field in TOKEN_FIELDS:
+            if old[field] == new[field]:
+                continue
+            before, after = set(tokenize(old[field])), set(tokenize(new[field]))
+            for token in before - after:
+                self._remove_token(field, token, row)
+            for token in after - before:
+                self._add_token(field, token, row)
+            self.field_norms[field][row] = self._norm(field, len(after))
+        if (old["category"], old["qty"] > 0, bool(old["active"])) != \
+                (new["category"], new["qty"] > 0, bool(new["active"])):
+            self._set_flags(row, old, add=False)
+            self._set_flags(row, new, add=True)
+        if old["barcode"] != new["barcode"]:
+            self._set_barcode(row, old["barcode"], add=False)
+            self._set_barcode(row, new["barcode"], add=True)
+            self.fragments["barcode"].update(row, old["barcode"], new["barcode"])
+        for order, key in zip(self._orders(), old_keys):
+            if order.key_of(row) != key:
+                order.remove(row, key)
+                order.add(row)
+
+    def _tombstone_row(self, row, item):
+        """
+        Drops a removed row from the bitmaps, facets and barcode table, the
+        structures that answer "which rows are live". Its posting list and
+        order entries stay until compact(); the live bitmap keeps it out of
+        every result meanwhile.
+        """
+        self._set_flags(row, item, add=False)
+        self._set_barcode(row, item["barcode"], add=False)
+        self.tombstones.add(row)
+
+    def apply(self, op, rows):
+        """Applies one store change event (see InventoryStore.subscribe)."""
+        with self.lock:
+            if self.stale:
+                return
+            if len(rows) > self.BULK_CHANGE:
+                self.stale = True
+                return
+            if self.snapshot is not None and not isinstance(self.field_norms["name"], array):
+                self._unmap()
+            catalog = self.catalog
+            for sku, item in rows:
+                row = catalog.row_of(sku)
+                if row is None and op == "edit":
+                    # Edited an item this index never saw; start over
+                    self.stale = True
+                    return
+                old = new = None
+                if row is not None:
+                    old = catalog.item_at(row)
+                if op == "remove":
+                    if row is not None:
+                        self._tombstone_row(row, old)
+                        del catalog[sku]
+                elif row is None:
+                    catalog[sku] = item
+                    row = catalog.row_of(sku)
+                    new = catalog.item_at(row)
+                    self._index_row(row, sku, new)
+                else:
+                    old_keys = [order.key_of(row) for order in self._orders()]
+                    catalog[sku] = item
+                    new = catalog.item_at(row)
+                    self._update_row(row, old, new, old_keys)
+                for observer in self.observers:
+                    observer(sku, old, new)
+            self._publish_facets()
+
+    def compact(self, batch=256):
+        """
+        Purges tombstoned rows from the posting lists, trigram lists and
+        orders. Each list holding removed rows is filtered once, however
+        many of them it held, which is far cheaper than taking every row
+        out as it goes. The lock is released every `batch` lists, so
+        searches are never held up for long. Returns the rows purged.
+
+        The catalog keeps the rows themselves (row ids must not move under
+        a live index); the next full rebuild starts from a compact catalog.
+        """
+        with self.lock:
+            dead = list(self.tombstones)
+            if not dead:
+                return 0
+            catalog = self.catalog
+            keys = {field: set() for field in (*TOKEN_FIELDS, *self.fragments)}
+            for row in dead:
+                item = catalog.item_at(row)
+                for field in TOKEN_FIELDS:
+                    keys[field].update(tokenize(item[field]))
+                keys["sku"].update(self.fragments["sku"]._grams(catalog.sku_at(row)))
+                keys["barcode"].update(self.fragments["barcode"]._grams(item["barcode"]))
+        gone = set(dead).__contains__
+        work = [(field, key) for field, field_keys in keys.items() for key in field_keys]
+        for start in range(0, len(work), batch):
+            with self.lock:
+                for field, key in work[start:start + batch]:
+                    table = self.postings[field] if field in TOKEN_FIELDS else self.fragments[field].grams
+                    posting = table.get(key)
+                    if posting is None:
+                        continue
+                    kept = array("I", filterfalse(gone, posting))
+                    if len(kept) == len(posting):
+                        continue
+                    if kept:
+                        table[key] = kept
+                    else:
+                        del table[key]
+                        if field in self._terms:
+                            terms = self._terms[field]
+                            del terms[bisect_left(terms, key)]
+                        if field == "name":
+                            self._word_changed(key, added=False)
+        with self.lock:
+            for order in self._orders():
+                order.rows = array("I", filterfalse(gone, order.rows))
+            self.tombstones = self.tombstones - RowBitmap(dead)
+            self._masks.clear()
+        return len(dead)
+
+    # --- Consistency ---
+
+    def check(self, limit=5):
+        """
+        Compares the index as apply() and compact() left it with a full
+        rebuild over the same items, and returns the differences found
+        (at most `limit` examples per structure); an empty list means the
+        two agree.
+
+        Rows are matched up by position among the live rows, which is how
+        a rebuild numbers them, and tombstoned rows are ignored. Norms and
+        the norm orders legitimately differ from a rebuild (average field
+        lengths are fixed at build time), so those are checked against
+        this index's own averages instead.
+        """
+        with self.lock:
+            catalog = self.catalog
+            live = list(catalog.live_rows())
+            fresh = SearchIndex(Catalog((catalog.sku_at(row), catalog.item_at(row)) for row in live))
+            renumber = dict(zip(live, range(len(live))))
+            problems = []
+
+            def rows_of(rows):
+                return array("I", (renumber[row] for row in rows if row in renumber))
+
+            def compare(name, ours, theirs):
+                keys = {key for key, rows in ours.items() if rows_of(rows)} | set(theirs)
+                wrong = [key for key in sorted(keys)
+                         if rows_of(ours.get(key, ())) != array("I", theirs.get(key, ()))]
+                if wrong:
+                    problems.append(f"{name}: {len(wrong)} keys differ, e.g. {wrong[:limit]}")
+
+            for field in TOKEN_FIELDS:
+                compare(f"postings[{field}]", self.postings[field], fresh.postings[field])
+                if field in self._terms and self._terms[field] != sorted(self.postings[field]):
+                    problems.append(f"{field} words: sorted list out of step with the postings")
+            for field, fragments in self.fragments.items():
+                compare(f"trigrams[{field}]", fragments.grams, fresh.fragments[field].grams)
+            compare("category bitmaps", self.categories, fresh.categories)
+            for name in ("live", "out_of_stock", "inactive"):
+                compare(f"{name} bitmap", {name: getattr(self, name)}, {name: getattr(fresh, name)})
+            if {c: n for c, n in self.facets.items() if any(n)} != {c: n for c, n in fresh.facets.items() if any(n)}:
+                problems.append(f"facets: {self.facets} != {fresh.facets}")
+            for name, order in self.orders.items():
+                compare(f"{name} order", {name: order.rows}, {name: fresh.orders[name].rows})
+
+            shared = Counter(catalog.barcode_at(row) for row in live)
+
+            def resolves(barcode, row):
+                ours = self.barcodes.get(barcode)
+                if renumber.get(ours) == row:
+                    return True
+                # A barcode several items share may resolve to any of them, or to
+                # none once the first is removed; the store answers those
+                return shared[barcode] > 1 and (ours is None or ours in renumber and catalog.barcode_at(ours) == barcode)
+
+            wrong = [barcode for barcode, row in fresh.barcodes.items() if not resolves(barcode, row)]
+            if isinstance(self.barcodes, dict):
+                wrong += [barcode for barcode, row in self.barcodes.items() if barcode not in fresh.barcodes]
+            if wrong:
+                problems.append(f"barcodes: {len(wrong)} resolve wrongly, e.g. {wrong[:limit]}")
+
+            for field, order in self.norm_orders.items():
+                norms = self.field_norms[field]
+                expected = {row: self._norm(field, len(set(tokenize(catalog.item_at(row)[field])))) for row in live}
+                wrong = [catalog.sku_at(row) for row in live if abs(norms[row] - expected[row]) > 1e-5]
+                if wrong:
+                    problems.append(f"norms[{field}]: {len(wrong)} rows differ, e.g. {wrong[:limit]}")
+                ordered = [row for row in order.rows if row in renumber]
+                if ordered != sorted(live, key=lambda row: (norms[row], row)):
+                    problems.append(f"{field} norm order: not sorted by norm")
+            for name, order in {**self.orders, **self.norm_orders}.items():
+                ranks = [order.rank[row] for row in order.rows]
+                if any(a >= b for a, b in zip(ranks, ranks[1:])):
+                    problems.append(f"{name} order: ranks out of step with positions")
+            return problems
+
+    def matches(self, query, sku, item, fuzzy=False):
+        """
+        Whether a single item satisfies the query, evaluated directly on its
+        values. With fuzzy, name words within typo distance also count.
+        """
+        if item is None:
+            return False
+        if query.category != ALL_CATEGORIES and item["category"] != query.category:
+            return False
+        if query.in_stock_only and item["qty"] <= 0:
+            return False
+        if not query.show_inactive and not item["active"]:
+            return False
+
+        fields = SEARCH_BY.get(query.search_by, SEARCH_FIELDS)
+        term = query.term
+        for field in fields:
+            if field in self.fragments:
+                value = normalize(sku if field == "sku" else item["barcode"])
+                if (value.startswith(term) if len(term) < NgramIndex.N else term in value):
+                    return True
+        words = set()
+        for field in fields:
+            if field in TOKEN_FIELDS:
+                words.update(tokenize(item[field]))
+        if not words:
+            return False
+        names = set(tokenize(item["name"])) if fuzzy and "name" in fields else ()
+        for token, prefix in typed_words(term.split()):
+            if token in words or prefix and any(word.startswith(token) for word in words):
+                continue
+            limit = max_typos(token)
+            if not any(levenshtein(token, word, limit) <= limit for word in names):
+                return False
+        return True
+
+    def affects(self, query, result, sku, old, new):
+        """Whether changing sku from old to new (either may be None) can alter this cached result."""
+        fuzzy = "name" in SEARCH_BY.get(query.search_by, SEARCH_FIELDS) and result.exact_count < self.FUZZY_BELOW
+        return self.matches(query, sku, old, fuzzy) or self.matches(query, sku, new, fuzzy)
+
+    # --- Querying ---
+
+    def _sorted_terms(self, field):
+        """Every word of a token field in alphabetical order, built on first use and kept up to date."""
+        terms = self._terms.get(field)
+        if terms is None:
+            terms = self._terms[field] = sorted(self.postings[field])
+        return terms
+
+    def _words(self, field, token, prefix):
+        """The words of field that token stands for: itself, or with prefix every word it starts."""
+        if not prefix:
+            return (token,) if token in self.postings[field] else ()
+        terms = self._sorted_terms(field)
+        start = bisect_left(terms, token)
+        return list(takewhile(lambda word: word.startswith(token), islice(terms, start, start + PREFIX_WORDS)))
+
+    def _token_lists(self, token, prefix, fields):
+        """Posting lists of every word token stands for in any of the fields."""
+        return [self.postings[field][word] for field in fields for word in self._words(field, token, prefix)]
+
+    def _term_rows(self, tokens, fields, within=()):
+        """
+        Rows where every token appears in at least one of the fields, the
+        last one possibly as the start of a word, among the rows `within`
+        if given.
+        """
+        per_token = [[rows] for rows in within]
+        for token, prefix in typed_words(tokens):
+            lists = self._token_lists(token, prefix, fields)
+            if not lists:
+                return []
+            per_token.append(lists)
+        return self._match_all(per_token)
+
+    def _fuzzy_rows(self, tokens, fields, deadline):
+        """
+        Like _term_rows, but each token may also match name words a few
+        typos away. Returns the rows and the (word, distance) pairs used.
+        """
+        names = self.postings["name"]
+        per_token, similar = [], []
+        for token, prefix in typed_words(tokens):
+            lists = self._token_lists(token, prefix, fields)
+            for word, distance in self.vocabulary.similar(token, deadline):
+                if word in names:
+                    lists.append(names[word])
+                    similar.append((word, distance))
+            if not lists:
+                return [], []
+            per_token.append(lists)
+        return self._match_all(per_token), similar
+
+    def _match_all(self, per_token):
+        """Rows in at least one posting list of every group."""
+        # Most selective token first; a common token (a size, "supplier")
+        # is then only probed for the few surviving rows, never unioned
+        per_token.sort(key=lambda lists: sum(map(len, lists)))
+        rows = union(per_token[0])
+        for lists in per_token[1:]:
+            if not rows:
+                break
+            if sum(map(len, lists)) > 8 * len(rows):
+                rows = [row for row in rows if any(contains(posting, row) for posting in lists)]
+            else:
+                rows = intersect([rows, union(lists)])
+        return rows
+
+    def plan(self, query):
+        """Picks the evaluation order for query; see QueryPlan. Called with the lock held."""
+        tokens = query.term.split()
+        fields = SEARCH_BY.get(query.search_by, SEARCH_FIELDS)
+        words = []
+        token_fields = [field for field in fields if field in TOKEN_FIELDS]
+        if token_fields and tokens:
+            words = sorted((sum(map(len, self._token_lists(token, prefix, token_fields))), token)
+                           for token, prefix in typed_words(tokens))
+
+        live = len(self.catalog)
+        codes = {}
+        for field in fields:
+            if field not in self.fragments:
+                continue
+            fragments = self.fragments[field]
+            pattern = fragments.pattern(query.term)
+            if pattern is None:
+                continue
+            text, grams = pattern
+            postings = [(gram, fragments.grams.get(gram)) for gram in grams]
+            if any(posting is None for _, posting in postings):
+                continue        # a trigram nothing has: no matches in this field
+            postings.sort(key=lambda pair: len(pair[1]))
+            kept, skipped = postings[:1], []
+            for gram, posting in postings[1:]:
+                # Worth intersecting only if dropping every row the trigram
+                # lacks could save more checks than the intersection costs
+                if (live - len(posting)) * VERIFY_COST < len(posting) + len(kept[0][1]):
+                    skipped.append(gram)
+                else:
+                    kept.append((gram, posting))
+            # A single trigram is the whole pattern; nothing left to check
+            codes[field] = CodeLookup(text, kept, skipped, len(grams) > 1)
+
+        allowed, mask = self._filter_for(query.category, query.in_stock_only, query.show_inactive)
+        count = None if allowed is None else \
+            self._allowed_count(query.category, query.in_stock_only, query.show_inactive)
+        plan = QueryPlan(query, tokens, fields, words, codes, allowed, count, mask, drive=False)
+        plan.drive = count is not None and count * DRIVE_FROM_FILTER < plan.estimate
+        return plan
+
+    def _match_rows(self, plan, lap=_no_lap):
+        """
+        Token matches on name/supplier plus fragment matches on Product
+        ID/barcode, evaluated as planned and already filtered. Also
+        reports the one token field every match came from, if there is
+        one, and the fragment matches per field for ranking.
+        """
+        mask = None if plan.drive else plan.mask
+        within = [array("I", plan.allowed)] if plan.drive else []
+        if plan.drive:
+            lap("filter", len(within[0]))
+        matches = []
+        if plan.token_fields:
+            rows = self._term_rows(plan.tokens, plan.token_fields, within)
+            lap("lookup", len(rows))
+            if mask is not None and len(rows):
+                rows = list(filter(mask.__getitem__, rows))
+                lap("filter", len(rows))
+            matches.append(rows)
+        present = [field for field in plan.token_fields
+                   if any(self._words(field, token, prefix) for token, prefix in typed_words(plan.tokens))]
+        sole_field = present[0] if len(present) == 1 else None
+        codes = {}
+        for field, code in plan.codes.items():
+            rows = intersect(within + [posting for _, posting in code.postings])
+            lap("lookup", len(rows))
+            if mask is not None and len(rows):
+                # Filtered before the check below, which decodes every row
+                rows = list(filter(mask.__getitem__, rows))
+                lap("filter", len(rows))
+            if code.verify and len(rows):
+                rows = self.fragments[field].verify(rows, code.text)
+                lap("verify", len(rows))
+            if len(rows):
+                matches.append(rows)
+                codes[field] = rows
+                sole_field = None
+        matches = [rows for rows in matches if len(rows)]
+        return (union(matches) if matches else []), sole_field, codes
+
+    def search(self, query, cancelled=None, trace=None):
+        """
+        Runs one query. `cancelled` is polled between stages; when it
+        returns True the search stops early with SearchCancelled. A
+        search_explain.SearchTrace passed as `trace` gets a lap per stage.
+        """
+        def checkpoint():
+            if cancelled is not None and cancelled():
+                raise SearchCancelled()
+
+        lap = trace.lap if trace is not None else _no_lap
+
+        with self.lock:
+            lap("wait")
+            plan = self.plan(query)
+            tokens, fields = plan.tokens, plan.fields
+            if trace is not None:
+                trace.plan = plan.describe()
+            lap("plan")
+            rows, sole_field, codes = self._match_rows(plan, lap)
+            checkpoint()
+            groups = [self._ranked(rows, query, tokens, fields, sole_field, codes)]
+            lap("rank")
+
+            if len(rows) < self.FUZZY_BELOW and "name" in fields and tokens:
+                deadline = time.perf_counter() + self.FUZZY_BUDGET
+                token_fields = [field for field in fields if field in TOKEN_FIELDS]
+                exact = set(rows)
+                fuzzy, similar = self._fuzzy_rows(tokens, token_fields, deadline)
+                fuzzy = [row for row in self._filter(fuzzy, query) if row not in exact]
+                checkpoint()
+                if fuzzy:
+                    groups.append(self._ranked_fuzzy(fuzzy, query, similar))
+                lap("fuzzy", len(fuzzy))
+            return SearchResult(query, self, groups)
+
+    def _filter(self, rows, query):
+        if not len(rows):
+            return rows
+        mask = self._filter_mask(query.category, query.in_stock_only, query.show_inactive)
+        return rows if mask is None else list(filter(mask.__getitem__, rows))
+
+    def _filter_mask(self, category, in_stock_only, show_inactive):
+        """Byte mask of the rows passing the form's filters, or None when nothing is filtered out."""
+        return self._filter_for(category, in_stock_only, show_inactive)[1]
+
+    def _filter_for(self, category, in_stock_only, show_inactive):
+        """(RowBitmap, byte mask) of the rows passing the form's filters, or (None, None)."""
+        key = (category, in_stock_only, show_inactive)
+        if key in self._masks:
+            return self._masks[key]
+        excluded = RowBitmap()
+        if in_stock_only:
+            excluded = excluded | self.out_of_stock
+        if not show_inactive:
+            excluded = excluded | self.inactive
+        if category == ALL_CATEGORIES:
+            # Tombstoned rows are only kept out by the live bitmap
+            allowed = (self.live - excluded) if excluded or self.tombstones else None
+        else:
+            allowed = self.categories.get(category, RowBitmap()) - excluded
+        mask = None if allowed is None else allowed.mask(self.catalog.row_count)
+        self._masks[key] = allowed, mask
+        return allowed, mask
+
+    def find_barcode(self, barcode):
+        """Returns (sku, item) for the item with exactly this barcode, or None. One dict probe."""
+        with self.lock:
+            row = self.barcodes.get(barcode)
+            if row is None or not self.catalog.is_live(row):
+                return None
+            return self.catalog.sku_at(row), self.catalog.item_at(row)
+
+    @staticmethod
+    def _buckets(in_stock_only, show_inactive):
+        """The facet buckets, (in stock) * 2 + (active), that the filters let through."""
+        return [bucket for bucket in range(4)
+                if (bucket & 2 or not in_stock_only) and (bucket & 1 or show_inactive)]
+
+    def facet_counts(self, in_stock_only=True, show_inactive=False):
+        """
+        Live items per category that the stock and inactive filters let
+        through. Read from facet_view without the lock, so the form can
+        show them while a search holds it.
+        """
+        buckets = self._buckets(in_stock_only, show_inactive)
+        return {category: sum(counts[bucket] for bucket in buckets)
+                for category, counts in self.facet_view.items()}
+
+    def _allowed_count(self, category, in_stock_only, show_inactive):
+        """How many live rows pass the filters, from the facet counts alone."""
+        buckets = self._buckets(in_stock_only, show_inactive)
+        facets = self.facets.values() if category == ALL_CATEGORIES else [self.facets.get(category, [0] * 4)]
+        return sum(counts[bucket] for counts in facets for bucket in buckets)
+
+    def _ranked(self, rows, query, tokens, fields, sole_field, codes):
+        order = self.orders.get(query.sort_by)
+        if order is not None:
+            return RankedGroup(rows, order.rank.__getitem__, order)
+        if sole_field is not None:
+            # Every row matched every word in this one field, so the scores
+            # only differ by that field's length norm
+            order = self.norm_orders[sole_field]
+            return RankedGroup(rows, order.rank.__getitem__, order)
+        return RankedGroup(rows, self._scores(rows, query, tokens, fields, codes).__getitem__)
+
+    def _scores(self, rows, query, tokens, fields, codes):
+        """BM25 over the token fields plus a fixed boost for code hits, negated, per row."""
+        scores = dict.fromkeys(rows, 0.0)
+        live = len(self.catalog)
+        for field in fields:
+            if field not in TOKEN_FIELDS:
+                continue
+            weight = FIELD_WEIGHTS[field]
+            norms = self.field_norms[field]
+            for token, prefix in typed_words(tokens):
+                for word in self._words(field, token, prefix):
+                    posting = self.postings[field][word]
+                    idf = weight * math.log(1 + (live - len(posting) + 0.5) / (len(posting) + 0.5))
+                    if len(posting) > 8 * len(rows):
+                        hits = [row for row in rows if contains(posting, row)]
+                    else:
+                        hits = filter(scores.__contains__, posting)
+                    for row in hits:
+                        scores[row] += idf * norms[row]
+
+        term = query.term
+        for field, found in codes.items():
+            hits = list(filter(scores.__contains__, found))
+            if len(hits) > 5000:
+                # Too many to tell exact codes from fragments cheaply
+                boosts = ((row, CODE_FRAGMENT) for row in hits)
+            else:
+                value_of = self.catalog.sku_at if field == "sku" else self.catalog.barcode_at
+                boosts = ((row, CODE_EXACT if value == term else CODE_PREFIX if value.startswith(term)
+                           else CODE_FRAGMENT)
+                          for row, value in ((row, normalize(value_of(row))) for row in hits))
+            for row, boost in boosts:
+                scores[row] -= boost
+        return scores
+
+    def _ranked_fuzzy(self, rows, query, similar):
+        """Typo matches: closest spellings first, shorter names first within a distance."""
+        order = self.orders.get(query.sort_by)
+        if order is not None:
+            return RankedGroup(rows, order.rank.__getitem__, order)
+        names = self.postings["name"]
+        norms = self.field_norms["name"]
+        closeness = {}
+        if sum(len(names[word]) for word, _ in similar) < 20000:
+            for word, distance in sorted(similar, key=lambda pair: pair[1]):
+                for row in names[word]:
+                    closeness.setdefault(row, distance)
+        keys = {row: (closeness.get(row, 0), norms[row]) for row in rows}
+        return RankedGroup(rows, keys.__getitem__)
+
+
+# Changes held in memory on top of the last snapshot before a new one is
+# written in the background
+MERGE_AFTER = 500
+# Journal records to catch up on at startup before rebuilding is quicker
+REPLAY_LIMIT = 20000
+# Seconds after loading a snapshot before the typo vocabulary is built,
+# so the build does not compete with the first searches
+WARM_DELAY = 2.0
+# A warmed search dropped by an inventory change is run again once the
+# changes have paused this long, so a bulk edit costs one rerun, not one each
+REWARM_QUIET = 2.0
+
+_default_index = None
+_default_version = None
+_default_lock = threading.Lock()
+_default_cache = QueryCache()
+_default_warmer = None
+_warmer_lock = threading.Lock()
+_unsaved_changes = 0
+_merging = threading.Lock()
+# (rows indexed, rows in all) while the shared index is being built
+_build_progress = None
+
+
+def _on_store_change(op, rows):
+    global _default_version, _unsaved_changes
+    index = _default_index
+    if index is not None:
+        try:
+            index.apply(op, rows)
+        except Exception:
+            # The store has the change and the index may hold half of it;
+            # the next open_default_index() rebuilds from the store
+            index.stale = True
+            raise
+        _default_version = open_default_store().version
+        _unsaved_changes += len(rows)
+        if _unsaved_changes >= MERGE_AFTER and not index.stale:
+            _start_merge(index)
+
+
+def save_snapshot(index, directory=SNAPSHOT_DIR):
+    """
+    Writes index as the newest snapshot in directory and deletes older
+    ones (a snapshot still mapped elsewhere may refuse; it goes next time).
+    Returns the path written, or None if the journal could not be flushed.
+    """
+    mark = open_default_journal().mark(timeout=10)
+    if mark is None:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, snapshot_name(mark[0]))
+    index.save(path, mark)
+    for old in snapshot_paths(directory):
+        if old != path:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+    return path
+
+
+def _start_merge(index):
+    """
+    Compacts away tombstoned rows and folds the in-memory changes into a
+    new snapshot, on a background thread, one merge at a time.
+    """
+    global _unsaved_changes
+    if not _merging.acquire(blocking=False):
+        return
+    _unsaved_changes = 0
+
+    def merge():
+        try:
+            index.compact()
+            save_snapshot(index)
+        except (OSError, ValueError) as e:
+            log.warning("Search index snapshot not saved: %s", e)
+        finally:
+            _merging.release()
+
+    threading.Thread(target=merge, name="index-merge", daemon=True).start()
+
+
+def _load_snapshot():
+    """
+    Maps the newest snapshot and replays the journal records written
+    since it was saved. Returns the index and the number of records
+    replayed, or (None, 0) when there is no usable snapshot.
+    """
+    paths = snapshot_paths()
+    if not paths:
+        return None, 0
+    try:
+        index = SearchIndex.load(paths[0])
+    except (OSError, ValueError, KeyError) as e:
+        log.warning("Search index snapshot %s not used: %s", paths[0], e)
+        return None, 0
+    seq, *position = index.snapshot.meta["journal"]
+    records = []
+    for record in read_records(JOURNAL_DIR, seq, (seq, *position)):
+        records.append(record)
+        if len(records) > REPLAY_LIMIT:
+            return None, 0
+    for record in records:
+        index.apply(OP_NAMES[record.op], [(record.sku, record.new)])
+    return (None, 0) if index.stale else (index, len(records))
+
+
+def _verify(index, store):
+    """
+    Compares the loaded index's item count with the store's, off the UI
+    path. A database changed behind the journal's back makes the index
+    stale, so the next open_default_index() rebuilds it.
+    """
+    count = len(store)
+    with index.lock:
+        if len(index.catalog) != count:
+            index.stale = True
+
+
+def open_default_index():
+    """
+    Returns a SearchIndex over the shared store. Edits made through the
+    store are applied to it as they commit; it is only rebuilt after a bulk
+    change or when another process has written to the database.
+
+    The first call in a process maps the last saved snapshot instead of
+    building, and catches up on the journal from where the snapshot was
+    taken, so the first search runs within milliseconds of launch. Every
+    rebuild, and every MERGE_AFTER changes, saves a new snapshot in the
+    background. A rebuild of a large catalog is spread over a process
+    pool (SearchIndex.build); index_build_progress() follows it.
+    """
+    global _default_index, _default_version, _unsaved_changes
+    store = open_default_store()
+    with _default_lock:
+        version = store.version
+        if _default_index is None:
+            store.subscribe(_on_store_change)
+            index, replayed = _load_snapshot()
+            if index is not None:
+                _default_index = index
+                _default_version = version
+                _unsaved_changes = replayed
+                threading.Thread(target=_verify, args=(index, store), name="index-verify", daemon=True).start()
+                warm = threading.Timer(WARM_DELAY, index.warm_vocabulary)
+                warm.daemon = True
+                warm.start()
+                if replayed >= MERGE_AFTER:
+                    _start_merge(index)
+                return index
+        if _default_index is None or _default_index.stale or version != _default_version:
+            _report_build(0, 1)
+            try:
+                _default_index = SearchIndex.from_store(store, progress=_report_build)
+            finally:
+                _report_build(None, None)
+            _default_version = version
+            _start_merge(_default_index)
+        return _default_index
+
+
+def _report_build(done, total):
+    global _build_progress
+    _build_progress = None if done is None else (done, total)
+
+
+def index_build_progress():
+    """The share of rows the shared index build has indexed so far, or None when no build is running."""
+    progress = _build_progress
+    return None if progress is None else progress[0] / max(progress[1], 1)
+
+
+def default_facet_counts(in_stock_only=True, show_inactive=False):
+    """Per-category counts from the shared index, or None until it has been built."""
+    index = _default_index
+    if index is None or index.stale:
+        return None
+    return index.facet_counts(in_stock_only, show_inactive)
+
+
+def find_barcode(barcode):
+    """
+    Resolves a scanned barcode to (sku, item), or None. Uses the shared
+    index's hash table when it is built and current, and otherwise the
+    store's barcode index, so a scan never waits for an index build.
+    """
+    barcode = barcode.strip()
+    if not barcode:
+        return None
+    index = _default_index
+    if index is not None and not index.stale:
+        found = index.find_barcode(barcode)
+        if found is not None:
+            return found
+    # Not built yet, or a barcode shared by two items whose first entry was removed
+    return open_default_store().find_barcode(barcode)
+
+
+def open_default_cache():
+    """The result cache in front of the shared index; its stats() size the cache."""
+    return _default_cache
+
+
+def cached_search(query, cancelled=None, trace=None):
+    """Searches the shared index through the shared result cache."""
+    return _default_cache.search(open_default_index(), query, cancelled, trace)
+
+
+class SearchWorker:
+    """
+    Runs searches on a background thread so typing never waits on the index.
+
+    submit() replaces whatever query is pending and bumps a generation
+    counter; the worker always takes the newest query, and a search that
+    is overtaken while running is abandoned at its next checkpoint. The
+    first `page_size` results are paged here too, and more() pages on
+    from a cursor, so the caller never takes the index lock. Only
+    messages for the current generation are posted to `messages`:
+
+        ("results", generation, SearchResult, (entries, cursor))
+        ("page", generation, SearchResult, (entries, cursor))
+        ("error", generation, message)
+
+    A trace passed to submit() is handed on to the search, with the time
+    the query sat waiting for the worker charged to its "queue" stage.
+    """
+    def __init__(self, messages, search=cached_search, page_size=50):
+        self.messages = messages
+        self.search = search
+        self.page_size = page_size
+        self.generation = 0
+        self._pending = None
+        self._more = None
+        self._wakeup = threading.Condition()
+        self.thread = threading.Thread(target=self._run, name="search-worker", daemon=True)
+        self.thread.start()
+
+    def submit(self, query, trace=None):
+        with self._wakeup:
+            self.generation += 1
+            self._pending = (self.generation, query, trace)
+            self._wakeup.notify()
+            return self.generation
+
+    def more(self, result, cursor):
+        """Asks for the page of result after cursor, posted as a "page" message."""
+        with self._wakeup:
+            self._more = (self.generation, result, cursor)
+            self._wakeup.notify()
+
+    def cancel(self):
+        """Drops the pending query and makes any running one stale."""
+        with self._wakeup:
+            self.generation += 1
+            self._pending = None
+            self._more = None
+
+    def _run(self):
+        while True:
+            with self._wakeup:
+                while self._pending is None and self._more is None:
+                    self._wakeup.wait()
+                pending, more = self._pending, self._more
+                self._pending = self._more = None
+            # A newer query outdates any page asked for before it
+            if pending is not None:
+                self._search(*pending)
+            else:
+                self._page(*more)
+
+    def _search(self, generation, query, trace):
+        if trace is not None:
+            trace.lap("queue")
+
+        def stale():
+            return generation != self.generation
+
+        try:
+            result = self.search(query, cancelled=stale, trace=trace)
+            page = result.page(self.page_size)
+        except SearchCancelled:
+            return
+        except Exception as e:
+            self.messages.put(("error", generation, str(e)))
+            return
+        if trace is not None:
+            trace.lap("page", len(page[0]))
+        if not stale():
+            self.messages.put(("results", generation, result, page))
+
+    def _page(self, generation, result, cursor):
+        try:
+            page = result.page(self.page_size, cursor)
+        except Exception as e:
+            self.messages.put(("error", generation, str(e)))
+            return
+        if generation == self.generation:
+            self.messages.put(("page", generation, result, page))
+
+
+class SearchWarmer:
+    """
+    Keeps a short list of searches precomputed in the shared result cache,
+    so picking one of them is a cache hit.
+
+    warm() pins the queries in the cache and runs any that are not cached
+    on a background thread. A pinned result does not expire, but an
+    inventory change that affects it still drops it from the cache; the
+    warmer then runs it again once the changes pause for REWARM_QUIET
+    seconds. A rebuilt index drops, and so reruns, them all.
+    """
+    def __init__(self, cache=None, open_index=None, quiet=REWARM_QUIET):
+        self.cache = cache or _default_cache
+        self.open_index = open_index or open_default_index
+        self.quiet = quiet
+        self.queries = ()
+        self._todo = []
+        self._due = 0.0
+        self._wakeup = threading.Condition()
+        self.cache.observers.append(self._on_dropped)
+        self.thread = threading.Thread(target=self._run, name="search-warmer", daemon=True)
+        self.thread.start()
+
+    def warm(self, queries):
+        """Replaces the warmed queries with `queries`, most wanted first."""
+        queries = tuple(dict.fromkeys(queries))
+        self.cache.pin(queries)
+        with self._wakeup:
+            self.queries = queries
+            self._todo = list(queries)
+            self._due = time.monotonic()
+            self._wakeup.notify()
+
+    def _on_dropped(self, queries):
+        with self._wakeup:
+            self._todo.extend(query for query in queries if query not in self._todo)
+            self._due = time.monotonic() + self.quiet
+            self._wakeup.notify()
+
+    def _run(self):
+        while True:
+            with self._wakeup:
+                while not self._todo or time.monotonic() < self._due:
+                    self._wakeup.wait(max(self._due - time.monotonic(), 0) if self._todo else None)
+                todo, self._todo = self._todo, []
+                wanted = self.queries
+            for query in todo:
+                if query not in wanted:
+                    continue
+                try:
+                    self.cache.warm(self.open_index(), query)
+                except Exception:
+                    log.exception("Search for %r not warmed", query.term)
+
+
+def default_warmer():
+    """The warmer for the shared result cache, started on first use."""
+    global _default_warmer
+    with _warmer_lock:     # not _default_lock, which is held through an index build
+        if _default_warmer is None:
+            _default_warmer = SearchWarmer()
+        return _default_warmer
+
+
+# --- Benchmark ---
+
+NAME_WORDS = (
+    "hammer", "claw", "sledge", "screwdriver", "set", "wood", "screws", "box", "drill", "bit",
+    "pvc", "pipe", "elbow", "tee", "valve", "faucet", "wire", "cable", "switch", "outlet",
+    "bulb", "led", "paint", "primer", "brush", "roller", "tape", "measure", "level", "wrench",
+    "socket", "plier", "saw", "blade", "nail", "bolt", "nut", "washer", "hinge", "lock",
+)
+SIZES = ("1/2in", "3/4in", "1in", "2in", "16oz", "8lb", "10m", "25m", "small", "large")
+CATEGORIES = ("Hardware", "Electrical", "Plumbing", "Paint", "Tools")
+
+
+def synthetic_catalog(count):
+    """Builds a Catalog of `count` plausible hardware-store items."""
+    def items():
+        for i in range(count):
+            yield f"SKU{i:08d}", {
+                "name": (f"{NAME_WORDS[i % 40].title()} {NAME_WORDS[(i // 40) % 40].title()} "
+                         f"{SIZES[(i // 1600) % 10]} model {i % 9973}"),
+                "qty": 0 if i % 29 == 0 else i % 500 + 1,
+                "price": 1.0 + (i * 7919 % 100000) / 100,
+                "desc": "",
+                "category": CATEGORIES[(i // 3) % 5],
+                "barcode": f"480{i * 7 % 10**10:010d}",
+                "supplier": f"Supplier {i % 250}",
+                "active": 0 if i % 53 == 0 else 1,
+            }
+    return Catalog(items())
+
+
+def benchmark(count=500_000, repeat=200):
+    """
+    Times typical counter queries, through to their first page of 50,
+    against a synthetic catalog of `count` items.
+    """
+    import random
+    import time
+
+    start = time.perf_counter()
+    index = SearchIndex(synthetic_catalog(count))
+    print(f"built index over {count:,} items in {time.perf_counter() - start:.1f} s")
+
+    rng = random.Random(7)
+    cases = {
+        "name, 1 word": lambda: make_query(rng.choice(NAME_WORDS), "Product Name"),
+        "name, 2 words": lambda: make_query(f"{rng.choice(NAME_WORDS)} {rng.choice(NAME_WORDS)}", "Product Name"),
+        "name + category": lambda: make_query(f"{rng.choice(NAME_WORDS)} {rng.choice(NAME_WORDS)}", "Product Name",
+                                              rng.choice(CATEGORIES)),
+        "any, 3 words": lambda: make_query(f"{rng.choice(NAME_WORDS)} {rng.choice(NAME_WORDS)} {rng.choice(SIZES)}"),
+        "product id": lambda: make_query(f"SKU{rng.randrange(count):08d}", "Product ID"),
+        "barcode": lambda: make_query(f"480{rng.randrange(count) * 7 % 10**10:010d}", "Barcode"),
+        "id fragment": lambda: make_query(f"{rng.randrange(count):08d}"[-5:], "Product ID"),
+        "barcode last 6": lambda: make_query(f"{rng.randrange(count) * 7 % 10**10:010d}"[-6:], "Barcode"),
+        "barcode start + cat": lambda: make_query(f"480{rng.randrange(count) * 7 % 10**10:010d}"[:8], "Barcode",
+                                                  rng.choice(CATEGORIES)),
+        "supplier + category": lambda: make_query(f"supplier {rng.randrange(250)}", "Supplier",
+                                                  rng.choice(CATEGORIES), show_inactive=True),
+        "1 word, by price": lambda: make_query(rng.choice(NAME_WORDS), "Product Name", sort_by="Price"),
+        "size, name a-z": lambda: make_query(rng.choice(SIZES), sort_by="Name"),
+        "supplier, relevance": lambda: make_query("supplier"),
+        "supplier, by price": lambda: make_query("supplier", "Supplier", sort_by="Price"),
+    }
+    for label, make in cases.items():
+        timings, hits = [], 0
+        for _ in range(repeat):
+            query = make()
+            start = time.perf_counter()
+            result = index.search(query)
+            result.page(50)
+            hits += len(result)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        print(f"{label:>20}: p50 {timings[len(timings) // 2]:6.2f} ms  "
+              f"p99 {timings[int(len(timings) * 0.99)]:6.2f} ms  ({hits / repeat:,.1f} hits avg)")
+
+    # Cold start: map a saved snapshot and run one query, as a fresh launch does
+    import tempfile
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, snapshot_name(0))
+        start = time.perf_counter()
+        index.save(path, (0, None, 0))
+        print(f"saved snapshot of {os.path.getsize(path) / 2**20:.1f} MB in {time.perf_counter() - start:.2f} s")
+        start = time.perf_counter()
+        loaded = SearchIndex.load(path)
+        loaded.search(make_query(rng.choice(NAME_WORDS))).page(50)
+        print(f"{'cold start':>20}: {(time.perf_counter() - start) * 1000:6.2f} ms to load and run the first query")
+        del loaded
+
+
+def build_benchmark(count=1_000_000, workers=(1, 2, 4, 8, 16)):
+    """
+    Times SearchIndex.build over a synthetic catalog of `count` items at
+    each worker count up to the CPUs available, with the speedup and efficiency against one
+    process, and checks each parallel build matches the serial one.
+    """
+    import time
+
+    catalog = synthetic_catalog(count)
+    cpus = _usable_cpus()
+    print(f"{count:,} items, {cpus} cpus")
+    serial = serial_time = None
+    # build() caps its pool at the CPU count, so larger counts would only repeat the largest
+    for n in [n for n in workers if n <= cpus] or [1]:
+        start = time.perf_counter()
+        index = SearchIndex.build(catalog, workers=n)
+        elapsed = time.perf_counter() - start
+        if serial is None:
+            serial, serial_time = index, elapsed
+            same = ""
+        else:
+            same = "" if _same_structures(index, serial) else "  DIFFERS from the serial build"
+            del index
+        print(f"{n:>3} workers: {elapsed:6.2f} s  speedup {serial_time / elapsed:5.2f}  "
+              f"efficiency {serial_time / elapsed / n:4.0%}{same}")
+
+
+def _same_structures(index, other):
+    return (index.postings == other.postings and index.barcodes == other.barcodes and index.facets == other.facets
+            and all(index.fragments[field].grams == other.fragments[field].grams for field in other.fragments)
+            and all(index.orders[key].rows == other.orders[key].rows for key in other.orders)
+            and all(index.norm_orders[key].rows == other.norm_orders[key].rows for key in other.norm_orders)
+            and all(list(getattr(index, name)) == list(getattr(other, name))
+                    for name in ("live", "out_of_stock", "inactive")))
+
+
+def consistency_check(count=50_000, changes=2000, seed=11):
+    """
+    Applies a random mix of adds, edits and removes to an index over a
+    synthetic catalog, then compares it with a full rebuild with check(),
+    before and after compact().
+    """
+    import random
+    import time
+
+    rng = random.Random(seed)
+    index = SearchIndex(synthetic_catalog(count))
+    # A prefix search first, so the sorted word lists are kept up to date too
+    index.search(make_query("ha"))
+    skus = [f"SKU{i:08d}" for i in range(count)]
+    start = time.perf_counter()
+    for i in range(changes):
+        roll = rng.random()
+        if roll < 0.25:
+            sku = skus.pop(rng.randrange(len(skus)))
+            index.apply("remove", [(sku, None)])
+        elif roll < 0.5:
+            sku = f"NEW{i:08d}"
+            skus.append(sku)
+            index.apply("add", [(sku, {"name": f"{rng.choice(NAME_WORDS).title()} {rng.choice(SIZES)} new",
+                                       "qty": rng.randrange(3), "price": rng.randrange(1, 5000) / 4,
+                                       "category": rng.choice(CATEGORIES), "barcode": f"481{i:010d}",
+                                       "supplier": f"Supplier {rng.randrange(250)}", "active": 1})])
+        else:
+            change = rng.choice(({"qty": rng.randrange(3)}, {"price": rng.randrange(1, 5000) / 4},
+                                 {"name": f"{rng.choice(NAME_WORDS).title()} {rng.choice(NAME_WORDS)} edited"},
+                                 {"category": rng.choice(CATEGORIES), "active": rng.randrange(2)},
+                                 {"barcode": f"482{i:010d}"}, {"supplier": f"Supplier {rng.randrange(250)}"}))
+            index.apply(rng.choice(("edit", "upsert")), [(rng.choice(skus), change)])
+    print(f"applied {changes:,} changes in {time.perf_counter() - start:.2f} s "
+          f"({len(index.tombstones):,} tombstones)")
+
+    for stage in ("incremental", "compacted"):
+        if stage == "compacted":
+            start = time.perf_counter()
+            purged = index.compact()
+            print(f"compacted {purged:,} rows in {time.perf_counter() - start:.2f} s")
+        problems = index.check()
+        print(f"{stage}: " + ("consistent with a full rebuild" if not problems else f"{len(problems)} problems"))
+        for problem in problems:
+            print(f"  {problem}")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["check"]:
+        consistency_check(int(sys.argv[2]) if len(sys.argv) > 2 else 50_000)
+    elif sys.argv[1:2] == ["build"]:
+        build_benchmark(*(int(arg) for arg in sys.argv[2:3]))
+    else:
+        benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 500_000)
@@ -0,0 +1,164 @@
+import json
+import math
+import os
+import sys
+import threading
+import time
+
+
+# Set to 1 to open the search screen with explain mode already on
+EXPLAIN_ENV = "JBSON_EXPLAIN"
+DEFAULT_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "search_explain.jsonl")
+
+# In the order a search passes through them:
+#   tokenize  the form normalises its fields into a SearchQuery
+#   queue     the query waits for the search worker to pick it up
+#   cache     result cache lookup (the search ends here on a hit)
+#   wait      waiting for the index lock, held while a store change is applied
+#   plan      picking the evaluation order from cardinality statistics
+#   lookup    posting lists and code trigrams -> candidate rows
+#   filter    category, stock and inactive filters
+#   verify    decoding Product IDs / barcodes to check fragment candidates
+#   rank      relevance scores, or the sort order's keys
+#   fuzzy     typo matches, only run when there are few exact ones
+#   page      the first page is sorted out of the result and decoded, still on the worker
+#   deliver   the result waits for the form to poll for it
+#   render    the page is written into the results pane and drawn
+STAGES = ("tokenize", "queue", "cache", "wait", "plan", "lookup", "filter", "verify", "rank", "fuzzy", "page",
+          "deliver", "render")
+PERCENTILES = (50, 95, 99)
+
+
+def explain_enabled():
+    return os.environ.get(EXPLAIN_ENV, "") not in ("", "0")
+
+
+class SearchTrace:
+    """
+    Where the time of one search went, from the form to the screen.
+
+    The trace is handed from the form to the search worker and back, and
+    each step calls lap(stage) when it finishes: the time since the
+    previous lap is charged to that stage, so the stages add up to the
+    whole wait. A lap may also record how many candidate rows were left;
+    a stage passed more than once (one lookup per field) adds them up.
+    """
+    def __init__(self):
+        self.started = time.time()
+        self._start = self._last = time.perf_counter()
+        self.query = None
+        self.cache = None       # "hit" or "miss" once the cache was asked
+        self.plan = None        # the index's description of its query plan
+        self.stages = {}        # stage -> ms
+        self.counts = {}        # stage -> rows
+        self.results = None
+        self.total_ms = None
+
+    def lap(self, stage, rows=None):
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + (now - self._last) * 1000
+        self._last = now
+        if rows is not None:
+            self.counts[stage] = self.counts.get(stage, 0) + rows
+
+    def finish(self, results):
+        self.results = results
+        self.total_ms = (time.perf_counter() - self._start) * 1000
+
+    def record(self):
+        """The trace as one JSON-able log record."""
+        return {
+            "time": round(self.started, 3),
+            "query": self.query._asdict() if self.query is not None else None,
+            "cache": self.cache,
+            "plan": self.plan,
+            "stages": {stage: round(ms, 3) for stage, ms in self.stages.items()},
+            "counts": self.counts,
+            "results": self.results,
+            "total_ms": round(self.total_ms, 3) if self.total_ms is not None else None,
+        }
+
+    def format(self):
+        """A few lines for the debug pane."""
+        term = self.query.term if self.query is not None else ""
+        cache = f"cache {self.cache}" if self.cache else "not cached"
+        lines = [f"'{term}': {self.total_ms or 0:.1f} ms, {self.results or 0:,} results, {cache}"]
+        for stage in STAGES:
+            if stage in self.stages:
+                rows = f"{self.counts[stage]:>10,} rows" if stage in self.counts else ""
+                lines.append(f"  {stage:<9}{self.stages[stage]:9.2f} ms{rows}")
+        if self.plan:
+            lines.append(self.plan)
+        return "\n".join(lines)
+
+
+class ExplainLog:
+    """
+    Appends finished traces to a JSON Lines file, one record per search,
+    for summarize() or any other tool to aggregate later.
+    """
+    def __init__(self, path=DEFAULT_LOG):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def append(self, trace):
+        line = json.dumps(trace.record(), separators=(",", ":")) + "\n"
+        with self.lock, open(self.path, "a", encoding="utf-8") as log:
+            log.write(line)
+
+
+def read_log(path=DEFAULT_LOG):
+    """Records in the log, skipping a line cut short by a crash."""
+    with open(path, encoding="utf-8") as log:
+        for line in log:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of sorted values."""
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def summarize(records):
+    """
+    Per stage, and for the whole search: how many searches went through
+    it and its p50/p95/p99/max in ms. Also counts cache hits and misses.
+    """
+    timings = {stage: [] for stage in (*STAGES, "total")}
+    cache = {"hit": 0, "miss": 0}
+    for record in records:
+        for stage, ms in record["stages"].items():
+            timings.setdefault(stage, []).append(ms)
+        if record.get("total_ms") is not None:
+            timings["total"].append(record["total_ms"])
+        if record.get("cache") in cache:
+            cache[record["cache"]] += 1
+
+    summary = {}
+    for stage, values in timings.items():
+        if values:
+            values.sort()
+            summary[stage] = {"count": len(values), **{f"p{p}": percentile(values, p) for p in PERCENTILES},
+                              "max": values[-1]}
+    return summary, cache
+
+
+def main(path=DEFAULT_LOG):
+    summary, cache = summarize(read_log(path))
+    if not summary:
+        print(f"no searches logged in {path}")
+        return
+    print(f"{'stage':>9} {'count':>7} " + " ".join(f"{f'p{p}':>9}" for p in PERCENTILES) + f" {'max':>9}")
+    for stage, row in summary.items():
+        print(f"{stage:>9} {row['count']:>7,} " + " ".join(f"{row[f'p{p}']:9.2f}" for p in PERCENTILES)
+              + f" {row['max']:9.2f}")
+    lookups = cache["hit"] + cache["miss"]
+    if lookups:
+        print(f"cache hits: {cache['hit']:,} of {lookups:,} ({cache['hit'] / lookups:.0%})")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_LOG)
@@ -1,23 +1,40 @@
+import queue
 import tkinter as tk
 import ttkbootstrap as ttk
-import subprocess
-import sys
-from tkinter import messagebox
-
-class ProductSearchApp(ttk.Window):
+from tkinter import messagebox, simpledialog
+import screen_router
+from barcode_scanner import ScannerInput
+from search_engine import (ALL_CATEGORIES, SearchWorker, default_facet_counts, find_barcode, index_build_progress,
+                           make_query)
+from search_explain import ExplainLog, SearchTrace, explain_enabled
+from search_history import open_history
+
+# Pause after the last keystroke before a search is started
+SEARCH_DELAY_MS = 150
+# Results are shown, and fetched, this many at a time
+PAGE_SIZE = 50
+# The results pane is laid out in fixed blocks of lines, so each entry can
+# be found and rewritten in place: a header, then one block per product
+HEADER_LINES = 4
+ENTRY_LINES = 5
+# Scans kept in the results pane while in scanner mode
+SCAN_LOG_LINES = 200
+# Hidden toggle for explain mode, which times every search in a debug pane
+EXPLAIN_KEY = "<Control-E>"     # Ctrl+Shift+E
+# A search whose results stay on screen this long goes into the recent searches
+RECORD_AFTER_MS = 3000
+
+class ProductSearchApp(ttk.Frame):
     """
-    Main application window for the Product Search Form.
+    Product Search Form screen, hosted by the ScreenRouter window.
     """
-    def __init__(self):
-        # Same theme as the login page
-        super().__init__(themename="litera")
-
-        # --- Window Configuration ---
-        self.title("JBSON Hardware - Product Search")
-        self.geometry("600x750") # Adjusted size
-        self.resizable(False, False)
-        
-        self.center_window()
+    # --- Window Configuration (applied by the router) ---
+    window_title = "JBSON Hardware - Product Search"
+    window_geometry = "600x840" # Adjusted size
+
+    def __init__(self, master=None, router=None):
+        super().__init__(master)
+        self.router = router
 
         # --- Main Frame ---
         main_frame = ttk.Frame(self, padding="20 20 20 20")
@@ -50,9 +67,36 @@ class ProductSearchApp(ttk.Window):
                 widget.insert(0, widget.placeholder)
                 widget.config(foreground='grey')
 
+        # Saved & Recent Searches (Dropdown): picks up a whole form state at
+        # once. The top entries are kept warm in the background from login
+        # on, so picking one shows its results straight from the cache.
+        history_label = ttk.Label(main_frame, text="Saved/Recent:")
+        history_label.grid(row=1, column=0, sticky="e", padx=(0, 10), pady=5)
+
+        history_frame = ttk.Frame(main_frame)
+        history_frame.grid(row=1, column=1, sticky="we")
+        history_frame.columnconfigure(0, weight=1)
+
+        self.history_var = tk.StringVar()
+        self.history_combo = ttk.Combobox(history_frame, textvariable=self.history_var, state="readonly")
+        self.history_combo.grid(row=0, column=0, sticky="we", padx=5, pady=5)
+        self.history_combo.bind("<<ComboboxSelected>>", self.pick_history)
+
+        self.save_button = ttk.Button(
+            history_frame,
+            text="Save",
+            command=self.toggle_saved,
+            bootstyle="secondary-outline",
+            width=7
+        )
+        self.save_button.grid(row=0, column=1, padx=(5, 0))
+        self.history = None
+        self.history_entries = []
+        self.pending_record = None
+
         # 1. Search Term (Textbox - The "Search Bar")
         search_label = ttk.Label(main_frame, text="Search Term:")
-        search_label.grid(row=1, column=0, sticky="e", padx=(0, 10), pady=10)
+        search_label.grid(row=2, column=0, sticky="e", padx=(0, 10), pady=10)
         
         self.search_var = tk.StringVar()
         self.search_entry = ttk.Entry(main_frame, textvariable=self.search_var, width=40, font=("Helvetica", 12))
@@ -62,11 +106,11 @@ class ProductSearchApp(ttk.Window):
         self.search_entry.config(foreground='grey')
         self.search_entry.bind("<FocusIn>", on_focus_in)
         self.search_entry.bind("<FocusOut>", on_focus_out)
-        self.search_entry.grid(row=1, column=1, sticky="we", padx=5, pady=10)
+        self.search_entry.grid(row=2, column=1, sticky="we", padx=5, pady=10)
 
         # 2. Search By (Dropdown)
         search_by_label = ttk.Label(main_frame, text="Search By:")
-        search_by_label.grid(row=2, column=0, sticky="e", padx=(0, 10), pady=5)
+        search_by_label.grid(row=3, column=0, sticky="e", padx=(0, 10), pady=5)
         
         self.search_by_var = tk.StringVar()
         search_by_combo = ttk.Combobox(
@@ -76,25 +120,33 @@ class ProductSearchApp(ttk.Window):
             state="readonly"
         )
         search_by_combo.current(0)
-        search_by_combo.grid(row=2, column=1, sticky="we", padx=5, pady=5)
+        search_by_combo.grid(row=3, column=1, sticky="we", padx=5, pady=5)
 
         # 3. Product Category (Dropdown)
         category_label = ttk.Label(main_frame, text="Category:")
-        category_label.grid(row=3, column=0, sticky="e", padx=(0, 10), pady=5)
+        category_label.grid(row=4, column=0, sticky="e", padx=(0, 10), pady=5)
         
+        category_frame = ttk.Frame(main_frame)
+        category_frame.grid(row=4, column=1, sticky="we")
+        category_frame.columnconfigure(0, weight=1)
+
         self.category_var = tk.StringVar()
         category_combo = ttk.Combobox(
-            main_frame, 
+            category_frame, 
             textvariable=self.category_var, 
             values=["All Categories", "Hardware", "Electrical", "Plumbing", "Paint", "Tools"],
             state="readonly"
         )
         category_combo.current(0)
-        category_combo.grid(row=3, column=1, sticky="we", padx=5, pady=5)
+        category_combo.grid(row=0, column=0, sticky="we", padx=5, pady=5)
+
+        # Live item count for the selected category under the current filters
+        self.facet_label = ttk.Label(category_frame, text="", foreground="grey")
+        self.facet_label.grid(row=0, column=1, sticky="e", padx=(5, 0))
 
         # 4. 'In Stock Only' (Checkbox)
         stock_label = ttk.Label(main_frame, text="Filters:")
-        stock_label.grid(row=4, column=0, sticky="e", padx=(0, 10), pady=5)
+        stock_label.grid(row=5, column=0, sticky="e", padx=(0, 10), pady=5)
         
         self.in_stock_var = tk.BooleanVar(value=True)
         in_stock_check = ttk.Checkbutton(
@@ -103,7 +155,7 @@ class ProductSearchApp(ttk.Window):
             variable=self.in_stock_var,
             bootstyle="primary"
         )
-        in_stock_check.grid(row=4, column=1, sticky="w", padx=5, pady=5)
+        in_stock_check.grid(row=5, column=1, sticky="w", padx=5, pady=5)
 
         # 5. 'Show Inactive' (Switch/Toggle)
         self.inactive_var = tk.BooleanVar(value=False)
@@ -113,16 +165,16 @@ class ProductSearchApp(ttk.Window):
             variable=self.inactive_var,
             bootstyle="primary-round-toggle" # This makes it a switch
         )
-        inactive_switch.grid(row=5, column=1, sticky="w", padx=5, pady=5)
+        inactive_switch.grid(row=6, column=1, sticky="w", padx=5, pady=5)
 
         # 6. Sort By (Radio Buttons)
         sort_label = ttk.Label(main_frame, text="Sort By:")
-        sort_label.grid(row=6, column=0, sticky="e", padx=(0, 10), pady=5)
+        sort_label.grid(row=7, column=0, sticky="e", padx=(0, 10), pady=5)
         
         self.sort_var = tk.StringVar(value="Relevance")
         
         sort_frame = ttk.Frame(main_frame)
-        sort_frame.grid(row=6, column=1, sticky="w")
+        sort_frame.grid(row=7, column=1, sticky="w")
 
         sort_radio1 = ttk.Radiobutton(sort_frame, text="Relevance", variable=self.sort_var, value="Relevance", bootstyle="primary")
         sort_radio1.pack(side="left", padx=5)
@@ -144,11 +196,11 @@ class ProductSearchApp(ttk.Window):
             bootstyle="danger", 
             font=("Helvetica", 9)
         )
-        self.error_label.grid(row=7, column=0, columnspan=2, pady=(10, 0))
+        self.error_label.grid(row=8, column=0, columnspan=2, pady=(10, 0))
 
         # --- Button Frame (8, 9, 10. Buttons) ---
         button_frame = ttk.Frame(main_frame)
-        button_frame.grid(row=8, column=0, columnspan=2, pady=15)
+        button_frame.grid(row=9, column=0, columnspan=2, pady=15)
 
         submit_button = ttk.Button(
             button_frame, 
@@ -177,33 +229,95 @@ class ProductSearchApp(ttk.Window):
 
         # --- Separator ---
         results_sep = ttk.Separator(main_frame, bootstyle="primary")
-        results_sep.grid(row=9, column=0, columnspan=2, sticky="ew", pady=10)
+        results_sep.grid(row=10, column=0, columnspan=2, sticky="ew", pady=10)
 
         # --- Results Area ---
         results_label = ttk.Label(main_frame, text="Search Results:", font=("Helvetica", 12, "bold"))
-        results_label.grid(row=10, column=0, columnspan=2, sticky="w", pady=5)
+        results_label.grid(row=11, column=0, columnspan=2, sticky="w", pady=5)
+
+        # Scanner mode: barcodes from a keyboard-wedge scanner are looked up
+        # directly and logged in the results pane instead of being typed
+        self.scan_var = tk.BooleanVar(value=False)
+        scan_switch = ttk.Checkbutton(
+            main_frame,
+            text="Scanner Mode",
+            variable=self.scan_var,
+            command=self.toggle_scan_mode,
+            bootstyle="info-round-toggle"
+        )
+        scan_switch.grid(row=11, column=1, sticky="e", padx=5)
         
         # 11. Results Display (Textarea)
+        results_frame = ttk.Frame(main_frame)
+        results_frame.grid(row=12, column=0, columnspan=2, sticky="ew", padx=5, pady=5)
+        results_frame.columnconfigure(0, weight=1)
+
         self.results_text = tk.Text(
-            main_frame, 
+            results_frame, 
             height=10, 
             width=40, 
             font=("Helvetica", 10),
-            wrap="word" # Wrap text
+            wrap="word", # Wrap text
+            yscrollcommand=self.on_results_scrolled
         )
-        self.results_text.grid(row=11, column=0, columnspan=2, sticky="ew", padx=5, pady=5)
+        self.results_text.grid(row=0, column=0, sticky="ew")
         # Start in a "disabled" state so user can't type
         self.results_text.config(state="disabled", foreground="black")
 
+        self.results_scrollbar = ttk.Scrollbar(results_frame, orient="vertical", command=self.results_text.yview)
+        self.results_scrollbar.grid(row=0, column=1, sticky="ns")
+
+        # 12. Next page of results (also fetched by scrolling to the bottom)
+        self.load_more_button = ttk.Button(
+            main_frame,
+            text="Load more",
+            command=self.load_more,
+            bootstyle="secondary-outline",
+            state="disabled"
+        )
+        self.load_more_button.grid(row=13, column=0, columnspan=2, pady=(0, 5))
+
+        # 13. Explain mode's debug pane: where the last search spent its time.
+        # Hidden unless explain mode is on; every explained search is also
+        # appended to the explain log for search_explain.py to summarise.
+        self.explain_text = tk.Text(
+            main_frame,
+            height=18,
+            width=40,
+            font=("Courier", 9),
+            wrap="none",
+            state="disabled",
+            foreground="black"
+        )
+        self.explain_text.grid(row=14, column=0, columnspan=2, sticky="ew", padx=5, pady=(0, 5))
+        self.explain_log = ExplainLog()
+        self.explaining = explain_enabled()
+        self.trace = None
+        if not self.explaining:
+            self.explain_text.grid_remove()
+        self.winfo_toplevel().bind(EXPLAIN_KEY, self.toggle_explain, add="+")
+
+        # What the pane currently shows: the result, where its next page
+        # starts, and the text of each entry already rendered
+        self.result = None
+        self.result_cursor = None
+        self.rendered = []
+        self.loading_more = False
+
+        # --- Search-as-you-type ---
+        # Any change to the form schedules a search; the worker thread runs
+        # it and results come back through search_messages.
+        self.search_messages = queue.Queue()
+        self.search_worker = SearchWorker(self.search_messages, page_size=PAGE_SIZE)
+        self.shown_generation = 0
+        self.pending_search = None
+        self.polling = False
+        for var in (self.search_var, self.search_by_var, self.category_var,
+                    self.in_stock_var, self.inactive_var, self.sort_var):
+            var.trace_add("write", self.on_form_changed)
+
+        self.scanner = ScannerInput(self, self.handle_scan)
 
-    def center_window(self):
-        """Centers the window on the screen."""
-        self.update_idletasks()
-        width = self.winfo_width()
-        height = self.winfo_height()
-        x = (self.winfo_screenwidth() // 2) - (width // 2)
-        y = (self.winfo_screenheight() // 2) - (height // 2)
-        self.geometry(f'{width}x{height}+{x}+{y}')
 
     # --- (B) Form Validation and Functionality ---
 
@@ -213,64 +327,351 @@ class ProductSearchApp(ttk.Window):
         """
         self.error_label.config(text="") 
         
-        # --- 1. Get all data ---
-        search_term = self.search_var.get()
-        search_by = self.search_by_var.get()
-        category = self.category_var.get()
-        in_stock = self.in_stock_var.get()
-        show_inactive = self.inactive_var.get()
-        sort_by = self.sort_var.get()
-
-        # --- 2. Validation ---
+        # --- 1. Validation ---
         
         # Required field validation
+        search_term = self.search_var.get()
         if search_term == "" or search_term == self.search_entry.placeholder:
             self.error_label.config(text="Error: Search term is required.")
             return
 
-        # Format validation (e.g., length)
-        if len(search_term) < 2:
-            self.error_label.config(text="Error: Search term must be at least 2 characters.")
+        # --- 2. Functionality (Data Handling & UI Update) ---
+        # The button skips the typing delay
+        self.submit_search()
+
+    def typed_term(self):
+        """The search box text as typed, or "" while it shows its placeholder."""
+        search_term = self.search_var.get()
+        return "" if search_term == self.search_entry.placeholder else search_term.strip()
+
+    def current_query(self):
+        """Builds the normalised query from the form, or None when there is no term."""
+        query = make_query(
+            self.typed_term(), self.search_by_var.get(), self.category_var.get(),
+            self.in_stock_var.get(), self.inactive_var.get(), self.sort_var.get(),
+        )
+        return query if query.term else None
+
+    def on_show(self):
+        self.refresh_facets()
+        # The screen is kept between logins, so the history follows whoever is logged in now
+        self.history = open_history(self.router.session.username)
+        self.refresh_history()
+
+    def refresh_facets(self):
+        """Shows how many items the selected category holds with the stock/inactive filters applied."""
+        counts = default_facet_counts(self.in_stock_var.get(), self.inactive_var.get())
+        if counts is None:
+            # The index is still being built
+            progress = index_build_progress()
+            self.facet_label.config(text="" if progress is None else f"indexing {progress:.0%}")
+            return
+        category = self.category_var.get()
+        count = sum(counts.values()) if category == ALL_CATEGORIES else counts.get(category, 0)
+        self.facet_label.config(text=f"{count:,} items")
+
+    def on_form_changed(self, *args):
+        """Restarts the typing delay; only the last change in a burst is searched."""
+        self.refresh_facets()
+        self.update_save_button()
+        if self.pending_search is not None:
+            self.after_cancel(self.pending_search)
+        self.pending_search = self.after(SEARCH_DELAY_MS, self.submit_search)
+
+    def submit_search(self):
+        if self.pending_search is not None:
+            self.after_cancel(self.pending_search)
+            self.pending_search = None
+        if self.scan_var.get():
+            return      # the pane is showing the scan log
+
+        trace = SearchTrace() if self.explaining else None
+        query = self.current_query()
+        if query is None:
+            self.search_worker.cancel()
+            self.shown_generation = self.search_worker.generation
+            self.trace = None
+            self.clear_results()
             return
 
-        # --- 3. Functionality (Data Handling & UI Update) ---
-        # If all validation passes, we "handle" the data.
-        
-        print("--- SEARCH QUERY (SUCCESS) ---")
-        print(f"  Session ID: {self.hidden_session_id}")
-        print(f"  Search Term: {search_term} (Searching in: {search_by})")
-        print(f"  Category: {category}")
-        print(f"  In Stock Only: {in_stock}")
-        print(f"  Show Inactive: {show_inactive}")
-        print(f"  Sort By: {sort_by}")
-        print("---------------------------------")
-        
-        # --- Reflect results in UI ---
-        # We enable the Text widget, write to it, then disable it again
+        if trace is not None:
+            trace.query = query
+            trace.lap("tokenize")
+        self.trace = trace
+        self.search_worker.submit(query, trace)
+        self.start_polling()
+
+    def start_polling(self):
+        if not self.polling:
+            self.polling = True
+            self.after(30, self.poll_search_results)
+
+    def poll_search_results(self):
+        """Shows the newest finished search and any page asked for since; anything older was superseded."""
+        latest = page = None
+        while True:
+            try:
+                message = self.search_messages.get_nowait()
+            except queue.Empty:
+                break
+            if message[1] != self.search_worker.generation:
+                continue
+            if message[0] == "page":
+                page = message
+            else:
+                latest, page = message, None
+
+        if latest is not None:
+            self.shown_generation = latest[1]
+            if latest[0] == "error":
+                self.loading_more = False
+                self.error_label.config(text=f"Error: {latest[2]}")
+            else:
+                self.error_label.config(text="")
+                # The trace of the last submit; older generations were dropped above
+                self.show_result(latest[2], latest[3], self.trace)
+            self.refresh_facets()
+        if page is not None and page[2] is self.result:
+            self.show_more(page[3])
+
+        if self.shown_generation != self.search_worker.generation or self.loading_more:
+            if latest is None:
+                self.refresh_facets()   # shows build progress while the first search waits for the index
+            self.after(30, self.poll_search_results)
+        else:
+            self.polling = False
+
+    # --- Saved & recent searches ---
+
+    def refresh_history(self):
+        self.history_entries = self.history.entries() if self.history is not None else []
+        self.history_combo.config(values=[label for label, _ in self.history_entries])
+        self.history_var.set("")
+        self.update_save_button()
+
+    def update_save_button(self):
+        query = self.current_query()
+        saved = self.history is not None and query is not None and self.history.saved_name(query) is not None
+        self.save_button.config(text="Forget" if saved else "Save",
+                                state="normal" if self.history is not None and query is not None else "disabled")
+
+    def pick_history(self, event=None):
+        """Fills the form in from the picked entry and searches at once; a warmed entry comes from the cache."""
+        position = self.history_combo.current()
+        if not 0 <= position < len(self.history_entries):
+            return
+        _, query = self.history_entries[position]
+        self.search_entry.delete(0, tk.END)
+        self.search_entry.insert(0, self.history.term(query))
+        self.search_entry.config(foreground='black')
+        self.search_by_var.set(query.search_by)
+        self.category_var.set(query.category)
+        self.in_stock_var.set(query.in_stock_only)
+        self.inactive_var.set(query.show_inactive)
+        self.sort_var.set(query.sort_by)
+        self.submit_search()
+
+    def toggle_saved(self):
+        """Saves the form's search under a name, or forgets it if it is saved already."""
+        query = self.current_query()
+        if self.history is None or query is None:
+            return
+        name = self.history.saved_name(query)
+        if name is not None:
+            self.history.forget(name)
+        else:
+            typed = self.typed_term()
+            name = simpledialog.askstring("Save Search", "Name for this search:", initialvalue=typed, parent=self)
+            if not name or not name.strip():
+                return
+            self.history.save(name.strip(), query, typed)
+        self.history.warm()
+        self.refresh_history()
+
+    def schedule_record(self, query):
+        """Records query as recent once its results have stayed on screen for RECORD_AFTER_MS."""
+        if self.pending_record is not None:
+            self.after_cancel(self.pending_record)
+        self.pending_record = self.after(RECORD_AFTER_MS, self.record_recent, query)
+
+    def record_recent(self, query):
+        self.pending_record = None
+        if self.history is None or self.result is None or self.result.query != query:
+            return
+        self.history.record(query, self.typed_term())
+        self.history.warm()
+        self.refresh_history()
+
+    # --- Scanner mode ---
+
+    def toggle_scan_mode(self):
+        scanning = self.scan_var.get()
+        self.scanner.enable(scanning)
+        if scanning:
+            self.search_worker.cancel()
+            self.shown_generation = self.search_worker.generation
+            self.clear_results()
+            self.results_text.config(state="normal")
+            self.results_text.insert("1.0", "Scanner mode: scan a barcode. Latest scans first.\n")
+            self.results_text.config(state="disabled")
+        else:
+            # The scan log is not a listing show_result() can rewrite in place
+            self.clear_results()
+            self.submit_search()
+
+    def handle_scan(self, code):
+        """Looks one scanned barcode up and logs it at the top of the results pane."""
+        found = find_barcode(code)
+        if found is None:
+            line = f"{code}  Not found\n"
+        else:
+            sku, item = found
+            stock = f"{item['qty']}" if item["qty"] > 0 else "0 (Out of Stock)"
+            line = f"{code}  [{sku}] {item['name']} | Stock: {stock} | ₱{item['price']:,.2f}\n"
+        text = self.results_text
+        text.config(state="normal")
+        text.insert("2.0", line)
+        text.delete(f"{SCAN_LOG_LINES + 2}.0", "end-1c")
+        text.config(state="disabled")
+
+    # --- Explain mode ---
+
+    def toggle_explain(self, event=None):
+        if not self.winfo_ismapped():
+            return None     # the window's binding is shared by every screen
+        self.explaining = not self.explaining
+        if self.explaining:
+            self.explain_text.grid()
+            self.set_explain_text("Explain mode on: the next search is timed here.")
+        else:
+            self.explain_text.grid_remove()
+        return "break"
+
+    def set_explain_text(self, content):
+        self.explain_text.config(state="normal")
+        self.explain_text.delete("1.0", tk.END)
+        self.explain_text.insert("1.0", content)
+        self.explain_text.config(state="disabled")
+
+    def explain(self, trace, results):
+        """Shows a finished search's trace and appends it to the explain log."""
+        trace.finish(results)
+        try:
+            self.explain_log.append(trace)
+            logged = f"logged to {self.explain_log.path}"
+        except OSError as e:
+            logged = f"not logged: {e}"
+        self.set_explain_text(f"{trace.format()}\n{logged}")
+
+    # --- Results pane ---
+
+    def clear_results(self):
+        self.result = None
+        self.result_cursor = None
+        self.rendered = []
+        self.loading_more = False
         self.results_text.config(state="normal")
-        self.results_text.delete("1.0", tk.END) # Clear previous results
-        
-        # Create mock results based on the search
-        mock_results = f"Searching for '{search_term}' (Category: {category}, In Stock: {in_stock})...\n\n"
-        mock_results += "Found 3 matching products:\n\n"
-        mock_results += "1. [Hardware] Claw Hammer, 16oz\n"
-        mock_results += "  ID: HW-0012\n"
-        mock_results += "  Stock: 42 (Manila), 18 (Quezon City)\n"
-        mock_results += "  Price: ₱350.00\n\n"
-        
-        mock_results += "2. [Tools] Hammer Drill, 18V Kit\n"
-        mock_results += "  ID: TL-0004\n"
-        mock_results += "  Stock: 8 (Manila)\n"
-        mock_results += "  Price: ₱4,200.00\n\n"
-        
-        if not in_stock:
-             mock_results += "3. [Hardware] Sledge Hammer, 8lb\n"
-             mock_results += "  ID: HW-0045\n"
-             mock_results += "  Stock: 0 (Out of Stock)\n"
-             mock_results += "  Price: ₱875.00\n"
+        self.results_text.delete("1.0", tk.END)
+        self.results_text.config(state="disabled")
+        self.update_load_more()
 
-        self.results_text.insert("1.0", mock_results)
-        self.results_text.config(state="disabled") # Make read-only
+    def show_result(self, result, page, trace=None):
+        """
+        Shows the first page of a new result, paged by the search worker.
+        Only the header and the entries that differ from what is on screen
+        are rewritten, and entries left over from a longer previous listing
+        are cut off.
+        """
+        if trace is not None:
+            trace.lap("deliver")
+        entries, self.result_cursor = page
+        self.result = result
+        self.loading_more = False
+        texts = [self.format_entry(number, sku, item) for number, (sku, item) in enumerate(entries, start=1)]
+
+        text = self.results_text
+        text.config(state="normal")
+        text.delete("1.0", f"{HEADER_LINES + 1}.0")
+        text.insert("1.0", self.format_header(result))
+        for position, entry in enumerate(texts):
+            if position < len(self.rendered):
+                if self.rendered[position] != entry:
+                    line = HEADER_LINES + 1 + position * ENTRY_LINES
+                    text.delete(f"{line}.0", f"{line + ENTRY_LINES}.0")
+                    text.insert(f"{line}.0", entry)
+            else:
+                text.insert("end-1c", entry)
+        if len(self.rendered) > len(texts):
+            text.delete(f"{HEADER_LINES + 1 + len(texts) * ENTRY_LINES}.0", "end-1c")
+        text.config(state="disabled")
+        text.yview_moveto(0)
+
+        self.rendered = texts
+        self.update_load_more()
+        self.schedule_record(result.query)
+        if trace is not None:
+            # Draw now, so the render stage covers the redraw and not just the text edits
+            text.update_idletasks()
+            trace.lap("render")
+            self.explain(trace, len(result))
+
+    def load_more(self):
+        """Asks the search worker for the next page of the current result; show_more() appends it."""
+        if self.result is None or self.result_cursor is None or self.loading_more:
+            return
+        self.loading_more = True
+        self.search_worker.more(self.result, self.result_cursor)
+        self.start_polling()
+
+    def show_more(self, page):
+        """Appends a page from load_more() below what is shown."""
+        self.loading_more = False
+        entries, self.result_cursor = page
+        texts = [self.format_entry(number, sku, item)
+                 for number, (sku, item) in enumerate(entries, start=len(self.rendered) + 1)]
+        self.results_text.config(state="normal")
+        self.results_text.insert("end-1c", "".join(texts))
+        self.results_text.config(state="disabled")
+        self.rendered.extend(texts)
+        self.update_load_more()
+
+    def update_load_more(self):
+        if self.result is None or self.result_cursor is None:
+            self.load_more_button.config(text="Load more", state="disabled")
+        else:
+            remaining = len(self.result) - len(self.rendered)
+            self.load_more_button.config(text=f"Load more ({remaining:,} left)", state="normal")
+
+    def on_results_scrolled(self, first, last):
+        """Keeps the scrollbar in step and fetches the next page near the bottom."""
+        self.results_scrollbar.set(first, last)
+        if float(last) > 0.95 and self.result_cursor is not None and not self.loading_more:
+            self.after_idle(self.load_more)
+
+    def format_header(self, result):
+        """The HEADER_LINES lines above the entries."""
+        query = result.query
+        if not len(result):
+            summary = "No matching products found."
+        elif not result.exact_count:
+            summary = f"No exact matches. Found {len(result):,} products with similar names:"
+        elif result.exact_count < len(result):
+            summary = (f"Found {result.exact_count:,} matching products, "
+                       f"then {len(result) - result.exact_count:,} with similar names:")
+        else:
+            summary = f"Found {len(result):,} matching products:"
+        return (f"Searching for '{query.term}' (Category: {query.category}, In Stock: {query.in_stock_only})...\n"
+                f"\n{summary}\n\n")
+
+    def format_entry(self, number, sku, item):
+        """One product as ENTRY_LINES lines, laid out the way the mock results were."""
+        stock = f"{item['qty']}" if item["qty"] > 0 else "0 (Out of Stock)"
+        status = "" if item["active"] else " (Inactive)"
+        name = " ".join(item["name"].splitlines())    # one line, or the entry blocks shift
+        return (f"{number}. [{item['category'] or 'Uncategorized'}] {name}{status}\n"
+                f"  ID: {sku}\n"
+                f"  Stock: {stock}\n"
+                f"  Price: ₱{item['price']:,.2f}\n\n")
 
 
     def clear_form(self):
@@ -289,10 +690,8 @@ class ProductSearchApp(ttk.Window):
         self.search_entry.insert(0, self.search_entry.placeholder)
         self.search_entry.config(foreground='grey')
         
-        # Clear results area
-        self.results_text.config(state="normal")
-        self.results_text.delete("1.0", tk.END)
-        self.results_text.config(state="disabled")
+        # Clear results area; with no term this also drops any search still running
+        self.submit_search()
         
         self.error_label.config(text="")
         
@@ -301,21 +700,11 @@ class ProductSearchApp(ttk.Window):
 
     def open_main_menu(self):
         """
-        Closes the current window and launches the main menu application
-        via a new subprocess, ensuring clean separation.
+        Swaps back to the main menu screen inside the same window.
         """
-        self.destroy() # Close the search window
-        try:
-            # Launch the main menu file (main_menu.py)
-            subprocess.Popen([sys.executable, "main_menu.py"])
-        except Exception as e:
-            # Note: This error message will likely be missed as the window is closed,
-            # but it is good practice to include it for debugging.
-            print(f"Error launching main_menu.py: {e}")
-            # If the launch fails, we can't show an error box easily, but we'll print to console.
+        self.router.show("main_menu")
 
 
 # --- Main execution ---
 if __name__ == "__main__":
-    app = ProductSearchApp()
-    app.mainloop()
\ No newline at end of file
+    screen_router.run("search")
\ No newline at end of file
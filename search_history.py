@@ -0,0 +1,210 @@
+import atexit
+import json
+import logging
+import os
+import threading
+
+from search_engine import ALL_CATEGORIES, SearchQuery, default_warmer
+
+log = logging.getLogger(__name__)
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "search_history.json")
+# Recent searches kept per user, newest first
+RECENT_LIMIT = 20
+# Searches kept warm after login: every saved one, then the most recent
+WARM_LIMIT = 10
+
+_lock = threading.Lock()
+_histories = {}
+
+
+def describe(query, term=None):
+    """A one-line label for the dropdown: the term as typed, then whatever differs from the form's defaults."""
+    parts = [term or query.term]
+    if query.search_by != "Any (All Fields)":
+        parts.append(f"in {query.search_by}")
+    if query.category != ALL_CATEGORIES:
+        parts.append(query.category)
+    if not query.in_stock_only:
+        parts.append("incl. out of stock")
+    if query.show_inactive:
+        parts.append("incl. inactive")
+    if query.sort_by != "Relevance":
+        parts.append(f"by {query.sort_by}")
+    return ", ".join(parts)
+
+
+def _query(fields):
+    """
+    (SearchQuery, term as typed) from a saved query's fields, or
+    (None, None) for an entry this version cannot read.
+    """
+    fields = dict(fields)
+    typed = fields.pop("typed", None)
+    try:
+        return SearchQuery(**fields), typed
+    except TypeError:
+        return None, None
+
+
+class SearchHistory:
+    """
+    One user's saved searches and recently used ones, each the full form
+    state as a SearchQuery.
+
+    Saved searches are named and kept until forgotten. Recent ones are
+    recorded as the user settles on them, newest first, and the oldest
+    drops off past RECENT_LIMIT. Each query also keeps its term as the user
+    typed it, which is what the form gets back; the query's own term is
+    normalised for matching. Every change is written to a JSON file
+    holding every user of this install, on a background thread.
+    """
+    def __init__(self, user, path=DEFAULT_PATH):
+        self.user = user
+        self.path = path
+        self.saved = {}     # name -> query, in the order saved
+        self.recent = []
+        self.typed = {}     # query -> its term as typed, where that differs
+        self._unwritten = None
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        entry = _read(path).get(user, {})
+        for saved in entry.get("saved", []):
+            query, typed = _query(saved.get("query", {}))
+            if query is not None:
+                self.saved[saved.get("name") or query.term] = query
+                self._remember(query, typed)
+        for fields in entry.get("recent", []):
+            query, typed = _query(fields)
+            if query is not None:
+                self.recent.append(query)
+                self._remember(query, typed)
+
+    def _remember(self, query, typed):
+        if typed and typed != query.term:
+            self.typed[query] = typed
+        else:
+            self.typed.pop(query, None)
+
+    def term(self, query):
+        """query's term as the user typed it."""
+        return self.typed.get(query, query.term)
+
+    def record(self, query, typed=None):
+        """Moves query to the front of the recent searches."""
+        if self.recent[:1] == [query] and (typed or query.term) == self.term(query):
+            return
+        self.recent = [query, *(recent for recent in self.recent if recent != query)][:RECENT_LIMIT]
+        self._remember(query, typed)
+        self._write()
+
+    def save(self, name, query, typed=None):
+        """Saves query under name, replacing any search saved under that name."""
+        self.saved.pop(name, None)
+        self.saved[name] = query
+        self._remember(query, typed)
+        self._write()
+
+    def forget(self, name):
+        if self.saved.pop(name, None) is not None:
+            self._write()
+
+    def saved_name(self, query):
+        """The name query is saved under, or None."""
+        return next((name for name, saved in self.saved.items() if saved == query), None)
+
+    def entries(self):
+        """(label, query) for the dropdown: saved searches, then recent ones not also saved."""
+        saved = set(self.saved.values())
+        return ([(f"★ {name}", query) for name, query in self.saved.items()]
+                + [(describe(query, self.term(query)), query) for query in self.recent if query not in saved])
+
+    def warm(self):
+        """Has the shared warmer keep the top WARM_LIMIT entries precomputed."""
+        default_warmer().warm([query for _, query in self.entries()[:WARM_LIMIT]])
+
+    def _fields(self, query):
+        fields = query._asdict()
+        if query in self.typed:
+            fields["typed"] = self.typed[query]
+        return fields
+
+    def _write(self):
+        """
+        Hands the current entries to the writer thread, starting it if it
+        is not running. Changes made while a write is under way are
+        written once it finishes, so only the latest state is ever queued.
+        """
+        kept = {*self.saved.values(), *self.recent}
+        self.typed = {query: typed for query, typed in self.typed.items() if query in kept}
+        entry = {
+            "saved": [{"name": name, "query": self._fields(query)} for name, query in self.saved.items()],
+            "recent": [self._fields(query) for query in self.recent],
+        }
+        with self._writer_lock:
+            self._unwritten = entry
+            if self._writer is None:
+                # A daemon, so only flush_histories() at exit decides how long closing waits for it
+                self._writer = threading.Thread(target=self._write_loop, name="search-history-writer", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            with self._writer_lock:
+                entry, self._unwritten = self._unwritten, None
+                if entry is None:
+                    self._writer = None
+                    return
+            with _lock:
+                users = _read(self.path)
+                users[self.user] = entry
+                temporary = self.path + ".tmp"
+                try:
+                    with open(temporary, "w", encoding="utf-8") as out:
+                        json.dump({"users": users}, out, indent=1)
+                    os.replace(temporary, self.path)
+                except OSError as e:
+                    log.warning("Search history not saved: %s", e)
+
+    def wait_written(self):
+        """Waits for any write under way, and any it has queued, to finish."""
+        with self._writer_lock:
+            writer = self._writer
+        if writer is not None:
+            writer.join()
+
+
+def _read(path):
+    """Every user's entry in the history file; empty when there is no usable file."""
+    try:
+        with open(path, encoding="utf-8") as file:
+            users = json.load(file).get("users", {})
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError, AttributeError) as e:
+        log.warning("Search history %s not read: %s", path, e)
+        return {}
+    return users if isinstance(users, dict) else {}
+
+
+def open_history(user):
+    """The shared SearchHistory for user, read from the default file on first use."""
+    with _lock:
+        history = _histories.get(user)
+        if history is None:
+            history = _histories[user] = SearchHistory(user)
+        return history
+
+
+def warm_history(user):
+    """Called after login: starts precomputing the user's saved and recent searches in the background."""
+    open_history(user).warm()
+
+
+@atexit.register
+def flush_histories():
+    """Waits for every user's pending history write, so a change made just before the app closes reaches the file."""
+    with _lock:
+        histories = list(_histories.values())
+    for history in histories:
+        history.wait_written()
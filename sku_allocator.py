@@ -0,0 +1,76 @@
+import logging
+import os
+import threading
+
+
+# Short, readable codes for the branches offered on the login screen
+BRANCH_CODES = {
+    "Manila Branch": "MNL",
+    "Quezon City Branch": "QC",
+    "Remote (Home)": "RMT",
+}
+
+log = logging.getLogger(__name__)
+
+DEFAULT_BLOCK_SIZE = 1000
+TERMINAL_ENV = "JBSON_TERMINAL_ID"
+DEFAULT_TERMINAL = 1
+
+
+def branch_code(location):
+    """Returns the SKU prefix for a branch, falling back to its initials."""
+    code = BRANCH_CODES.get(location)
+    if code is None:
+        code = "".join(word[0] for word in location.split() if word[:1].isalnum()).upper() or "JB"
+    return code
+
+
+def terminal_id():
+    """
+    Terminal number within a branch, configured per machine. A value that
+    is not a whole number from 1 to 99 is reported and DEFAULT_TERMINAL is
+    used, so a typo in the setting cannot stop items being added.
+    """
+    value = os.environ.get(TERMINAL_ENV, "").strip()
+    if not value:
+        return DEFAULT_TERMINAL
+    try:
+        terminal = int(value)
+        if not 1 <= terminal <= 99: raise ValueError
+    except ValueError:
+        log.warning("%s=%r is not a terminal number from 1 to 99; using terminal %d",
+                    TERMINAL_ENV, value, DEFAULT_TERMINAL)
+        return DEFAULT_TERMINAL
+    return terminal
+
+
+class SkuAllocator:
+    """
+    Hands out SKUs like 'MNL01-004217' from blocks leased per branch and
+    terminal.
+
+    Each terminal leases a block of block_size numbers from the store in
+    one short transaction and then allocates from it with a counter, so
+    most allocations are an increment under a lock with no lookup.
+    The branch and terminal are part of the prefix, so no two terminals
+    can produce the same code even when they lease blocks from separate
+    databases. Numbers left in a block when the app exits are skipped.
+    """
+    def __init__(self, store, location, terminal=None, block_size=DEFAULT_BLOCK_SIZE):
+        self.store = store
+        self.location = location
+        self.prefix = f"{branch_code(location)}{terminal if terminal is not None else terminal_id():02d}"
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+
+    def next_sku(self):
+        with self._lock:
+            if self._next == self._end:
+                block = self.store.lease_block(self.prefix)
+                self._next = block * self.block_size
+                self._end = self._next + self.block_size
+            number = self._next
+            self._next += 1
+        return f"{self.prefix}-{number:06d}"
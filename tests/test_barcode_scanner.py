@@ -0,0 +1,61 @@
+from barcode_scanner import MAX_GAP_MS, MIN_LENGTH, ScanDetector, shortcut_mask
+
+
+def feed(detector, text, start_ms, gap_ms):
+    """Types text one key every gap_ms; returns the (code, typed) results that settled something."""
+    settled = []
+    for number, char in enumerate(text):
+        result = detector.key(char, start_ms + number * gap_ms)
+        if result != (None, ""):
+            settled.append(result)
+    return settled
+
+
+def test_fast_burst_ended_by_enter_is_a_scan():
+    detector = ScanDetector()
+    assert feed(detector, "4800016641107", 1000, 8) == []
+    assert detector.flush() == ("4800016641107", "")
+
+
+def test_fast_burst_without_terminator_settles_once_idle():
+    detector = ScanDetector()
+    feed(detector, "4800016641107", 1000, 8)
+    last = 1000 + 12 * 8
+    assert detector.idle(last + MAX_GAP_MS) == (None, "")       # the gap has not passed yet
+    assert detector.idle(last + MAX_GAP_MS + 1) == ("4800016641107", "")
+    assert detector.buffer == []
+
+
+def test_typing_is_released_as_text():
+    detector = ScanDetector()
+    settled = feed(detector, "hammer", 1000, MAX_GAP_MS + 40)
+    # Every key came too late to continue a burst, so each earlier one is released as typed
+    assert settled == [(None, char) for char in "hamme"]
+    assert detector.flush() == (None, "r")
+
+
+def test_short_fast_burst_is_typing():
+    detector = ScanDetector()
+    feed(detector, "ab" * (MIN_LENGTH // 2 - 1) + "a", 1000, 5)
+    assert detector.flush()[0] is None
+
+
+def test_scan_right_after_typing_is_told_apart():
+    detector = ScanDetector()
+    feed(detector, "pvc", 1000, 200)
+    settled = feed(detector, "4800016641107", 2000, 8)
+    assert settled == [(None, "c")]     # the last typed key, released by the scan's first
+    assert detector.flush() == ("4800016641107", "")
+
+
+def test_gap_at_the_limit_still_continues_a_burst():
+    detector = ScanDetector()
+    feed(detector, "ABC123", 0, MAX_GAP_MS)
+    assert detector.flush() == ("ABC123", "")
+
+
+def test_numlock_is_not_a_shortcut_on_windows():
+    numlock, alt, control = 0x8, 0x20000, 0x4
+    assert not numlock & shortcut_mask("win32")
+    assert alt & shortcut_mask("win32") and control & shortcut_mask("win32")
+    assert numlock & shortcut_mask("x11") and control & shortcut_mask("x11")
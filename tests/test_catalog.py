@@ -0,0 +1,74 @@
+import pytest
+
+from catalog import Catalog
+
+
+def item(name, qty=1, price=1.0, **fields):
+    return {"name": name, "qty": qty, "price": price, **fields}
+
+
+def columns_aligned(catalog):
+    rows = catalog.row_count
+    return (len(catalog._qty) == len(catalog._price) == len(catalog._active) == len(catalog._live) == rows
+            and all(len(column) == rows for column in catalog._codes.values()))
+
+
+def test_set_and_get():
+    catalog = Catalog([("A", item("Claw Hammer", qty=3, price=12.5, category="Tools", supplier="Acme"))])
+    catalog["B"] = item("PVC Pipe", barcode="4800001")
+    assert len(catalog) == 2
+    assert catalog["A"] == {"name": "Claw Hammer", "qty": 3, "price": 12.5, "desc": "", "category": "Tools",
+                            "barcode": "", "supplier": "Acme", "active": 1}
+    assert catalog["B"]["barcode"] == "4800001"
+    assert list(catalog) == ["A", "B"]
+    assert catalog.sku_at(catalog.row_of("B")) == "B"
+
+
+def test_update_keeps_the_row_and_the_unchanged_fields():
+    catalog = Catalog([("A", item("Claw Hammer", category="Tools"))])
+    row = catalog.row_of("A")
+    catalog["A"] = {"qty": 9}
+    assert catalog.row_of("A") == row
+    assert catalog["A"]["qty"] == 9
+    assert catalog["A"]["name"] == "Claw Hammer"
+    assert catalog["A"]["category"] == "Tools"
+    assert catalog.garbage_bytes > 0
+
+
+def test_remove_tombstones_the_row():
+    catalog = Catalog([("A", item("a")), ("B", item("b")), ("C", item("c"))])
+    row = catalog.row_of("B")
+    del catalog["B"]
+    assert "B" not in catalog
+    assert not catalog.is_live(row)
+    assert list(catalog) == ["A", "C"]
+    assert len(catalog) == 2
+    with pytest.raises(KeyError):
+        del catalog["B"]
+    catalog["B"] = item("b again")
+    assert catalog.row_of("B") != row
+    assert catalog["B"]["name"] == "b again"
+
+
+def test_compact_drops_removed_rows():
+    catalog = Catalog((f"S{number}", item(f"item {number}", qty=number)) for number in range(100))
+    for number in range(0, 100, 2):
+        del catalog[f"S{number}"]
+    catalog.compact()
+    assert catalog.row_count == len(catalog) == 50
+    assert [catalog[f"S{number}"]["qty"] for number in range(1, 100, 2)] == list(range(1, 100, 2))
+    assert columns_aligned(catalog)
+
+
+@pytest.mark.parametrize("bad", [item("b", qty=2**31), item("b", price="free")])
+def test_failed_set_leaves_columns_aligned(bad):
+    catalog = Catalog([("A", item("a"))])
+    with pytest.raises((OverflowError, TypeError)):
+        catalog["B"] = bad
+    with pytest.raises((OverflowError, TypeError)):
+        catalog["A"] = bad
+    assert "B" not in catalog
+    assert catalog["A"]["qty"] == 1
+    assert columns_aligned(catalog)
+    catalog["B"] = item("b", qty=5)
+    assert catalog.item_at(catalog.row_of("B"))["qty"] == 5
@@ -0,0 +1,88 @@
+import queue
+
+import pytest
+
+from inventory_export import COLUMNAR_MAGIC, InventoryExport, read_columnar
+from inventory_import import CsvImport
+from inventory_store import InventoryStore
+
+ITEMS = {
+    "HW-0001": {"name": 'Hammer, 16oz "Claw"', "qty": 5, "price": 12.99, "desc": "Steel head,\nfibreglass handle",
+                "category": "Tools", "barcode": "4801234567890", "supplier": "Acme", "active": 1},
+    "HW-0002": {"name": "Ñut & bølt — M8", "qty": 0, "price": 0.25, "desc": "", "category": "Fasteners",
+                "barcode": "", "supplier": "", "active": 1},
+    "HW-0003": {"name": "Tape 'duct'", "qty": 2_000_000, "price": 3.5, "desc": "銀色のテープ 🦆", "category": "",
+                "barcode": "", "supplier": "Sari-sari, Inc.", "active": 0},
+}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = InventoryStore(str(tmp_path / "inventory.db"))
+    store.upsert_many(ITEMS.items())
+    yield store
+    store.close()
+
+
+def export(store, path, fmt, **filters):
+    messages = queue.Queue()
+    written = InventoryExport(str(path), store, messages, fmt=fmt, batch_size=2, **filters).run()
+    return written, messages
+
+
+def test_columnar_round_trip(store, tmp_path):
+    path = tmp_path / "inventory.jbcol"
+    written, messages = export(store, path, "columnar")
+    assert written == len(ITEMS)
+    assert path.read_bytes().startswith(COLUMNAR_MAGIC)
+    assert dict(read_columnar(str(path))) == ITEMS
+    assert messages.get_nowait() == ("progress", 2 / 3, 2)
+
+
+def test_columnar_dictionary_encodes_repeated_strings(tmp_path):
+    store = InventoryStore(str(tmp_path / "inventory.db"))
+    try:
+        items = {f"HW-{number:04d}": dict(ITEMS["HW-0002"], name=f"Bolt {number}", category=f"Bin {number % 3}")
+                 for number in range(100)}
+        store.upsert_many(items.items())
+        path = tmp_path / "inventory.jbcol"
+        export(store, path, "columnar")
+        assert dict(read_columnar(str(path))) == items
+    finally:
+        store.close()
+
+
+def test_columnar_export_applies_the_filters(store, tmp_path):
+    path = tmp_path / "tools.jbcol"
+    written, _ = export(store, path, "columnar", category="Tools", in_stock_only=True)
+    assert written == 1
+    assert list(read_columnar(str(path))) == [("HW-0001", ITEMS["HW-0001"])]
+
+
+def test_read_columnar_rejects_other_files(tmp_path):
+    path = tmp_path / "inventory.csv"
+    path.write_text("sku,name\n")
+    with pytest.raises(ValueError, match="not a columnar inventory export"):
+        list(read_columnar(str(path)))
+
+
+def test_csv_round_trip(store, tmp_path):
+    path = tmp_path / "inventory.csv"
+    written, _ = export(store, path, "csv")
+    assert written == len(ITEMS)
+
+    copy = InventoryStore(str(tmp_path / "copy.db"))
+    try:
+        accepted, rejected, report = CsvImport(str(path), copy, queue.Queue(), make_sku=None).run()
+        assert (accepted, rejected, report) == (len(ITEMS), 0, None)
+        # The import leaves items active; everything else comes back as exported
+        assert {sku: copy.get(sku) for sku in ITEMS} == {sku: dict(item, active=1) for sku, item in ITEMS.items()}
+    finally:
+        copy.close()
+
+
+def test_cancelled_export_stops_after_a_batch(store, tmp_path):
+    messages = queue.Queue()
+    exporter = InventoryExport(str(tmp_path / "inventory.csv"), store, messages, batch_size=2)
+    exporter.cancel()
+    assert exporter.run() == 2
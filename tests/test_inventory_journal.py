@@ -0,0 +1,101 @@
+import os
+
+import pytest
+
+import inventory_journal
+from inventory_journal import OP_ADD, OP_EDIT, OP_REMOVE, InventoryJournal, read_records
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = InventoryJournal(str(tmp_path))
+    yield journal
+    if journal._thread.is_alive():
+        journal.close()
+
+
+def skus(directory):
+    return [(record.seq, record.sku) for record in read_records(directory)]
+
+
+def test_records_round_trip(journal, tmp_path):
+    journal.append(OP_ADD, "ana", "HW-1", None, {"name": "Claw Hammer", "qty": 3})
+    journal.append_many(OP_EDIT, "bo", [("HW-1", {"qty": 3}, {"qty": 5}), ("HW-2", None, {"qty": 1})])
+    assert journal.flush(5)
+    records = list(journal.replay())
+    assert [(r.seq, r.op, r.user, r.sku) for r in records] == [
+        (1, OP_ADD, "ana", "HW-1"), (2, OP_EDIT, "bo", "HW-1"), (3, OP_EDIT, "bo", "HW-2")]
+    assert records[0].new == {"name": "Claw Hammer", "qty": 3}
+    assert (records[1].old, records[1].new) == ({"qty": 3}, {"qty": 5})
+
+
+def test_rebuild_catalog_folds_edits_and_removes(journal):
+    journal.append(OP_ADD, "", "A", None, {"name": "a", "qty": 1, "price": 1.0})
+    journal.append(OP_ADD, "", "B", None, {"name": "b", "qty": 2, "price": 2.0})
+    journal.append(OP_EDIT, "", "A", {"qty": 1}, {"qty": 7})
+    journal.append(OP_REMOVE, "", "B", {"name": "b"}, None)
+    assert journal.flush(5)
+    catalog = journal.rebuild_catalog()
+    assert list(catalog) == ["A"]
+    assert catalog["A"]["qty"] == 7
+
+
+def test_torn_tail_is_cut_off_on_reopen(tmp_path):
+    journal = InventoryJournal(str(tmp_path))
+    for number in range(3):
+        journal.append(OP_ADD, "", f"S{number}", None, {"name": "x"})
+    journal.close()
+    segment = journal.segments()[-1]
+    intact = os.path.getsize(segment)
+    with open(segment, "ab") as out:
+        out.write(b"\x40\x00\x00\x00torn")     # a frame header promising more than was written
+
+    reopened = InventoryJournal(str(tmp_path))
+    assert os.path.getsize(segment) == intact
+    reopened.append(OP_ADD, "", "S3", None, {"name": "x"})
+    reopened.close()
+    assert skus(str(tmp_path)) == [(1, "S0"), (2, "S1"), (3, "S2"), (4, "S3")]
+
+
+def test_segments_are_named_after_their_first_record(tmp_path):
+    journal = InventoryJournal(str(tmp_path), segment_bytes=1)
+    for batch in range(3):
+        for number in range(4):
+            journal.append(OP_ADD, "", f"S{batch}{number}", None, {"name": "x"})
+        assert journal.flush(5)
+    journal.close()
+    for path in journal.segments():
+        first = next(inventory_journal._read_segment(path))[1]
+        assert os.path.basename(path) == inventory_journal._segment_name(first.seq)
+
+
+def test_bad_record_is_dropped_and_failed_write_retried(journal, tmp_path, monkeypatch):
+    journal.append(OP_ADD, "", "A", None, {"name": object()})    # not JSON
+    journal.append(OP_ADD, "", "B", None, {"name": "b"})
+    assert journal.flush(5)
+
+    real_fsync = os.fsync
+    failures = [OSError(28, "No space left on device")]
+
+    def fsync(fd):
+        if failures:
+            raise failures.pop()
+        return real_fsync(fd)
+
+    monkeypatch.setattr(inventory_journal.os, "fsync", fsync)
+    journal.append(OP_ADD, "", "C", None, {"name": "c"})
+    assert journal.flush(5) is False
+    journal.append(OP_ADD, "", "D", None, {"name": "d"})
+    assert journal.flush(5)
+    assert skus(str(tmp_path)) == [(1, "B"), (2, "C"), (3, "D")]
+
+
+def test_dead_writer_fails_flush_and_append(journal):
+    def broken(frames, first_seq):
+        raise RuntimeError("writer bug")
+
+    journal._write = broken
+    journal.append(OP_ADD, "", "A", None, {"name": "a"})
+    assert journal.flush(5) is False
+    with pytest.raises(RuntimeError):
+        journal.append(OP_ADD, "", "B", None, {"name": "b"})
@@ -0,0 +1,133 @@
+import pytest
+
+import inventory_store
+import search_engine
+from inventory_journal import OP_UPSERT, InventoryJournal
+from inventory_store import SEED_ITEMS, InventoryStore
+
+
+def item(name, qty=5, price=10.0, category="Tools"):
+    return {"name": name, "qty": qty, "price": price, "desc": "", "category": category,
+            "barcode": "", "supplier": "Acme", "active": 1}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = InventoryStore(str(tmp_path / "inventory.db"))
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def default_index(store, monkeypatch):
+    """The shared index over `store`, with no snapshot and no background merges."""
+    monkeypatch.setattr(search_engine, "open_default_store", lambda: store)
+    monkeypatch.setattr(search_engine, "_load_snapshot", lambda: (None, 0))
+    monkeypatch.setattr(search_engine, "_start_merge", lambda index: None)
+    monkeypatch.setattr(search_engine, "_default_index", None)
+    monkeypatch.setattr(search_engine, "_default_version", None)
+    store.add_item("HW-0001", item("Claw Hammer"))
+    yield search_engine.open_default_index()
+    store.unsubscribe(search_engine._on_store_change)
+
+
+def test_lease_block_does_not_change_version(store):
+    version = store.version
+    assert store.lease_block("HW") == 0
+    assert store.lease_block("HW") == 1
+    assert store.version == version
+
+
+def test_item_writes_change_version(store):
+    version = store.version
+    store.add_item("HW-0001", item("Claw Hammer"))
+    assert store.version != version
+
+
+def test_lease_block_keeps_default_index(store, default_index):
+    store.lease_block("HW")
+    assert search_engine.open_default_index() is default_index
+
+
+def test_item_change_is_applied_not_rebuilt(store, default_index):
+    store.add_item("HW-0002", item("Ball Peen Hammer"))
+    assert search_engine.open_default_index() is default_index
+    assert len(default_index.search(search_engine.make_query("peen"))) == 1
+
+
+def test_failing_listener_does_not_stop_the_others(store, caplog):
+    heard = []
+
+    def broken(op, rows):
+        raise ValueError("broken listener")
+
+    store.subscribe(broken)
+    store.subscribe(lambda op, rows: heard.append((op, [sku for sku, _ in rows])))
+    store.add_item("HW-0001", item("Claw Hammer"))
+    assert heard == [("add", ["HW-0001"])]
+    assert store.get("HW-0001")["name"] == "Claw Hammer"
+    [record] = caplog.records
+    assert record.name == "inventory_store" and "broken" in record.getMessage()
+    assert str(record.exc_info[1]) == "broken listener"
+
+
+def test_page_follows_sku_order_as_it_scrolls(store):
+    skus = [f"HW-{number:04d}" for number in range(0, 300, 3)]
+    store.upsert_many((sku, item(f"Item {sku}")) for sku in reversed(skus))
+    for offset in (0, 10, 20, 90, 15, 5, 60, 0):
+        assert [sku for sku, _ in store.page(offset, 10)] == skus[offset:offset + 10]
+    store.add_item("HW-0001", item("Inserted"))
+    skus.insert(1, "HW-0001")
+    assert [sku for sku, _ in store.page(0, 5)] == skus[:5]
+    assert store.position("HW-0001") == 1
+
+
+def test_page_near_the_bottom_counts_from_the_end(store):
+    skus = [f"HW-{number:04d}" for number in range(200)]
+    store.upsert_many((sku, item(f"Item {sku}")) for sku in skus)
+    statements = []
+    store.conn.set_trace_callback(statements.append)
+    for offset, limit in ((190, 10), (195, 10), (150, 10), (199, 1), (200, 10), (0, 10), (185, 30)):
+        store._page_anchor = None
+        assert [sku for sku, _ in store.page(offset, limit)] == skus[offset:offset + limit]
+    assert sum("ORDER BY sku DESC LIMIT" in statement for statement in statements) == 5
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = InventoryJournal(str(tmp_path / "journal"))
+    yield journal
+    journal.close()
+
+
+def test_upsert_journals_the_old_values(store, journal):
+    store.add_item("HW-0001", item("Claw Hammer", qty=5))
+    store.journal = journal
+    store.upsert_many([("HW-0001", {"name": "Claw Hammer", "qty": 8, "price": 10.0}),
+                       ("HW-0002", {"name": "Mallet", "qty": 1, "price": 4.0})], fields=("name", "qty", "price"))
+    assert journal.flush(5)
+    records = [record for record in journal.replay() if record.op == OP_UPSERT]
+    assert [(record.sku, record.old and record.old["qty"], record.new["qty"]) for record in records] == [
+        ("HW-0001", 5, 8), ("HW-0002", None, 1)]
+
+
+def test_new_journal_seeds_an_empty_store(store, journal):
+    inventory_store._restore_or_seed(store, journal)
+    assert len(store) == len(SEED_ITEMS)
+    assert journal.flush(5)
+    assert len(journal.rebuild_catalog()) == len(SEED_ITEMS)
+
+
+def test_emptied_inventory_is_not_seeded_again(tmp_path, journal):
+    first = InventoryStore(str(tmp_path / "first.db"), journal=journal)
+    first.add_item("HW-0001", item("Claw Hammer"))
+    first.remove_item("HW-0001")
+    first.close()
+    assert journal.flush(5)
+
+    reopened = InventoryJournal(journal.directory)     # as after a restart
+    restored = InventoryStore(str(tmp_path / "restored.db"))
+    inventory_store._restore_or_seed(restored, reopened)
+    assert len(restored) == 0
+    restored.close()
+    reopened.close()
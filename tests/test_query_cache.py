@@ -0,0 +1,110 @@
+import pytest
+
+from catalog import Catalog
+from query_cache import QueryCache
+from search_engine import SearchIndex, make_query
+
+HAMMER = make_query("hammer")
+PIPE = make_query("pvc pipe")
+
+
+def item(name, qty=5, category="Tools"):
+    return {"name": name, "qty": qty, "price": 10.0, "desc": "", "category": category, "barcode": "",
+            "supplier": "Acme", "active": 1}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def build():
+    return SearchIndex(Catalog([("HW-1", item("Claw Hammer")), ("PL-1", item("PVC Pipe 1in", category="Plumbing"))]))
+
+
+@pytest.fixture
+def index():
+    return build()
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def cache(clock):
+    return QueryCache(capacity=3, ttl=10.0, clock=clock)
+
+
+def test_repeat_search_is_a_hit(cache, index):
+    first = cache.search(index, HAMMER)
+    assert cache.search(index, HAMMER) is first
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (1, 1)
+
+
+def test_change_drops_only_affected_entries(cache, index):
+    cache.search(index, HAMMER)
+    cache.search(index, PIPE)
+    index.apply("edit", [("HW-1", {"qty": 0})])
+    assert HAMMER not in cache
+    assert PIPE in cache
+    assert cache.stats()["invalidations"] == 1
+    assert len(cache.search(index, HAMMER)) == 0     # out of stock now
+
+
+def test_new_match_drops_the_entry(cache, index):
+    assert len(cache.search(index, HAMMER)) == 1
+    index.apply("add", [("HW-2", item("Sledge Hammer"))])
+    assert HAMMER not in cache
+    assert len(cache.search(index, HAMMER)) == 2
+
+
+def test_entries_expire(cache, index, clock):
+    cache.search(index, HAMMER)
+    clock.now = 11.0
+    assert HAMMER not in cache
+    cache.search(index, HAMMER)
+    assert cache.stats()["expirations"] == 1
+
+
+def test_least_recently_used_is_evicted(cache, index):
+    queries = [make_query(term) for term in ("claw", "pipe", "hammer", "pvc")]
+    for query in queries[:3]:
+        cache.search(index, query)
+    cache.search(index, queries[0])     # now the most recently used
+    cache.search(index, queries[3])
+    assert queries[1] not in cache
+    assert all(query in cache for query in (queries[0], queries[2], queries[3]))
+    assert cache.stats()["evictions"] == 1
+
+
+def test_pinned_entries_neither_expire_nor_get_evicted(cache, index, clock):
+    cache.pin([HAMMER])
+    cache.search(index, HAMMER)
+    for term in ("claw", "pipe", "pvc", "acme"):
+        cache.search(index, make_query(term))
+    clock.now = 100.0
+    assert HAMMER in cache
+
+
+def test_dropped_pins_are_reported(cache, index):
+    dropped = []
+    cache.observers.append(dropped.append)
+    cache.pin([HAMMER, PIPE])
+    cache.search(index, HAMMER)
+    cache.search(index, PIPE)
+    index.apply("remove", [("HW-1", None)])
+    assert dropped == [{HAMMER}]
+
+
+def test_another_index_starts_empty(cache, index):
+    cache.search(index, HAMMER)
+    other = build()
+    cache.search(other, PIPE)
+    assert HAMMER not in cache
+    index.apply("edit", [("PL-1", {"qty": 0})])     # the old index is no longer watched
+    assert PIPE in cache
@@ -0,0 +1,70 @@
+import json
+
+import search_history
+
+from search_engine import make_query
+from search_history import RECENT_LIMIT, SearchHistory
+
+
+def test_typed_term_survives_a_reload(tmp_path):
+    path = str(tmp_path / "history.json")
+    history = SearchHistory("ana", path)
+    query = make_query("Claw Hammer, 16oz")
+    history.record(query, "Claw Hammer, 16oz")
+    history.save("Pipes", make_query("PVC pipe"), "PVC pipe")
+    history.wait_written()
+
+    reloaded = SearchHistory("ana", path)
+    assert reloaded.recent == [query]
+    assert reloaded.term(query) == "Claw Hammer, 16oz"
+    assert [label for label, _ in reloaded.entries()] == ["★ Pipes", "Claw Hammer, 16oz"]
+
+
+def test_entries_without_a_typed_term_still_load(tmp_path):
+    path = tmp_path / "history.json"
+    query = make_query("hammer")
+    path.write_text(json.dumps({"users": {"ana": {"saved": [{"name": "H", "query": query._asdict()}],
+                                                  "recent": [query._asdict()]}}}))
+    history = SearchHistory("ana", str(path))
+    assert history.saved == {"H": query}
+    assert history.term(query) == "hammer"
+
+
+def test_recent_searches_are_capped_newest_first(tmp_path):
+    path = str(tmp_path / "history.json")
+    history = SearchHistory("ana", path)
+    queries = [make_query(f"item {number}") for number in range(RECENT_LIMIT + 5)]
+    for query in queries:
+        history.record(query)
+    history.record(queries[-3])
+    history.wait_written()
+    recent = SearchHistory("ana", path).recent
+    assert len(recent) == RECENT_LIMIT
+    assert recent[:2] == [queries[-3], queries[-1]]
+
+
+def test_users_share_the_file(tmp_path):
+    path = str(tmp_path / "history.json")
+    for user in ("ana", "bo"):
+        history = SearchHistory(user, path)
+        history.record(make_query(user))
+        history.wait_written()
+    assert SearchHistory("ana", path).recent == [make_query("ana")]
+    assert SearchHistory("bo", path).recent == [make_query("bo")]
+
+
+def test_flush_at_exit_finishes_the_last_write(tmp_path, monkeypatch):
+    path = str(tmp_path / "history.json")
+    history = SearchHistory("ana", path)
+    monkeypatch.setitem(search_history._histories, "ana", history)
+    history.record(make_query("hammer"))
+    search_history.flush_histories()
+    assert SearchHistory("ana", path).recent == [make_query("hammer")]
+
+
+def test_unreadable_file_is_logged_and_ignored(tmp_path, caplog):
+    path = tmp_path / "history.json"
+    path.write_text("{not json")
+    assert SearchHistory("ana", str(path)).recent == []
+    [record] = caplog.records
+    assert record.name == "search_history" and "not read" in record.getMessage()
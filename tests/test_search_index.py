@@ -0,0 +1,134 @@
+import random
+
+import pytest
+
+from catalog import Catalog
+from search_engine import CATEGORIES, NAME_WORDS, SIZES, SearchIndex, make_query, synthetic_catalog
+
+COUNT = 2000
+
+
+def new_item(rng, number):
+    return {"name": f"{rng.choice(NAME_WORDS).title()} {rng.choice(SIZES)} new", "qty": rng.randrange(3),
+            "price": rng.randrange(1, 5000) / 4, "category": rng.choice(CATEGORIES), "barcode": f"481{number:010d}",
+            "supplier": f"Supplier {rng.randrange(50)}", "active": 1}
+
+
+def churn(index, changes, seed=7):
+    """Random adds, edits and removes, as the store would send them."""
+    rng = random.Random(seed)
+    skus = [f"SKU{number:08d}" for number in range(COUNT)]
+    for number in range(changes):
+        roll = rng.random()
+        if roll < 0.25:
+            index.apply("remove", [(skus.pop(rng.randrange(len(skus))), None)])
+        elif roll < 0.5:
+            sku = f"NEW{number:08d}"
+            skus.append(sku)
+            index.apply("add", [(sku, new_item(rng, number))])
+        else:
+            change = rng.choice(({"qty": rng.randrange(3)}, {"price": rng.randrange(1, 5000) / 4},
+                                 {"name": f"{rng.choice(NAME_WORDS).title()} {rng.choice(NAME_WORDS)} edited"},
+                                 {"category": rng.choice(CATEGORIES), "active": rng.randrange(2)},
+                                 {"barcode": f"482{number:010d}"}, {"supplier": f"Supplier {rng.randrange(50)}"}))
+            index.apply(rng.choice(("edit", "upsert")), [(rng.choice(skus), change)])
+
+
+def rebuilt(index):
+    catalog = index.catalog
+    return SearchIndex(Catalog((catalog.sku_at(row), catalog.item_at(row)) for row in catalog.live_rows()))
+
+
+def found(index, term, **form):
+    return [sku for sku, _ in index.search(make_query(term, **form)).items()]
+
+
+@pytest.fixture
+def index():
+    return SearchIndex(synthetic_catalog(COUNT))
+
+
+def test_deltas_match_a_rebuild(index):
+    churn(index, 600)
+    assert index.tombstones
+    assert index.check() == []
+
+
+def test_compact_matches_a_rebuild(index):
+    churn(index, 600)
+    assert index.compact() > 0
+    assert not index.tombstones
+    assert index.check() == []
+
+
+def test_searches_agree_with_a_rebuild(index):
+    churn(index, 600)
+    fresh = rebuilt(index)
+    # Relevance scores use the average field lengths from build time, so
+    # only the matches are compared there; a sort order must agree exactly
+    for term, form in (("hammer", {}), ("new", {"category": "Tools"}), ("edited", {"show_inactive": True}),
+                       ("481", {"search_by": "Barcode", "in_stock_only": False})):
+        matches = found(index, term, **form)
+        assert matches and sorted(matches) == sorted(found(fresh, term, **form)), term
+    assert found(index, "supplier 7", sort_by="Price") == found(fresh, "supplier 7", sort_by="Price")
+
+
+def test_removed_item_is_not_found(index):
+    sku, item = index.catalog.sku_at(0), index.catalog.item_at(0)
+    assert sku in found(index, sku, search_by="Product ID", in_stock_only=False, show_inactive=True)
+    index.apply("remove", [(sku, None)])
+    assert sku not in found(index, sku, search_by="Product ID", in_stock_only=False, show_inactive=True)
+    assert index.find_barcode(item["barcode"]) is None
+
+
+def test_bulk_change_marks_the_index_stale(index):
+    index.apply("upsert", [(f"NEW{number}", {"qty": 1}) for number in range(SearchIndex.BULK_CHANGE + 1)])
+    assert index.stale
+
+
+def small_index():
+    return SearchIndex(Catalog([
+        ("HW-1", {"name": "Claw Hammer 16oz", "qty": 3, "price": 12.5, "category": "Tools", "supplier": "Acme"}),
+        ("HW-2", {"name": "Ball Peen Hammer", "qty": 1, "price": 15.0, "category": "Tools", "supplier": "Acme"}),
+        ("HW-3", {"name": "Hamper Basket", "qty": 2, "price": 8.0, "category": "Hardware", "supplier": "Screwfix"}),
+        ("HW-4", {"name": "Wood Screw 1in", "qty": 9, "price": 0.5, "category": "Hardware", "supplier": "Bolts Co"}),
+    ]))
+
+
+@pytest.mark.parametrize("term, skus", [
+    ("hammer", ["HW-1", "HW-2"]),
+    ("hamm", ["HW-1", "HW-2"]),
+    ("ham", ["HW-1", "HW-2", "HW-3"]),
+    ("scre", ["HW-3", "HW-4"]),         # a supplier word and a name word
+    ("claw ham", ["HW-1"]),
+    ("ham claw", []),                   # only the last word is a prefix
+])
+def test_last_word_matches_as_a_prefix(term, skus):
+    result = small_index().search(make_query(term))
+    # Typo matches ("hamper" for "hammer") follow the exact ones
+    assert sorted(sku for sku, _ in result.items(0, result.exact_count)) == skus
+
+
+def test_single_letter_is_not_a_prefix():
+    assert found(small_index(), "c", search_by="Product Name") == []
+
+
+def test_prefix_sees_words_added_and_removed():
+    index = small_index()
+    assert found(index, "ham")     # the sorted word lists now exist and must be kept up to date
+    index.apply("add", [("HW-5", {"name": "Hammock Stand", "qty": 1, "price": 99.0, "category": "Hardware",
+                                  "barcode": "", "supplier": "Acme", "active": 1})])
+    assert "HW-5" in found(index, "hammo")
+    index.apply("remove", [("HW-3", None)])
+    index.compact()
+    assert found(index, "hamp") == []
+    assert index.check() == []
+
+
+def test_prefix_match_invalidates_cached_results():
+    index = small_index()
+    query = make_query("hamm")
+    item = {"name": "Sledge Hammer", "qty": 1, "price": 40.0, "category": "Tools", "barcode": "",
+            "supplier": "Acme", "active": 1}
+    assert index.matches(query, "HW-9", item)
+    assert not index.matches(make_query("hamm sledge"), "HW-9", dict(item, name="Hammer"))
@@ -0,0 +1,67 @@
+import pytest
+
+import sku_allocator
+from inventory_store import InventoryStore
+from sku_allocator import DEFAULT_TERMINAL, TERMINAL_ENV, SkuAllocator, branch_code, terminal_id
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "inventory.db")
+
+
+@pytest.fixture
+def store(db_path):
+    store = InventoryStore(db_path)
+    yield store
+    store.close()
+
+
+def test_allocates_a_leased_block_in_order(store):
+    allocator = SkuAllocator(store, "Manila Branch", terminal=3, block_size=4)
+    skus = [allocator.next_sku() for _ in range(6)]
+    assert skus == ["MNL03-000000", "MNL03-000001", "MNL03-000002", "MNL03-000003",
+                    "MNL03-000004", "MNL03-000005"]
+    # The second block was leased once the first ran out
+    assert store.lease_block("MNL03") == 2
+
+
+def test_restart_skips_the_rest_of_the_block(db_path):
+    store = InventoryStore(db_path)
+    first = SkuAllocator(store, "Manila Branch", terminal=1, block_size=10)
+    assert first.next_sku() == "MNL01-000000"
+    store.close()
+
+    store = InventoryStore(db_path)
+    try:
+        again = SkuAllocator(store, "Manila Branch", terminal=1, block_size=10)
+        assert again.next_sku() == "MNL01-000010"
+    finally:
+        store.close()
+
+
+def test_terminals_and_branches_have_their_own_prefix(store):
+    codes = {SkuAllocator(store, location, terminal=terminal, block_size=10).next_sku()
+             for location in ("Manila Branch", "Quezon City Branch") for terminal in (1, 2)}
+    assert codes == {"MNL01-000000", "MNL02-000000", "QC01-000000", "QC02-000000"}
+
+
+def test_unknown_branch_uses_its_initials():
+    assert branch_code("Cebu Main Branch") == "CMB"
+    assert branch_code("") == "JB"
+
+
+def test_terminal_comes_from_the_environment(store, monkeypatch):
+    monkeypatch.setenv(TERMINAL_ENV, " 7 ")
+    assert terminal_id() == 7
+    assert SkuAllocator(store, "Remote (Home)").next_sku() == "RMT07-000000"
+    monkeypatch.delenv(TERMINAL_ENV)
+    assert terminal_id() == DEFAULT_TERMINAL
+
+
+@pytest.mark.parametrize("value", ["0", "100", "-2", "two", "1.5"])
+def test_bad_terminal_falls_back_with_a_warning(monkeypatch, caplog, value):
+    monkeypatch.setenv(TERMINAL_ENV, value)
+    assert terminal_id() == DEFAULT_TERMINAL
+    [record] = caplog.records
+    assert record.name == sku_allocator.__name__ and repr(value) in record.getMessage()
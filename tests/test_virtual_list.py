@@ -0,0 +1,147 @@
+import pytest
+
+from virtual_list import RowWindow
+
+
+class Listing:
+    """A sorted list of keys standing in for the store, and the Listbox lines the edits produce."""
+    def __init__(self, count, visible, top=0):
+        self.keys = [f"K{number:03d}" for number in range(0, count * 10, 10)]
+        self.window = RowWindow(visible)
+        self.window.total = count
+        self.lines = []
+        self.show(top)
+
+    def fetch_rows(self, offset, limit):
+        return [(key, f"row {key}") for key in self.keys[offset:offset + limit]]
+
+    def show(self, top):
+        top = self.window.clamp(top)
+        rows = self.fetch_rows(top, self.window.visible)
+        self.window.show(top, (key for key, _ in rows))
+        self.lines = [text for _, text in rows]
+
+    def apply(self, edits):
+        if edits is None:
+            self.show(self.window.top)
+            return
+        for edit in edits:
+            if edit[0] == "insert":
+                self.lines.insert(edit[1], edit[2])
+            else:
+                del self.lines[edit[1]]
+
+    def insert(self, key):
+        self.keys.append(key)
+        self.keys.sort()
+        self.apply(self.window.insert(self.keys.index(key), key, f"row {key}"))
+
+    def delete(self, key):
+        self.keys.remove(key)
+        self.apply(self.window.delete(key, self.fetch_rows))
+
+    def select(self, key):
+        self.window.selected_key = key
+        self.window.selected_index = self.keys.index(key)
+
+    def check(self):
+        window = self.window
+        expected = self.fetch_rows(window.top, window.visible)
+        assert window.total == len(self.keys)
+        assert self.lines == [text for _, text in expected]
+        assert window.keys == [key for key, _ in expected]
+        assert window.rows == {key: row for row, key in enumerate(window.keys)}
+        if window.selected_key is not None:
+            assert window.selected_index == self.keys.index(window.selected_key)
+
+
+@pytest.mark.parametrize("key", ["K000", "K055", "K095", "K999"])
+def test_insert_keeps_the_window_in_step(key):
+    listing = Listing(20, 5, top=5)
+    listing.insert(key)
+    listing.check()
+
+
+def test_insert_above_the_window_keeps_the_same_rows_on_screen():
+    listing = Listing(20, 5, top=5)
+    listing.select("K060")
+    listing.insert("K005")
+    assert listing.window.top == 6
+    assert listing.window.selected_row() == 1
+    listing.check()
+
+
+def test_insert_into_the_window_pushes_its_last_row_out():
+    listing = Listing(20, 5, top=5)
+    edits = listing.window.insert(7, "K065", "row K065")
+    assert edits == [("insert", 2, "row K065"), ("delete", 5)]
+    assert "K090" not in listing.window.rows
+
+
+def test_insert_into_a_short_list_grows_the_window():
+    listing = Listing(2, 5)
+    listing.insert("K005")
+    assert listing.window.keys == ["K000", "K005", "K010"]
+    listing.check()
+
+
+def test_update_rewrites_only_rows_on_screen():
+    listing = Listing(20, 5, top=5)
+    assert listing.window.update("K060", "new text") == [("delete", 1), ("insert", 1, "new text")]
+    assert listing.window.update("K000", "new text") == []
+
+
+@pytest.mark.parametrize("key", ["K050", "K070", "K090"])
+def test_delete_pulls_one_row_up_from_below(key):
+    listing = Listing(20, 5, top=5)
+    listing.keys.remove(key)
+    edits = listing.window.delete(key, listing.fetch_rows)
+    listing.apply(edits)
+    assert edits[-1] == ("insert", 4, "row K100")
+    listing.check()
+
+
+def test_delete_at_the_bottom_refetches_the_window():
+    listing = Listing(20, 5, top=15)
+    listing.keys.remove("K170")
+    assert listing.window.delete("K170", listing.fetch_rows) is None
+    listing.apply(None)
+    assert listing.window.top == 14
+    listing.check()
+
+
+def test_delete_of_the_selected_row_clears_the_selection():
+    listing = Listing(20, 5, top=5)
+    listing.select("K060")
+    listing.delete("K060")
+    assert listing.window.selected_key is None and listing.window.selected_index is None
+    listing.check()
+
+
+def test_delete_above_the_window_of_the_selected_row():
+    listing = Listing(20, 5, top=5)
+    listing.select("K010")
+    listing.delete("K010")
+    assert listing.window.top == 4
+    assert listing.lines == ["row K050", "row K060", "row K070", "row K080", "row K090"]
+    listing.check()
+
+
+def test_delete_above_the_selection_moves_it_up():
+    listing = Listing(20, 5, top=5)
+    listing.select("K080")
+    listing.delete("K050")
+    listing.check()
+    assert listing.window.selected_row() == 2
+
+
+def test_delete_off_screen_of_an_unknown_row_refetches():
+    listing = Listing(20, 5, top=5)
+    assert listing.window.delete("K010", listing.fetch_rows) is None
+
+
+def test_delete_from_a_short_list_shrinks_the_window():
+    listing = Listing(3, 5)
+    listing.delete("K010")
+    assert listing.window.keys == ["K000", "K020"]
+    listing.check()
@@ -0,0 +1,290 @@
+import tkinter as tk
+import tkinter.font as tkfont
+import ttkbootstrap as ttk
+from tkinter import Listbox
+
+
+class RowWindow:
+    """
+    The window of rows a VirtualListView shows, and its selection, with
+    no Tk in it.
+
+    Keeps a two-way key <-> row index for the rows on screen, so selection
+    lookup is a dict hit that does not depend on the row text. Each
+    mutation works out its single-row diff and returns it as Listbox
+    edits, ("insert", row, text) or ("delete", row) with rows counted from
+    the top of the window, or None when the window has to be fetched again.
+    """
+    def __init__(self, visible):
+        self.total = 0
+        self.top = 0
+        self.visible = visible
+        self.selected_index = None
+        self.selected_key = None
+        self.keys = []
+        self.rows = {}
+
+    def clamp(self, top):
+        return max(0, min(top, self.total - self.visible))
+
+    def show(self, top, keys):
+        """Takes the keys of a freshly fetched window starting at absolute row top."""
+        self.top = top
+        self.keys = list(keys)
+        self.rows = {}
+        self._reindex()
+
+    def _reindex(self, start=0):
+        for row in range(start, len(self.keys)):
+            self.rows[self.keys[row]] = row
+
+    def selected_row(self):
+        """The window row of the selected key, or None when it is off screen."""
+        row = self.rows.get(self.selected_key)
+        if row is not None:
+            self.selected_index = self.top + row
+        return row
+
+    def clear_selection(self):
+        self.selected_index = None
+        self.selected_key = None
+
+    def insert(self, index, key, text):
+        """One row inserted at an absolute position."""
+        edits = []
+        self.total += 1
+        if self.selected_index is not None and self.selected_index >= index:
+            self.selected_index += 1
+
+        if index < self.top:
+            # Keep the same rows on screen; they all moved down by one
+            self.top += 1
+        elif index < self.top + self.visible:
+            row = index - self.top
+            edits.append(("insert", row, text))
+            self.keys.insert(row, key)
+            if len(self.keys) > self.visible:
+                edits.append(("delete", len(self.keys) - 1))
+                del self.rows[self.keys.pop()]
+            self._reindex(row)
+        return edits
+
+    def update(self, key, text):
+        """One row's text replaced; off-screen rows are fetched on demand anyway."""
+        row = self.rows.get(key)
+        if row is None:
+            return []
+        return [("delete", row), ("insert", row, text)]
+
+    def delete(self, key, fetch_rows):
+        """One row removed, pulling a single replacement row up from below the window."""
+        row = self.rows.get(key)
+        if row is None:
+            if key != self.selected_key:
+                # Position unknown without asking the data layer; fall back to a redraw
+                return None
+            index = self.selected_index
+        else:
+            index = self.top + row
+
+        if key == self.selected_key:
+            self.clear_selection()
+        elif self.selected_index is not None and self.selected_index > index:
+            self.selected_index -= 1
+        self.total -= 1
+
+        if row is None:
+            if index < self.top:
+                self.top -= 1
+            return []
+        edits = [("delete", row)]
+        del self.rows[self.keys.pop(row)]
+        self._reindex(row)
+
+        if self.top > 0 and self.top + self.visible > self.total:
+            # At the bottom of the list: scroll up one row instead
+            return None
+        below = self.top + len(self.keys)
+        if below < self.total and len(self.keys) < self.visible:
+            for new_key, new_text in fetch_rows(below, 1):
+                edits.append(("insert", len(self.keys), new_text))
+                self.keys.append(new_key)
+                self.rows[new_key] = len(self.keys) - 1
+        return edits
+
+
+class VirtualListView(ttk.Frame):
+    """
+    Listbox that only holds the rows currently on screen.
+
+    The view asks the data layer for the row count and for one window of
+    rows at a time, so the number of Tk items and the memory used stay the
+    same however big the catalog gets. Scrolling, selection and keyboard
+    navigation work on absolute row numbers.
+
+    Each rendered row carries a key (the SKU), tracked by a RowWindow.
+    Mutations are applied as single-row diffs through
+    insert_row/update_row/delete_row instead of a full redraw.
+
+    count_rows() -> int
+    fetch_rows(offset, limit) -> list of (key, display string)
+    """
+    def __init__(self, master, count_rows, fetch_rows, height=10, font=("Helvetica", 10)):
+        super().__init__(master)
+        self.count_rows = count_rows
+        self.fetch_rows = fetch_rows
+
+        self.window = RowWindow(height)
+        self._row_height = tkfont.Font(font=font).metrics("linespace") + 1
+
+        self.listbox = Listbox(self, height=height, font=font, exportselection=False, activestyle="none")
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+        self.listbox.pack(side="left", fill="both", expand=True)
+
+        self.listbox.bind("<<ListboxSelect>>", self._on_listbox_select)
+        self.listbox.bind("<Configure>", self._on_configure)
+        self.listbox.bind("<MouseWheel>", self._on_mousewheel)
+        self.listbox.bind("<Button-4>", lambda event: self.scroll_by(-3))
+        self.listbox.bind("<Button-5>", lambda event: self.scroll_by(3))
+        self.listbox.bind("<Up>", lambda event: self._move_selection(-1))
+        self.listbox.bind("<Down>", lambda event: self._move_selection(1))
+        self.listbox.bind("<Prior>", lambda event: self._move_selection(-self.window.visible))
+        self.listbox.bind("<Next>", lambda event: self._move_selection(self.window.visible))
+        self.listbox.bind("<Home>", lambda event: self._move_selection(-self.window.total))
+        self.listbox.bind("<End>", lambda event: self._move_selection(self.window.total))
+
+    @property
+    def selected_key(self):
+        return self.window.selected_key
+
+    # --- Rendering ---
+
+    def refresh(self):
+        """Re-reads the row count and redraws the current window."""
+        window = self.window
+        window.total = self.count_rows()
+        if window.selected_index is not None and window.selected_index >= window.total:
+            self.clear_selection()
+        self._render()
+
+    def _render(self):
+        window = self.window
+        top = window.clamp(window.top)
+        rows = self.fetch_rows(top, window.visible) if window.total else []
+
+        self.listbox.delete(0, tk.END)
+        self.listbox.insert(tk.END, *(text for _, text in rows))
+        window.show(top, (key for key, _ in rows))
+        self._restore_selection()
+        self._update_scrollbar()
+
+    def _restore_selection(self):
+        self.listbox.selection_clear(0, tk.END)
+        row = self.window.selected_row()
+        if row is not None:
+            self.listbox.selection_set(row)
+            self.listbox.activate(row)
+
+    def _update_scrollbar(self):
+        window = self.window
+        if window.total <= window.visible:
+            self.scrollbar.set(0.0, 1.0)
+        else:
+            self.scrollbar.set(window.top / window.total, (window.top + window.visible) / window.total)
+
+    # --- Scrolling ---
+
+    def scroll_to(self, top):
+        top = self.window.clamp(top)
+        if top != self.window.top:
+            self.window.top = top
+            self._render()
+
+    def scroll_by(self, rows):
+        self.scroll_to(self.window.top + rows)
+        return "break"
+
+    def see(self, index):
+        """Scrolls the least amount needed to bring the absolute row into view."""
+        window = self.window
+        if index < window.top:
+            self.scroll_to(index)
+        elif index >= window.top + window.visible:
+            self.scroll_to(index - window.visible + 1)
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * self.window.total))
+        elif action == "scroll":
+            step = self.window.visible if unit == "pages" else 1
+            self.scroll_by(int(amount) * step)
+
+    def _on_mousewheel(self, event):
+        return self.scroll_by(-3 if event.delta > 0 else 3)
+
+    def _on_configure(self, event):
+        visible = max(1, event.height // self._row_height)
+        if visible != self.window.visible:
+            self.window.visible = visible
+            self._render()
+
+    # --- Single-row diffs ---
+
+    def _apply(self, edits):
+        if edits is None:
+            self.refresh()
+            return
+        for edit in edits:
+            if edit[0] == "insert":
+                self.listbox.insert(edit[1], edit[2])
+            else:
+                self.listbox.delete(edit[1])
+        if edits:
+            self._restore_selection()
+        self._update_scrollbar()
+
+    def insert_row(self, index, key, text):
+        """Inserts one row at an absolute position without redrawing the window."""
+        self._apply(self.window.insert(index, key, text))
+
+    def update_row(self, key, text):
+        """Replaces the text of one row if it is on screen."""
+        self._apply(self.window.update(key, text))
+
+    def delete_row(self, key):
+        """Removes one row without redrawing the window."""
+        self._apply(self.window.delete(key, self.fetch_rows))
+
+    # --- Selection ---
+
+    def select(self, index):
+        """Selects an absolute row, scrolls it into view and fires <<ListboxSelect>>."""
+        window = self.window
+        if not window.total:
+            return
+        index = max(0, min(index, window.total - 1))
+        self.see(index)
+        row = index - window.top
+        window.selected_index = index
+        window.selected_key = window.keys[row] if row < len(window.keys) else None
+        self._restore_selection()
+        self.event_generate("<<ListboxSelect>>")
+
+    def clear_selection(self):
+        self.window.clear_selection()
+        self.listbox.selection_clear(0, tk.END)
+
+    def _on_listbox_select(self, event):
+        selection = self.listbox.curselection()
+        if not selection:
+            return
+        self.window.selected_index = self.window.top + selection[0]
+        self.window.selected_key = self.window.keys[selection[0]]
+        self.event_generate("<<ListboxSelect>>")
+
+    def _move_selection(self, delta):
+        window = self.window
+        current = window.selected_index if window.selected_index is not None else window.top - (1 if delta > 0 else 0)
+        self.select(current + delta)
+        return "break"